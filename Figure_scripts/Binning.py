@@ -0,0 +1,94 @@
+# =============================================================================
+# Binning of continuous columns
+#
+# The binned boxplots (PCE, Voc, FF, Jsc, hysteresis index, band gap and
+# publication date) put the rows in bins given by sorted bin edges. A value v
+# is in bin i if edges[i] < v <= edges[i+1], as with pd.cut, and values outside
+# the edges and missing values are in no bin. The bin of every value is found
+# with one np.searchsorted over the edges, on floats or on datetime64 values.
+# The codes are not cached: a search over a few tens of edges costs less than
+# hashing the values to look them up would. Labels for the bins and thinned
+# tick labels for the x-axis of the boxplots are made from the edges.
+#
+# Month end frequencies are written 'ME' and '6ME', as in pandas 2.2 and later,
+# where 'M' is deprecated, and translated to 'M' for older versions of pandas.
+# =============================================================================
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# pandas 2.2 renamed the month end frequency from M to ME
+MONTH_END_ALIAS = tuple(int(part) for part in re.findall(r'\d+', pd.__version__)[:2]) >= (2, 2)
+
+#%% Bin edges
+def linearEdges(start, end, delta):
+    '''Returns equally spaced bin edges from start to end, delta apart'''
+    return np.linspace(start, end, int(round((end - start)/delta)) + 1)
+
+def dateFrequency(freq):
+    '''Returns a frequency of pd.date_range in the aliases of the installed pandas, where month ends, such as '6ME', are written with M before pandas 2.2'''
+    if MONTH_END_ALIAS:
+        return freq
+    return re.sub(r'^(\d*)ME$', r'\1M', freq)
+
+def dateEdges(start, freq, periods):
+    '''Returns bin edges at dates, as in pd.date_range. With freq = '6ME' the edges are the ends of every half year'''
+    return pd.date_range(start, freq = dateFrequency(freq), periods = periods).to_numpy()
+
+def numericValues(values):
+    '''Returns the values as a numpy array searchsorted can compare with the edges. Dates become datetime64[ns], with NaT for missing dates'''
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values).to_numpy(dtype = 'datetime64[ns]')
+    return pd.Series(values).to_numpy(dtype = np.float64, na_value = np.nan)
+
+#%% Bin codes
+def binCodes(values, edges):
+    '''Returns the bin of each value as an integer code, where code i means edges[i] < value <= edges[i+1].
+    Values outside the edges and missing values get code -1'''
+    values = numericValues(values)
+    edges = np.asarray(edges, dtype = values.dtype) if values.dtype.kind == 'M' else np.asarray(edges, dtype = np.float64)
+    codes = np.searchsorted(edges, values, side = 'left') - 1
+
+    # Values at or below the first edge get -1 already. Values above the last edge and NaN, which is sorted last, get the last edge
+    codes[codes >= len(edges) - 1] = -1
+    if values.dtype.kind == 'M':
+        codes[np.isnat(values)] = -1
+    return codes
+
+def binColumn(data, column, edges, labels = None):
+    '''Returns the bins of a column as an ordered categorical series, the same as pd.cut(data[column], bins = edges, labels = labels).
+    Without labels the bins are labelled by intervalLabels'''
+    if labels is None:
+        labels = intervalLabels(edges)
+    codes = binCodes(data[column], edges)
+    return pd.Series(pd.Categorical.from_codes(codes, categories = labels, ordered = True), index = data.index, name = column)
+
+#%% Labels
+def centres(edges):
+    '''Returns the centre of every bin'''
+    edges = np.asarray(edges)
+    return edges[:-1] + (edges[1:] - edges[:-1])/2
+
+def upperEdges(edges):
+    '''Returns the upper, included, edge of every bin'''
+    return np.asarray(edges)[1:]
+
+def intervalLabels(edges):
+    '''Returns labels of the form (lower, upper] for every bin. Dates are written as yyyy-mm-dd'''
+    edges = np.asarray(edges)
+    if edges.dtype.kind == 'M':
+        text = pd.DatetimeIndex(edges).astype(str)
+    else:
+        text = ['{:.10g}'.format(edge) for edge in edges]
+    return ['({}, {}]'.format(text[i], text[i + 1]) for i in range(len(edges) - 1)]
+
+def tickLabels(values, step, offset = 0, fmt = '{}'):
+    '''Returns tick labels for the bins, where only every step:th bin, starting at bin offset, is labelled and the others are left empty.
+    values are the values to write, such as the centres or upper edges of the bins, and fmt how to write them, for example '{:.1f}'.
+    Dates are written with fmt applied to a Timestamp, for example '{:%Y}' '''
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        values = pd.DatetimeIndex(values)
+    return [fmt.format(value) if i >= offset and (i - offset) % step == 0 else '' for i, value in enumerate(values)]
@@ -0,0 +1,219 @@
+# =============================================================================
+# Bootstrap confidence intervals per group
+#
+# The boxplots show the spread of Jsc_over_Jqe per bin or category, but not
+# how well the median or mean of each group is known. Here the uncertainty is
+# estimated with a percentile bootstrap, for all groups at once:
+#   - the values are sorted by group and then by value, as in GroupStatistics,
+#     so every group is a segment starts[g]:starts[g]+lengths[g]
+#   - a batch of replicates is one integer matrix of positions, where row r
+#     holds a resample with replacement of every group within its own segment
+#   - sorting the positions of a row sorts the resampled values of every
+#     group, since the values are sorted within the segments, so the medians
+#     and means of all groups and replicates are read with array operations
+# The replicates are drawn in batches with their own seeds, so the result only
+# depends on the seed, and the batches can be spread over a process pool.
+#
+# Many rows come from the same publication, and devices from one paper are not
+# independent. The cluster bootstrap resamples the papers, identified by
+# Ref_DOI_number, and then the devices within each chosen paper, using the
+# start and length of every paper in the values sorted by paper.
+# =============================================================================
+
+import concurrent.futures
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import GroupStatistics
+
+STATISTICS = ('median', 'mean')
+
+# Largest number of resampled values in one batch of replicates
+BATCH_VALUES = 2**22
+
+#%% Statistics of the replicates
+def replicateQuantile(resampled, starts, lengths, q):
+    '''Returns the q quantile of every group in every replicate, from replicates whose groups are sorted, using linear interpolation'''
+    position = (lengths - 1)*q
+    below = np.floor(position).astype(np.int64)
+    fraction = position - below
+    above = np.minimum(below + 1, lengths - 1)
+    return resampled[:, starts + below] + fraction*(resampled[:, starts + above] - resampled[:, starts + below])
+
+def replicateStatistic(resampled, starts, lengths, statistic):
+    '''Returns a statistic of every group in every replicate, as an array with one row per replicate and one column per group'''
+    if statistic == 'median':
+        return replicateQuantile(resampled, starts, lengths, 0.5)
+    if statistic == 'mean':
+        return np.add.reduceat(resampled, starts, axis = 1)/lengths
+    raise ValueError('Unknown statistic: {}. Available statistics: {}'.format(statistic, ', '.join(STATISTICS)))
+
+def resamplePositions(rng, starts, lengths, replicates):
+    '''Returns positions of resamples with replacement of every group, one replicate per row. The positions of each group are sorted'''
+    # 32 bit positions, when they fit, halve the memory and make the sort faster
+    dtype = np.int32 if lengths.sum() < 2**31 else np.int64
+    groupStarts = np.repeat(starts, lengths).astype(dtype)
+    groupLengths = np.repeat(lengths, lengths)
+    positions = groupStarts + (rng.random((replicates, len(groupLengths)))*groupLengths).astype(dtype)
+    positions.sort(axis = 1)
+    return positions
+
+def replicateBatch(values, starts, lengths, replicates, seed, statistics = STATISTICS):
+    '''Draw a batch of replicates and return a dictionary from statistic to its value for every replicate and group.
+    All groups must have values'''
+    rng = np.random.default_rng(seed)
+    resampled = values[resamplePositions(rng, starts, lengths, replicates)]
+    return {statistic: replicateStatistic(resampled, starts, lengths, statistic) for statistic in statistics}
+
+#%% Parallel replicates
+# The values and segments of a worker process, set once when the worker starts
+workerSegments = None
+
+def initialiseWorker(values, starts, lengths):
+    '''Store the sorted values and the segments of the groups or clusters in a worker process'''
+    global workerSegments
+    workerSegments = (values, starts, lengths)
+
+def batchInWorker(batch, replicates, seed, arguments):
+    '''Draw a batch of replicates with the function batch in a worker process'''
+    values, starts, lengths = workerSegments
+    return batch(values, starts, lengths, replicates, seed, *arguments)
+
+def workerContext():
+    '''Returns the multiprocessing context of the worker processes, as FigureRunner.workerContext. The data has usually been read with pyarrow by then,
+    whose thread pool is not safe to fork, so the workers are started with forkserver, or spawn where forkserver is not available'''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def processPool(jobs, values, starts, lengths):
+    '''Returns a pool of worker processes holding the values, which are sent to every worker once when it starts'''
+    return concurrent.futures.ProcessPoolExecutor(max_workers = jobs, mp_context = workerContext(),
+                                                  initializer = initialiseWorker, initargs = (values, starts, lengths))
+
+def batchSizes(replicates, numberOfValues):
+    '''Returns the number of replicates in each batch, so that no batch holds more than BATCH_VALUES resampled values'''
+    size = max(1, BATCH_VALUES//max(numberOfValues, 1))
+    return [min(size, replicates - start) for start in range(0, replicates, size)]
+
+def runBatches(batch, values, starts, lengths, replicates, seed, arguments = (), jobs = 1):
+    '''Draw the replicates in batches with batch(values, starts, lengths, size, seed, *arguments), which returns a dictionary of arrays
+    with one row per replicate, and returns the concatenated arrays. The result only depends on the seed, not on the number of jobs'''
+    sizes = batchSizes(replicates, len(values))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if jobs > 1 and len(sizes) > 1:
+        with processPool(min(jobs, len(sizes)), values, starts, lengths) as pool:
+            batches = list(pool.map(batchInWorker, [batch]*len(sizes), sizes, seeds, [arguments]*len(sizes)))
+    else:
+        batches = [batch(values, starts, lengths, size, batchSeed, *arguments) for size, batchSeed in zip(sizes, seeds)]
+
+    return {name: np.concatenate([result[name] for result in batches]) for name in batches[0]}
+
+def percentileInterval(distribution, confidence = 0.95):
+    '''Returns the lower and upper limits of the percentile confidence interval from replicates along the first axis'''
+    tail = (1 - confidence)/2
+    return np.quantile(distribution, tail, axis = 0), np.quantile(distribution, 1 - tail, axis = 0)
+
+#%% Bootstrap per group
+def bootstrapReplicates(values, starts, lengths, replicates = 2000, seed = 0, statistics = STATISTICS, jobs = 1):
+    '''Returns a dictionary from statistic to an array with its value for every replicate and group, from values sorted within the segments
+    starts[g]:starts[g]+lengths[g]. All groups must have values'''
+    return runBatches(replicateBatch, values, starts, lengths, replicates, seed, (statistics,), jobs)
+
+def bootstrapStatistics(data, column, value, antal = None, sortByCount = True, statistics = STATISTICS,
+                        replicates = 2000, confidence = 0.95, seed = 0, jobs = 1):
+    '''Returns the median and mean of value, with percentile bootstrap confidence intervals, for the antal most common categories of column,
+    or for all categories. The groups are the same as in GroupStatistics.groupStatistics, so for the bins of the binned boxplots use sortByCount = False.
+    The result has one row per category, indexed by the category, with the columns n and, for each statistic, the statistic and its
+    lower and upper confidence limits, such as median, median_low and median_high. Categories without values get NaN'''
+    groups = GroupStatistics.sortedGroups(data, column, value, antal, sortByCount)
+    values, starts, lengths = groups['values'], groups['starts'], groups['lengths']
+    present = lengths > 0
+
+    result = pd.DataFrame({'n': lengths}, index = groups['categories'])
+    if not present.any():
+        for statistic in statistics:
+            result[[statistic, statistic + '_low', statistic + '_high']] = np.nan
+        return result
+
+    estimates = {statistic: replicateStatistic(values[np.newaxis, :], starts[present], lengths[present], statistic)[0] for statistic in statistics}
+    distributions = bootstrapReplicates(values, starts[present], lengths[present], replicates, seed, statistics, jobs)
+
+    for statistic in statistics:
+        low, high = percentileInterval(distributions[statistic], confidence)
+        for name, column in [(statistic, estimates[statistic]), (statistic + '_low', low), (statistic + '_high', high)]:
+            result[name] = np.nan
+            result.loc[present, name] = column
+
+    return result
+
+#%% Cluster bootstrap
+def clusterSegments(data, value, cluster):
+    '''Returns the values without missing values sorted by cluster, and the start and length of every cluster in them.
+    Rows without a cluster, such as a missing DOI, are clusters of their own'''
+    values = data[value].to_numpy(dtype = np.float64, na_value = np.nan)
+    codes, clusters = pd.factorize(data[cluster])
+    keep = ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+
+    missing = codes < 0
+    codes[missing] = len(clusters) + np.arange(np.count_nonzero(missing))
+    order = np.argsort(codes, kind = 'stable')
+    values = values[order]
+
+    lengths = np.bincount(codes)
+    lengths = lengths[lengths > 0]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    return values, starts, lengths
+
+def clusterBatch(values, starts, lengths, replicates, seed, withinClusters = True):
+    '''Draw a batch of cluster bootstrap replicates and return a dictionary with the mean, standard deviation and number of values of every replicate.
+    Each replicate resamples the clusters with replacement, and with withinClusters the values within each chosen cluster with replacement as well'''
+    rng = np.random.default_rng(seed)
+    chosen = (rng.random((replicates, len(lengths)))*len(lengths)).astype(np.int64)
+    sizes = lengths[chosen]
+    totals = sizes.sum(axis = 1)
+
+    # One position per resampled value. The values of replicate r follow after each other, from ends[r-1] to ends[r]
+    # 32 bit positions and random numbers, when the positions fit, are faster to make and to index with
+    dtype = np.int32 if len(values) < 2**31 else np.int64
+    sizes = sizes.ravel().astype(dtype)
+    clusterStarts = np.repeat(starts[chosen].ravel().astype(dtype), sizes)
+    if withinClusters:
+        clusterLengths = np.repeat(sizes, sizes)
+        positions = clusterStarts + (rng.random(len(clusterLengths), dtype = np.float32)*clusterLengths).astype(dtype)
+    else:
+        positions = clusterStarts + np.arange(len(clusterStarts)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    # Sums of the values, shifted by the overall mean so that the sums of squares keep their precision
+    shift = values.mean()
+    resampled = values[positions] - shift
+    replicateStarts = np.concatenate([[0], np.cumsum(totals)[:-1]])
+    sums = np.add.reduceat(resampled, replicateStarts)
+    squares = np.add.reduceat(resampled**2, replicateStarts)
+
+    mean = sums/totals
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        std = np.sqrt(np.maximum(squares - totals*mean**2, 0)/(totals - 1))
+    return {'mean': mean + shift, 'std': std, 'n': totals}
+
+def clusterReplicates(data, value, cluster = 'Ref_DOI_number', replicates = 10000, seed = 0, withinClusters = True, jobs = 1):
+    '''Returns a dictionary with the mean, standard deviation (ddof = 1) and number of values of value in every replicate of a cluster bootstrap,
+    where the clusters, by default the papers, are resampled and then the rows within them'''
+    values, starts, lengths = clusterSegments(data, value, cluster)
+    if len(values) == 0:
+        return {'mean': np.full(replicates, np.nan), 'std': np.full(replicates, np.nan), 'n': np.zeros(replicates, dtype = np.int64)}
+    return runBatches(clusterBatch, values, starts, lengths, replicates, seed, (withinClusters,), jobs)
+
+def clusterBootstrap(data, value, cluster = 'Ref_DOI_number', replicates = 10000, confidence = 0.95, seed = 0, withinClusters = True, jobs = 1):
+    '''Returns the mean and standard deviation of value with cluster bootstrap confidence intervals, as a dataframe with the rows mean and std
+    and the columns estimate, low and high. Use this instead of the row level statistics when many rows come from the same paper'''
+    values = data[value].dropna()
+    distributions = clusterReplicates(data, value, cluster, replicates, seed, withinClusters, jobs)
+    result = pd.DataFrame({'estimate': [values.mean(), values.std()]}, index = pd.Index(['mean', 'std'], name = value))
+    for statistic in result.index:
+        result.loc[statistic, 'low'], result.loc[statistic, 'high'] = percentileInterval(distributions[statistic][np.isfinite(distributions[statistic])], confidence)
+    return result
@@ -0,0 +1,85 @@
+# =============================================================================
+# Build manifest for incremental figure builds
+#
+# For every figure script the manifest records what its figures were made
+# from: the hash of the database file, the columns the script uses, the hash
+# of the script and of the repository modules it imports, and the plotting
+# parameters used by saveFigure. It also records the files saveFigure wrote.
+# A figure only needs to be rebuilt when one of these inputs has changed or
+# one of its files is missing.
+# =============================================================================
+
+import hashlib
+import inspect
+import json
+import os
+
+import DatabaseSchema
+import UtilityFunctions
+
+MANIFEST_NAME = 'build_manifest.json'
+
+def sourceHash(path):
+    '''Returns the sha256 hash of a source file'''
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def localModules(module, folder = None):
+    '''Returns the modules from the Figure_scripts folder that a module imports, directly or through other modules in the folder, sorted by name'''
+    if folder is None:
+        folder = os.path.dirname(os.path.abspath(module.__file__))
+
+    found = {}
+    pending = [module]
+    while pending:
+        current = pending.pop()
+        for value in vars(current).values():
+            if not inspect.ismodule(value) or value.__name__ in found:
+                continue
+            path = getattr(value, '__file__', None)
+            if path is not None and os.path.dirname(os.path.abspath(path)) == folder and value is not module:
+                found[value.__name__] = value
+                pending.append(value)
+
+    return [found[name] for name in sorted(found)]
+
+def figureInputs(module, dataHash):
+    '''Returns the inputs the figures of a script depend on'''
+    return {
+            'data': dataHash,
+            'schema': DatabaseSchema.schemaHash(),
+            'columns': list(module.dataColumnsToUse()),
+            'script': sourceHash(module.__file__),
+            'modules': {local.__name__: sourceHash(local.__file__) for local in localModules(module)},
+            'parameters': UtilityFunctions.figureParameters(),
+        }
+
+def manifestPath(path_figure_folder):
+    return os.path.join(path_figure_folder, MANIFEST_NAME)
+
+def readManifest(path_figure_folder):
+    '''Returns the manifest of the figure folder, or an empty manifest if there is none or it cannot be read'''
+    try:
+        with open(manifestPath(path_figure_folder)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def writeManifest(path_figure_folder, manifest):
+    '''Write the manifest. Written to a temporary file first so that an interupted write never leaves a broken manifest'''
+    path_tmp = manifestPath(path_figure_folder) + '.tmp'
+    with open(path_tmp, 'w') as f:
+        json.dump(manifest, f, indent = 1, sort_keys = True)
+    os.replace(path_tmp, manifestPath(path_figure_folder))
+
+def isUpToDate(manifest, name, inputs, path_figure_folder):
+    '''Returns True if the figures of a script were built from the given inputs and all of them still exist'''
+    entry = manifest.get(name)
+    if entry is None or entry['inputs'] != inputs or not entry['outputs']:
+        return False
+    return all(os.path.isfile(os.path.join(path_figure_folder, fileName)) for fileName in entry['outputs'])
+
+def recordBuild(manifest, name, inputs, outputs):
+    '''Record that the figures of a script were built from the given inputs, writing the given files'''
+    manifest[name] = {'inputs': inputs, 'outputs': sorted(os.path.basename(path) for path in outputs)}
+    return manifest
@@ -0,0 +1,235 @@
+# =============================================================================
+# Lazy queries over the database snapshot
+#
+# A query is built from select, where, derive and groupBy steps and nothing is
+# read until collect() is called. Before reading, the query is planned:
+#   - only the selected columns, and the columns the predicates and groups
+#     need, are read from the parquet snapshot
+#   - the standard filters (see FilterIndex) are taken from the stored
+#     bitmaps, other predicates are answered by the indexed local store (see
+#     LocalStore), and the rest are evaluated on their own column only
+#   - predicates are evaluated on the values as initialDataManipulation cleans
+#     them, so a band gap of '1.55 | 1.6' is compared as 1.55
+#   - the selected columns are only materialised for the matching rows, in one
+#     step, so there are no intermediate copies of the frame
+#
+# Example, the data of the figures in fig_S_08_HTL:
+#     Query(path_data).select(dataColumnsToUse()).where('light_intensity', 'EQE_measured').collect()
+# =============================================================================
+
+import numpy as np
+import pandas as pd
+
+import DerivedMetrics
+import FilterIndex
+import LocalStore
+import UtilityFunctions
+
+OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'between', 'in', 'notna', 'top')
+
+class Query:
+    '''A lazy query over the snapshot of a database file. Every step returns a new query'''
+
+    def __init__(self, path_data, columns = None, predicates = (), derived = (), groups = None, aggregations = None, clean = True):
+        self.path_data = path_data
+        self.columns = columns
+        self.predicates = tuple(predicates)
+        self.derived = tuple(derived)
+        self.groups = groups
+        self.aggregations = aggregations
+        self.clean = clean
+
+    def _replace(self, **changes):
+        arguments = dict(columns = self.columns, predicates = self.predicates, derived = self.derived,
+                         groups = self.groups, aggregations = self.aggregations, clean = self.clean)
+        arguments.update(changes)
+        return Query(self.path_data, **arguments)
+
+    #%% Building the query
+    def select(self, *columns):
+        '''Keep the given columns. Columns can be given one by one or as lists, and can include derived metrics such as Jsc_over_Jqe'''
+        selected = []
+        for column in columns:
+            selected += [column] if isinstance(column, str) else list(column)
+        return self._replace(columns = list(dict.fromkeys(selected)))
+
+    def where(self, *predicates):
+        '''Keep the rows passing all the predicates. A predicate is the name of a standard filter, such as 'EQE_measured',
+        or a tuple (column, operator, value) with one of the operators in OPERATORS. ('column', 'top', n) keeps the rows with
+        one of the n most common values of the column, counted among the rows passing the predicates before it.
+        The values are compared as initialDataManipulation cleans them, with the number list columns as the number of their first value'''
+        for predicate in predicates:
+            if not isinstance(predicate, str) and predicate[1] not in OPERATORS:
+                raise ValueError('Unknown operator: {}. Available operators: {}'.format(predicate[1], ', '.join(OPERATORS)))
+        return self._replace(predicates = self.predicates + tuple(predicate if isinstance(predicate, str) else tuple(predicate) for predicate in predicates))
+
+    def derive(self, name, function = None, inputs = ()):
+        '''Add a column. Without a function the name must be a derived metric in DerivedMetrics, which is read from the stored metrics.
+        Otherwise function(data) is called on the result, and inputs are the columns it needs'''
+        if function is None and not DerivedMetrics.isMetric(name):
+            raise ValueError('{} is not a derived metric. Available metrics: {}'.format(name, ', '.join(DerivedMetrics.metricDefinitions())))
+        return self._replace(derived = self.derived + ((name, function, tuple(inputs)),))
+
+    def groupBy(self, by, aggregations):
+        '''Group the result by one or more columns and aggregate it, as in DataFrame.groupby(by).agg(aggregations)'''
+        return self._replace(groups = [by] if isinstance(by, str) else list(by), aggregations = aggregations)
+
+    #%% Planning
+    def plan(self):
+        '''Returns the plan the query is executed with: which columns are read from the snapshot and from the stored metrics,
+        the predicates in the order they are evaluated, and the columns of the result'''
+        predicateColumns = [predicate[0] for predicate in self.predicates if not isinstance(predicate, str)]
+        derivedInputs = [column for name, function, inputs in self.derived if function is not None for column in inputs]
+        output = list(self.columns) if self.columns is not None else None
+        if output is not None:
+            output += [name for name, function, inputs in self.derived if name not in output]
+
+        # Without a selection all stored columns are read, together with the derived metrics asked for
+        computed = [name for name, function, inputs in self.derived if function is not None]
+        if output is None:
+            needed = None
+            metrics = [name for name, function, inputs in self.derived if function is None]
+        else:
+            needed = [column for column in dict.fromkeys(output + derivedInputs + (self.groups or [])) if column not in computed]
+            metrics = [column for column in needed if DerivedMetrics.isMetric(column)]
+
+        # Consecutive standard filters are combined into one AND of their bitmaps
+        steps = []
+        for predicate in self.predicates:
+            if isinstance(predicate, str):
+                if steps and steps[-1][0] == 'bitmaps':
+                    steps[-1][1].append(predicate)
+                else:
+                    steps.append(('bitmaps', [predicate]))
+            else:
+                steps.append(('predicate', predicate))
+
+        return {
+                'read': None if needed is None else [column for column in needed if not DerivedMetrics.isMetric(column)],
+                'metrics': metrics,
+                'predicateColumns': list(dict.fromkeys(predicateColumns)),
+                'steps': steps,
+                'output': output,
+            }
+
+    def explain(self):
+        '''Returns a readable description of the plan'''
+        plan = self.plan()
+        lines = ['Read columns: ' + ('all' if plan['read'] is None else ', '.join(plan['read']))]
+        if plan['metrics']:
+            lines.append('Read metrics: ' + ', '.join(plan['metrics']))
+        for kind, step in plan['steps']:
+            if kind == 'bitmaps':
+                lines.append('Filter: ' + ' AND '.join(step) + ' (bitmaps)')
+            else:
+                indexed = LocalStore.loadedStore is not None and LocalStore.loadedStore.answers(step)
+                lines.append('Filter: {} {} {}'.format(*step) + (' (local store)' if indexed else ''))
+        if self.groups:
+            lines.append('Group by: ' + ', '.join(self.groups))
+        return '\n'.join(lines)
+
+    #%% Execution
+    def _mask(self, path_snapshot, steps, length):
+        '''Evaluate the predicates. Predicates the local store answers are looked up in its indexes, and for the others only the columns they are on are read'''
+        import pyarrow.parquet as pq
+
+        store = LocalStore.loadedStore
+        mask = np.ones(length, dtype = bool)
+        values = {}
+        for kind, step in steps:
+            if kind == 'bitmaps':
+                mask &= FilterIndex.loadedIndex.mask(step)
+                continue
+            if store is not None and store.length == length and store.answers(step):
+                mask &= store.mask([step])
+                continue
+
+            column, operator, value = step
+            if column in values:
+                pass
+            elif DerivedMetrics.isMetric(column):
+                values[column] = UtilityFunctions.loadDerivedMetrics(path_snapshot, [column])[column]
+            else:
+                values[column] = UtilityFunctions.initialDataManipulation(pq.read_table(path_snapshot, columns = [column]).to_pandas())[column]
+            mask &= evaluatePredicate(values[column], operator, value, mask)
+        return mask
+
+    def _rows(self, path_snapshot):
+        import pyarrow.parquet as pq
+
+        plan = self.plan()
+        length = pq.read_metadata(path_snapshot).num_rows
+        positions = np.flatnonzero(self._mask(path_snapshot, plan['steps'], length))
+
+        # Only the matching rows of the read columns are converted to a dataframe
+        columns = plan['read']
+        if columns is not None:
+            columns = UtilityFunctions.columnsToLoad(columns, pq.read_schema(path_snapshot).names) if self.clean else columns
+        table = pq.read_table(path_snapshot, columns = columns).take(positions)
+        data = table.to_pandas()
+        data.index = pd.Index(positions)
+        FilterIndex.markSnapshotRows(data, path_snapshot)
+
+        if plan['metrics']:
+            for metric, values in UtilityFunctions.loadDerivedMetrics(path_snapshot, plan['metrics']).items():
+                data[metric] = values.to_numpy()[positions]
+
+        return data
+
+    def collect(self):
+        '''Execute the query and return the result as a dataframe with the selected columns. The index holds the row numbers in the snapshot,
+        so the result can be filtered further with UtilityFunctions.filterRows. With clean = True the columns initialDataManipulation uses
+        are read to clean the data, but only returned if selected'''
+        path_snapshot = UtilityFunctions.ensureSnapshot(self.path_data)
+        data = self._rows(path_snapshot)
+
+        if self.clean:
+            data = UtilityFunctions.initialDataManipulation(data)
+
+        for name, function, inputs in self.derived:
+            if function is not None:
+                data[name] = function(data)
+
+        if self.groups:
+            return data.groupby(self.groups, observed = True).agg(self.aggregations)
+
+        output = self.plan()['output']
+        if output is None:
+            return data
+        return data[output]
+
+    def count(self):
+        '''Returns the number of rows passing the predicates, without reading the selected columns'''
+        import pyarrow.parquet as pq
+
+        path_snapshot = UtilityFunctions.ensureSnapshot(self.path_data)
+        return int(np.count_nonzero(self._mask(path_snapshot, self.plan()['steps'], pq.read_metadata(path_snapshot).num_rows)))
+
+def evaluatePredicate(values, operator, value, mask = None):
+    '''Returns a boolean numpy array that is True where values pass the predicate. Missing values never pass.
+    For 'top' the most common values are counted among the rows where mask is True'''
+    if operator == 'top':
+        counted = values[mask] if mask is not None else values
+        common = counted.value_counts().index[:value]
+        passes = values.isin(common)
+    elif operator == 'in':
+        passes = values.isin(value)
+    elif operator == 'notna':
+        passes = values.notna()
+    elif operator == 'between':
+        passes = (values > value[0]) & (values < value[1])
+    elif operator == '==':
+        passes = values == value
+    elif operator == '!=':
+        passes = values != value
+    elif operator == '<':
+        passes = values < value
+    elif operator == '<=':
+        passes = values <= value
+    elif operator == '>':
+        passes = values > value
+    elif operator == '>=':
+        passes = values >= value
+    else:
+        raise ValueError('Unknown operator: {}'.format(operator))
+    return pd.Series(passes).fillna(False).to_numpy(dtype = bool) & pd.Series(values).notna().to_numpy()
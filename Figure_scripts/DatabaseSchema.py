@@ -0,0 +1,286 @@
+# =============================================================================
+# Data types of the columns in the perovskite database
+#
+# Declaring the types up front means the CSV parser does not have to infer
+# them, and gives a frame with booleans, categoricals and datetimes instead of
+# object columns. Columns not listed here are parsed as before.
+# =============================================================================
+
+import hashlib
+
+import pandas as pd
+
+BOOLEAN = 'boolean'
+CATEGORY = 'category'
+DATETIME = 'datetime64[ns]'
+FLOAT32 = 'float32'
+FLOAT64 = 'float64'
+STRING = 'object'
+
+# The parsers readCsv can use. The pyarrow parser splits the file into fields with one thread per core
+CSV_ENGINES = ('pandas', 'pyarrow')
+
+# The parser readCsv uses when none is given, see setCsvEngine
+csvEngine = 'pandas'
+
+# The strings pandas reads as missing values, which the pyarrow parser is given as well
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# The strings pandas reads as booleans in a column without a declared type
+BOOLEAN_STRINGS = {'True', 'TRUE', 'true', 'False', 'FALSE', 'false'}
+
+def columnTypes():
+    ''' Returns a dictionary with the data type of the columns in the database that are used by the figure scripts'''
+    return {
+            # Reference
+            'Ref_DOI_number': STRING,
+            'Ref_publication_date': DATETIME,
+
+            # Cell
+            'Cell_area_measured': FLOAT32,
+            'Cell_architecture': CATEGORY,
+            'Cell_stack_sequence': CATEGORY,
+
+            # Perovskite
+            'Perovskite_composition_short_form': CATEGORY,
+            'Perovskite_deposition_procedure': CATEGORY,
+            'Perovskite_band_gap': STRING, # Can contain several values separated by ' | '
+
+            # Transport layers
+            'HTL_stack_sequence': CATEGORY,
+            'ETL_stack_sequence': CATEGORY,
+
+            # JV data. Quantities that are divided or binned are kept in float64 so that bin assignments are unchanged
+            'JV_light_intensity': FLOAT32,
+            'JV_certified_values': BOOLEAN,
+            'JV_hysteresis_index': FLOAT64,
+            'JV_default_Voc': FLOAT64,
+            'JV_default_Jsc': FLOAT64,
+            'JV_default_FF': FLOAT64,
+            'JV_default_PCE': FLOAT64,
+            'JV_reverse_scan_Voc': FLOAT64,
+            'JV_reverse_scan_Jsc': FLOAT64,
+            'JV_reverse_scan_FF': FLOAT64,
+            'JV_reverse_scan_PCE': FLOAT64,
+            'JV_reverse_scan_Vmp': FLOAT32,
+            'JV_reverse_scan_Jmp': FLOAT32,
+            'JV_forward_scan_Voc': FLOAT64,
+            'JV_forward_scan_Jsc': FLOAT64,
+            'JV_forward_scan_FF': FLOAT64,
+            'JV_forward_scan_PCE': FLOAT64,
+            'JV_forward_scan_Vmp': FLOAT32,
+            'JV_forward_scan_Jmp': FLOAT32,
+
+            # Stabilised performance
+            'Stabilised_performance_measured': BOOLEAN,
+            'Stabilised_performance_procedure': CATEGORY,
+            'Stabilised_performance_PCE': FLOAT64,
+            'Stabilised_performance_Vmp': FLOAT32,
+            'Stabilised_performance_Jmp': FLOAT32,
+
+            # EQE
+            'EQE_measured': BOOLEAN,
+            'EQE_integrated_Jsc': FLOAT64,
+        }
+
+def numberListColumns():
+    ''' Returns the numeric columns where several values can be given, separated by ' | ', for example one per layer'''
+    return [
+            'Substrate_thickness',
+            'ETL_thickness',
+            'HTL_thickness_list',
+            'Perovskite_thickness',
+            'Perovskite_band_gap',
+            'Perovskite_pl_max',
+            'Backcontact_thickness_list',
+        ]
+
+def schemaHash():
+    '''Returns a short hash of the schema. Used to invalidate cached data when the schema changes'''
+    return hashlib.sha256(repr(sorted(columnTypes().items())).encode()).hexdigest()[:16]
+
+def readCsvDtypes(columns):
+    '''Returns the dtype argument to pd.read_csv for the given columns. Dates are read as strings and converted by applySchema'''
+    dtypes = {}
+    for column in columns:
+        dtype = columnTypes().get(column)
+        if dtype is None:
+            continue
+        dtypes[column] = str if dtype in (DATETIME, STRING) else dtype
+    return dtypes
+
+def convertBoolean(column):
+    '''Convert a column to the nullable boolean type. Values that are not recognised as true or false become missing'''
+    if column.dtype == BOOLEAN:
+        return column
+    if column.dtype == bool:
+        return column.astype(BOOLEAN)
+    mapping = {'true': True, 'false': False, '1': True, '0': False, '1.0': True, '0.0': False}
+    return column.astype(str).str.strip().str.lower().map(mapping).astype(BOOLEAN)
+
+def compactUndeclaredColumns(data, maxUniqueFraction = 0.5):
+    '''Store text columns that are not in the schema as categoricals when they contain few distinct values, which most free text fields in the database do'''
+    declared = columnTypes()
+    for column in data.columns[data.dtypes == object]:
+        if column in declared:
+            continue
+        values = data[column]
+        if values.nunique() <= maxUniqueFraction*len(values):
+            data[column] = values.where(values.isna(), values.astype(str)).astype(CATEGORY)
+
+    return data
+
+def applySchema(data):
+    '''Convert the columns of a dataframe to the types in the schema. Values that cannot be converted become missing'''
+    compactUndeclaredColumns(data)
+
+    for column, dtype in columnTypes().items():
+        if column not in data.columns or data[column].dtype == dtype:
+            continue
+        if dtype == BOOLEAN:
+            data[column] = convertBoolean(data[column])
+        elif dtype in (FLOAT32, FLOAT64):
+            data[column] = pd.to_numeric(data[column], errors = 'coerce').astype(dtype)
+        elif dtype == DATETIME:
+            data[column] = pd.to_datetime(data[column], errors = 'coerce', format = 'ISO8601').astype(DATETIME)
+        elif dtype == CATEGORY:
+            data[column] = data[column].astype(CATEGORY)
+        elif dtype == STRING:
+            data[column] = data[column].where(data[column].isna(), data[column].astype(str)).astype(STRING)
+
+    return data
+
+def setCsvEngine(engine):
+    '''Make engine, one of CSV_ENGINES, the parser readCsv uses by default'''
+    global csvEngine
+    if engine not in CSV_ENGINES:
+        raise ValueError('Unknown CSV engine: {}. Available engines: {}'.format(engine, ', '.join(CSV_ENGINES)))
+    csvEngine = engine
+
+def castsTo(strings, arrowType, head = 1000):
+    '''Returns True if all the strings, with surrounding whitespace removed, can be cast to arrowType. Text columns usually fail
+    within the first few values, so those are tried first'''
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for values in (strings.slice(0, head), strings):
+        try:
+            pc.cast(pc.utf8_trim_whitespace(values), arrowType)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return False
+    return True
+
+def inferArrowColumn(strings):
+    '''Returns a column of strings read by Arrow converted to the type pandas infers for a column without a declared type:
+    integers, then floats, then booleans, and otherwise the strings as they are'''
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for arrowType in (pa.int64(), pa.float64()):
+        if castsTo(strings, arrowType):
+            return pc.cast(pc.utf8_trim_whitespace(strings), arrowType)
+    if set(pc.unique(strings).drop_null().to_pylist()) <= BOOLEAN_STRINGS and strings.null_count < len(strings):
+        return pc.cast(strings, pa.bool_())
+    return strings
+
+def convertArrowColumn(strings, dtype):
+    '''Returns a column of strings read by Arrow converted as pandas parses a column declared with dtype. Values the declared type
+    cannot hold leave the column as strings, which applySchema converts, as when readCsv falls back to parsing without types'''
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if dtype is None:
+        return inferArrowColumn(strings)
+    arrowType = {BOOLEAN: pa.bool_(), FLOAT32: pa.float64(), FLOAT64: pa.float64()}.get(dtype)
+    if arrowType is None or not castsTo(strings, arrowType):
+        return strings
+    return pc.cast(pc.utf8_trim_whitespace(strings), arrowType)
+
+def readCsvArrow(path_data, usecols = None):
+    '''Read the database CSV with the multi-threaded pyarrow CSV parser, giving the same frame as the pandas parser in readCsv.
+    Arrow only splits the file into strings, in parallel. The types are then set per column, as the schema declares them or as pandas would infer them,
+    since Arrow infers the types from the first block of the file only and reads ISO dates as dates, which pandas does not.
+    The number of threads is the size of Arrow's thread pool, one per core unless changed with pyarrow.set_cpu_count'''
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    header = pd.read_csv(path_data, nrows = 0).columns
+    columns = list(header) if usecols is None else [column for column in header if column in usecols]
+
+    options = pacsv.ConvertOptions(include_columns = columns, column_types = {column: pa.string() for column in columns},
+                                   null_values = NA_VALUES, strings_can_be_null = True, quoted_strings_can_be_null = True)
+    table = pacsv.read_csv(path_data, read_options = pacsv.ReadOptions(use_threads = True), convert_options = options)
+    declared = columnTypes()
+    table = pa.table([convertArrowColumn(table.column(column), declared.get(column)) for column in columns], names = columns)
+    data = table.to_pandas(types_mapper = {pa.bool_(): pd.BooleanDtype()}.get)
+
+    # pandas reads undeclared booleans as bool, or as objects if values are missing
+    for column in data.columns:
+        values = data[column]
+        if values.dtype == BOOLEAN and declared.get(column) != BOOLEAN:
+            data[column] = values.astype(bool) if not values.hasnans else values.astype(object).where(values.notna())
+    data = applySchema(data)
+
+    # pandas gives missing strings as NaN rather than None. Only the columns left as text after applySchema hold any
+    for column in data.columns[data.dtypes == object]:
+        data[column] = data[column].where(data[column].notna())
+    return data
+
+def readCsv(path_data, usecols = None, engine = None):
+    '''Read the database CSV with the column types given by the schema. If the file contains values the declared types cannot hold,
+    the file is parsed without types and the values are converted by applySchema instead.
+    engine is the parser to use, one of CSV_ENGINES, by default the one set by setCsvEngine. Both give the same frame'''
+    engine = csvEngine if engine is None else engine
+    if engine == 'pyarrow':
+        return readCsvArrow(path_data, usecols)
+    if engine != 'pandas':
+        raise ValueError('Unknown CSV engine: {}. Available engines: {}'.format(engine, ', '.join(CSV_ENGINES)))
+
+    header = pd.read_csv(path_data, nrows = 0).columns
+    columns = header if usecols is None else [column for column in header if column in usecols]
+
+    try:
+        data = pd.read_csv(path_data, usecols = usecols, dtype = readCsvDtypes(columns), low_memory=False)
+    except (ValueError, TypeError):
+        data = pd.read_csv(path_data, usecols = usecols, low_memory=False)
+
+    return applySchema(data)
+
+def readCsvChunks(path_data, usecols = None, chunkSize = 100000):
+    '''Read the database CSV in chunks of chunkSize rows, with the column types given by the schema, and yield each chunk as a dataframe.
+    Only one chunk is in memory at a time. The index of a chunk holds the row numbers in the file.
+    Categorical columns get the categories of the chunk, so they differ between chunks'''
+    header = pd.read_csv(path_data, nrows = 0).columns
+    columns = header if usecols is None else [column for column in header if column in usecols]
+
+    # If a chunk contains values the declared types cannot hold, the rest of the file is parsed without types
+    done = 0
+    try:
+        for chunk in pd.read_csv(path_data, usecols = usecols, dtype = readCsvDtypes(columns), chunksize = chunkSize):
+            yield applySchema(chunk)
+            done += 1
+    except (ValueError, TypeError):
+        for i, chunk in enumerate(pd.read_csv(path_data, usecols = usecols, chunksize = chunkSize)):
+            if i >= done:
+                yield applySchema(chunk)
+
+def concatChunks(chunks):
+    '''Concatenate chunks read by readCsvChunks into one dataframe, as readCsv would have read them.
+    Declared categorical columns get the union of the categories of the chunks, and undeclared text columns are compacted again'''
+    if not chunks:
+        return pd.DataFrame()
+    declared = columnTypes()
+    for column in chunks[0].columns:
+        if not any(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            continue
+        if declared.get(column) == CATEGORY:
+            categories = pd.api.types.union_categoricals([chunk[column] for chunk in chunks], sort_categories = True).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+        else:
+            for chunk in chunks:
+                chunk[column] = chunk[column].astype(object)
+
+    return compactUndeclaredColumns(pd.concat(chunks))
+
@@ -0,0 +1,154 @@
+# =============================================================================
+# Derived metrics
+#
+# The ratios the figures are about, such as Jsc_over_Jqe, are declared here
+# once instead of being recomputed in every script. A metric is a ratio of two
+# columns, which can themselves be metrics. Divisions by zero and other
+# non-finite results become NaN, so that no script has to remove inf values.
+#
+# The metrics are stored next to the parquet snapshot, together with a hash of
+# the definition and of the input columns of each metric. A stored metric is
+# only recomputed when its definition or its input columns change.
+# =============================================================================
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+METADATA_KEY = b'derived_metrics'
+
+def metricDefinitions():
+    '''Returns a dictionary from metric name to (numerator, denominator). The numerator and denominator are columns in the database or other metrics'''
+    return {
+            'Jsc_over_Jqe': ('JV_default_Jsc', 'EQE_integrated_Jsc'),
+            'Jsc_forward_over_Jqe': ('JV_forward_scan_Jsc', 'EQE_integrated_Jsc'),
+            'PCEsc_over_PCEstab': ('JV_reverse_scan_PCE', 'Stabilised_performance_PCE'),
+            'Jsc_over_Jqe_vs_PCEsc_over_PCEstab': ('Jsc_over_Jqe', 'PCEsc_over_PCEstab'),
+        }
+
+def isMetric(column):
+    return column in metricDefinitions()
+
+def baseColumns(names):
+    '''Returns the database columns the given metrics are computed from'''
+    columns = []
+    for name in names:
+        for column in metricDefinitions()[name]:
+            columns += baseColumns([column]) if isMetric(column) else [column]
+    return list(dict.fromkeys(columns))
+
+def computableMetrics(columns):
+    '''Returns the metrics that can be computed from the given columns'''
+    return [name for name in metricDefinitions() if all(column in columns for column in baseColumns([name]))]
+
+def ratio(numerator, denominator):
+    '''Returns numerator/denominator as a float64 series. Results that are not finite, from a zero denominator or missing values, become NaN'''
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        values = numerator.to_numpy(dtype = np.float64, na_value = np.nan)/denominator.to_numpy(dtype = np.float64, na_value = np.nan)
+    values[~np.isfinite(values)] = np.nan
+    return pd.Series(values, index = numerator.index)
+
+def computeMetric(data, name):
+    '''Returns a metric computed from the columns in the data. Metrics the metric depends on are taken from the data if present, otherwise computed'''
+    numerator, denominator = [data[column] if column in data.columns or not isMetric(column) else computeMetric(data, column)
+                              for column in metricDefinitions()[name]]
+    return ratio(numerator, denominator).rename(name)
+
+def addMetrics(data, names = None):
+    '''Add the given metrics, or all metrics that can be computed from the columns in the data, as columns to the data'''
+    if names is None:
+        names = computableMetrics(data.columns)
+    for name in names:
+        data[name] = computeMetric(data, name)
+    return data
+
+def columnHash(column):
+    '''Returns a short hash of the values in a column'''
+    return hashlib.sha256(pd.util.hash_pandas_object(column, index = False).to_numpy().tobytes()).hexdigest()[:16]
+
+def metricHash(data, name):
+    '''Returns a hash of the definition of a metric and of the values of the columns it is computed from'''
+    key = {
+            'definition': metricDefinitions()[name],
+            'dependencies': {column: metricHash(data, column) for column in metricDefinitions()[name] if isMetric(column)},
+            'inputs': {column: columnHash(data[column]) for column in metricDefinitions()[name] if not isMetric(column)},
+        }
+    return hashlib.sha256(json.dumps(key, sort_keys = True).encode()).hexdigest()[:16]
+
+def definitionHash(name):
+    '''Returns a hash of the definition of a metric, including the metrics it depends on'''
+    key = [metricDefinitions()[name]] + [definitionHash(column) for column in metricDefinitions()[name] if isMetric(column)]
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+
+#%% Storing the metrics
+def load(path):
+    '''Returns the stored metrics and a dictionary from metric name to its hashes. Both are empty if nothing is stored'''
+    if not os.path.isfile(path):
+        return pd.DataFrame(), {}
+
+    import pyarrow.parquet as pq
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    hashes = json.loads(metadata.get(METADATA_KEY, b'{}'))
+    return table.to_pandas(), hashes
+
+def save(path, metrics, hashes):
+    '''Store the metrics and their hashes. Written to a temporary file first so that an interupted write never leaves a broken file'''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(metrics, preserve_index = False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(hashes).encode()})
+    path_tmp = path + '.tmp'
+    pq.write_table(table, path_tmp)
+    os.replace(path_tmp, path)
+
+def isCurrent(stored, hashes, names, length):
+    '''Returns True if the stored metrics contain the given metrics, for the right number of rows, computed with the present definitions'''
+    return len(stored) == length and all(name in stored.columns and hashes.get(name, {}).get('definition') == definitionHash(name) for name in names)
+
+def updateMetrics(stored, hashes, data, names = None):
+    '''Recompute the stored metrics whose definition or input columns differ from the data, and add metrics that are missing.
+    The data must hold the base columns of the metrics. Returns the metrics, their hashes and the names of the metrics that were recomputed'''
+    if names is None:
+        names = computableMetrics(data.columns)
+    if len(stored) != len(data):
+        stored, hashes = pd.DataFrame(index = range(len(data))), {}
+
+    stored = stored.copy()
+    hashes = dict(hashes)
+    recomputed = []
+    for name in names:
+        inputs = metricHash(data, name)
+        if name in stored.columns and hashes.get(name) == {'definition': definitionHash(name), 'inputs': inputs}:
+            continue
+        stored[name] = computeMetric(data, name).to_numpy()
+        hashes[name] = {'definition': definitionHash(name), 'inputs': inputs}
+        recomputed.append(name)
+
+    return stored, hashes, recomputed
+
+def updateRows(stored, hashes, data, previous, names = None):
+    '''Returns the metrics and their hashes for a new version of the data, where previous holds for every row of the data the row of the stored metrics
+    it is the same as, or -1 for new and changed rows. Stored metrics made with the present definitions are copied for the unchanged rows
+    and only computed for the other rows. The other metrics are computed for all rows'''
+    if names is None:
+        names = computableMetrics(data.columns)
+    changed = previous < 0
+
+    metrics = pd.DataFrame(index = range(len(data)))
+    updated = {}
+    for name in names:
+        if name in stored.columns and hashes.get(name, {}).get('definition') == definitionHash(name):
+            values = np.empty(len(data))
+            values[~changed] = stored[name].to_numpy(dtype = np.float64, na_value = np.nan)[previous[~changed]]
+            values[changed] = computeMetric(data[changed], name).to_numpy()
+        else:
+            values = computeMetric(data, name).to_numpy()
+        metrics[name] = values
+        updated[name] = {'definition': definitionHash(name), 'inputs': metricHash(data, name)}
+
+    return metrics, updated
@@ -0,0 +1,229 @@
+# =============================================================================
+# Produce all figures, or a selection of them, in one process
+#
+# Every fig_*.py script defines dataColumnsToUse(), prepareData(data) and
+# makeFigures(data, path_figure_folder, save). The runner loads the columns
+# used by the selected figures once, cleans them once, and then hands the
+# cleaned data to each figure in turn. The runner saves every figure. A
+# script run on its own shows its figures instead, as the scripts did before,
+# apart from the PCE boxplot of S_01, which it saves as before.
+#
+# Figures whose data, script, shared code and plotting parameters are unchanged
+# since the last build, and whose files still exist, are skipped. The inputs of
+# each build are recorded in build_manifest.json in the figure folder.
+#
+# Usage, from the Figure_scripts folder:
+#     python FigureRunner.py                  all figures
+#     python FigureRunner.py 1a S_01 S_08     a selection of figures
+#     python FigureRunner.py --jobs 8         render the figures in 8 processes
+#     python FigureRunner.py --force          rebuild figures that are up to date
+#     python FigureRunner.py --csv-engine pyarrow   parse a new database file with all cores
+#     python FigureRunner.py --ingest         make the snapshot of a new database file from the previous one
+#     python FigureRunner.py --list           list the figure names
+# =============================================================================
+
+import argparse
+import concurrent.futures
+import glob
+import importlib
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+
+import matplotlib
+matplotlib.use('Agg') # Figures are only saved, never shown
+
+import BuildManifest
+import DatabaseSchema
+import FilterIndex
+import HistogramCube
+import Ingest
+import LocalStore
+import UtilityFunctions
+
+def figureName(moduleName):
+    '''Returns the short name of a figure script, such as '1a', 'S_01' or 'Unused_2' for fig_Unused_2_Standard_distribution'''
+    match = re.match(r'^fig_((?:S_|Unused_)?[0-9]+[a-z]?)_', moduleName)
+    return match.group(1) if match else moduleName[len('fig_'):]
+
+def figureRegistry(folder = None):
+    '''Returns a dictionary from figure name to the module name of every fig_*.py script in the folder'''
+    if folder is None:
+        folder = os.path.dirname(os.path.abspath(__file__))
+
+    registry = {}
+    for path in sorted(glob.glob(os.path.join(folder, 'fig_*.py'))):
+        moduleName = os.path.splitext(os.path.basename(path))[0]
+        registry[figureName(moduleName)] = moduleName
+
+    return registry
+
+def selectFigures(names = None):
+    '''Returns a dictionary from figure name to the imported module for the given figure names, or for all figures'''
+    registry = figureRegistry()
+    if not names:
+        names = list(registry)
+
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        raise ValueError('Unknown figures: {}. Available figures: {}'.format(', '.join(unknown), ', '.join(registry)))
+
+    return {name: importlib.import_module(registry[name]) for name in names}
+
+def dataColumnsToUse(modules):
+    '''Returns the columns used by any of the figure modules'''
+    columns = []
+    for module in modules.values():
+        columns += module.dataColumnsToUse()
+    return list(dict.fromkeys(columns))
+
+def loadFigureData(path_data, modules):
+    '''Load and clean the columns used by the figure modules'''
+    data = UtilityFunctions.loadDatabase(path_data, columns = dataColumnsToUse(modules))
+    return UtilityFunctions.initialDataManipulation(data)
+
+def runFigure(module, data, path_figure_folder):
+    '''Prepare the data for one figure script and save its figures. Returns the paths of the saved files'''
+    del UtilityFunctions.savedFigures[:]
+    module.makeFigures(module.prepareData(data), path_figure_folder, save = True)
+    return list(UtilityFunctions.savedFigures)
+
+def timeFigure(name, module, data, path_figure_folder):
+    '''Run one figure script and return its name, the time it took, whether it succeeded and the files it saved. A failure is printed, not raised'''
+    start = time.perf_counter()
+    try:
+        outputs = runFigure(module, data, path_figure_folder)
+        status = 'ok'
+    except Exception:
+        traceback.print_exc()
+        outputs = []
+        status = 'failed'
+    return name, time.perf_counter() - start, status, outputs
+
+#%% Parallel rendering
+# The cleaned data and figure folder of a worker process, set once when the worker starts
+workerData = None
+workerFigureFolder = None
+
+def initialiseWorker(data, path_figure_folder, filterIndex, histogramCube, localStore):
+    '''Store the cleaned data, and register the filter bitmaps, histogram cube and local store of the snapshot, in a worker process.
+    The data is pickled once per worker instead of once per figure'''
+    global workerData, workerFigureFolder
+    workerData = data
+    workerFigureFolder = path_figure_folder
+    FilterIndex.register(filterIndex)
+    HistogramCube.register(histogramCube)
+    LocalStore.register(localStore)
+
+def runFigureInWorker(name):
+    '''Run one figure script in a worker process'''
+    return timeFigure(name, selectFigures([name])[name], workerData, workerFigureFolder)
+
+def workerContext():
+    '''Returns the multiprocessing context of the worker processes. The data has been read with pyarrow, and possibly numpy, by then, whose thread pools
+    are not safe to fork, so the workers are started from a fresh process with forkserver, or spawn where forkserver is not available'''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def processPool(jobs, data, path_figure_folder):
+    '''Returns a pool of worker processes holding the cleaned data and the files of the snapshot registered in this process'''
+    return concurrent.futures.ProcessPoolExecutor(max_workers = jobs, mp_context = workerContext(), initializer = initialiseWorker,
+                                                  initargs = (data, path_figure_folder, FilterIndex.loadedIndex, HistogramCube.loadedCube, LocalStore.loadedStore))
+
+#%% Producing the figures
+def outdatedFigures(modules, inputs, manifest, path_figure_folder):
+    '''Returns the modules whose figures were not built from the given inputs, or whose files are missing'''
+    return {name: module for name, module in modules.items() if not BuildManifest.isUpToDate(manifest, name, inputs[name], path_figure_folder)}
+
+def runFigures(names, path_data, path_figure_folder, jobs = 1, force = False):
+    '''Produce the given figures, or all figures, and return the time each step took. Figures that are up to date are skipped unless force = True.
+    With jobs > 1 the figures are rendered in that many processes. A figure that fails is reported and the others still run'''
+    modules = selectFigures(names)
+    os.makedirs(path_figure_folder, exist_ok = True)
+
+    timings = {}
+    start = time.perf_counter()
+    manifest = BuildManifest.readManifest(path_figure_folder)
+    dataHash = UtilityFunctions.fileHash(path_data)
+    inputs = {name: BuildManifest.figureInputs(module, dataHash) for name, module in modules.items()}
+    outdated = modules if force else outdatedFigures(modules, inputs, manifest, path_figure_folder)
+    timings['Checking inputs'] = (time.perf_counter() - start, 'ok')
+
+    if not outdated:
+        return {**timings, **{name: (0.0, 'up to date') for name in modules}}
+
+    start = time.perf_counter()
+    data = loadFigureData(path_data, outdated)
+    timings['Loading data'] = (time.perf_counter() - start, 'ok')
+
+    if jobs > 1:
+        pool = processPool(min(jobs, len(outdated)), data, path_figure_folder)
+        results = pool.map(runFigureInWorker, outdated)
+    else:
+        pool = None
+        results = (timeFigure(name, module, data, path_figure_folder) for name, module in outdated.items())
+
+    # Record each build as soon as it finishes, so that an interrupted run keeps the figures already made
+    built = {}
+    for name, seconds, status, outputs in results:
+        built[name] = (seconds, status)
+        if status == 'ok':
+            BuildManifest.recordBuild(manifest, name, inputs[name], outputs)
+        else:
+            manifest.pop(name, None)
+        BuildManifest.writeManifest(path_figure_folder, manifest)
+
+    if pool is not None:
+        pool.shutdown()
+
+    for name in modules:
+        timings[name] = built.get(name, (0.0, 'up to date'))
+
+    return timings
+
+def printTimings(timings, wallTime = None):
+    '''Print the time each step took. When the figures are rendered in parallel the wall time is shorter than the total'''
+    print('')
+    print('{:<16}{:>10}  {}'.format('Step', 'Time [s]', 'Status'))
+    for name, (seconds, status) in timings.items():
+        print('{:<16}{:>10.2f}  {}'.format(name, seconds, status))
+    print('{:<16}{:>10.2f}'.format('Total', sum(seconds for seconds, status in timings.values())))
+    if wallTime is not None:
+        print('{:<16}{:>10.2f}'.format('Wall time', wallTime))
+
+#%% Run
+if __name__ == '__main__':
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+
+    parser = argparse.ArgumentParser(description = 'Produce the figures in one process')
+    parser.add_argument('figures', nargs = '*', help = 'Names of the figures to produce, such as 1a or S_01. All figures if none are given')
+    parser.add_argument('--data', default = os.path.join(top_directory, 'Data', 'Perovskite_database_content_all_data.csv'), help = 'Path to the database CSV file')
+    parser.add_argument('--figures-folder', default = os.path.join(top_directory, 'Figures'), help = 'Folder the figures are saved in')
+    parser.add_argument('--jobs', type = int, default = 1, help = 'Number of processes to render the figures in. 0 means one per core')
+    parser.add_argument('--force', action = 'store_true', help = 'Rebuild the figures even if they are up to date')
+    parser.add_argument('--list', action = 'store_true', help = 'List the available figures and exit')
+    parser.add_argument('--csv-engine', choices = DatabaseSchema.CSV_ENGINES, default = DatabaseSchema.csvEngine, help = 'Parser used when the database file has no snapshot yet')
+    parser.add_argument('--ingest', action = 'store_true', help = 'Make the snapshot of a new database file from the snapshot of the previous one, processing only new and changed rows')
+    args = parser.parse_args()
+    DatabaseSchema.setCsvEngine(args.csv_engine)
+
+    if args.list:
+        for name, moduleName in figureRegistry().items():
+            print('{:<10} {}'.format(name, moduleName))
+        sys.exit(0)
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    start = time.perf_counter()
+    if args.ingest:
+        Ingest.ingestRelease(args.data)
+    timings = runFigures(args.figures, args.data, args.figures_folder, jobs = jobs, force = args.force)
+    printTimings(timings, wallTime = time.perf_counter() - start)
+
+    if any(status == 'failed' for seconds, status in timings.values()):
+        sys.exit(1)
@@ -0,0 +1,156 @@
+# =============================================================================
+# Precomputed row filters
+#
+# Most figure scripts keep the same rows: measurements at standard light
+# intensity, and cells where EQE, certified values or a stabilised efficiency
+# were measured. Each filter is evaluated once per version of the database and
+# stored as a packed bitmap, one bit per row, next to the parquet snapshot.
+# Combining filters is then a bitwise AND of the bitmaps, and the scripts
+# select the rows and columns they need in one step.
+# =============================================================================
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+def filterDefinitions():
+    '''Returns a dictionary from filter name to (column, operator, value)'''
+    return {
+            'light_intensity': ('JV_light_intensity', 'between', (90, 110)), # Exclusive of the end points
+            'EQE_measured': ('EQE_measured', '==', True),
+            'certified': ('JV_certified_values', '==', True),
+            'stabilised': ('Stabilised_performance_measured', '==', True),
+        }
+
+def definitionsHash():
+    '''Returns a short hash of the filter definitions. Stored bitmaps made with other definitions are rebuilt'''
+    return hashlib.sha256(repr(sorted(filterDefinitions().items())).encode()).hexdigest()[:16]
+
+def filterColumns(names = None):
+    '''Returns the columns the given filters, or all filters, are evaluated on'''
+    definitions = filterDefinitions()
+    if names is None:
+        names = list(definitions)
+    return list(dict.fromkeys(definitions[name][0] for name in names))
+
+def evaluateFilter(data, name):
+    '''Returns a boolean numpy array that is True for the rows of the data passing a filter. Missing values never pass'''
+    column, operator, value = filterDefinitions()[name]
+    values = data[column]
+    if operator == 'between':
+        passes = (values > value[0]) & (values < value[1])
+    elif operator == '==':
+        passes = values == value
+    else:
+        raise ValueError('Unknown filter operator: {}'.format(operator))
+    return pd.Series(passes).fillna(False).to_numpy(dtype = bool)
+
+def evaluateFilters(data, names):
+    '''Returns a boolean numpy array that is True for the rows of the data passing all the given filters, evaluated on the data'''
+    mask = np.ones(len(data), dtype = bool)
+    for name in names:
+        mask &= evaluateFilter(data, name)
+    return mask
+
+class FilterIndex:
+    '''Packed bitmaps of the filters for a version of the database. Bit i of a bitmap belongs to row i of the snapshot'''
+
+    def __init__(self, bitmaps, length, snapshot = None):
+        self.bitmaps = bitmaps
+        self.length = length
+        self.snapshot = snapshot
+
+    @classmethod
+    def fromData(cls, data):
+        '''Evaluate the filters whose columns are in the data'''
+        bitmaps = {name: np.packbits(evaluateFilter(data, name))
+                   for name, (column, operator, value) in filterDefinitions().items() if column in data.columns}
+        return cls(bitmaps, len(data))
+
+    def updated(self, data, previous):
+        '''Returns the bitmaps of a new version of the database, data, where previous holds for every row of the data the row of this version
+        it is the same as, or -1 for new and changed rows. The bits of the unchanged rows are copied, and the filters only evaluated on the other rows'''
+        changed = previous < 0
+        bitmaps = {}
+        for name, (column, operator, value) in filterDefinitions().items():
+            if column not in data.columns:
+                continue
+            if name not in self.bitmaps:
+                bitmaps[name] = np.packbits(evaluateFilter(data, name))
+                continue
+            passes = np.zeros(len(data), dtype = bool)
+            passes[~changed] = np.unpackbits(self.bitmaps[name], count = self.length).astype(bool)[previous[~changed]]
+            passes[changed] = evaluateFilter(data[changed], name)
+            bitmaps[name] = np.packbits(passes)
+        return FilterIndex(bitmaps, len(data))
+
+    @classmethod
+    def load(cls, path):
+        '''Load bitmaps saved by save. Returns None if there are none, or if they were made with other filter definitions'''
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as stored:
+            if str(stored['definitions']) != definitionsHash():
+                return None
+            bitmaps = {key[len('bitmap_'):]: stored[key] for key in stored.files if key.startswith('bitmap_')}
+            return cls(bitmaps, int(stored['length']))
+
+    def save(self, path):
+        '''Save the bitmaps. Written to a temporary file first so that an interupted write never leaves broken bitmaps'''
+        path_tmp = path + '.tmp.npz'
+        np.savez(path_tmp, definitions = definitionsHash(), length = self.length,
+                 **{'bitmap_' + name: bitmap for name, bitmap in self.bitmaps.items()})
+        os.replace(path_tmp, path)
+
+    def __len__(self):
+        return self.length
+
+    def mask(self, names):
+        '''Returns a boolean numpy array that is True for the rows passing all the given filters'''
+        missing = [name for name in names if name not in self.bitmaps]
+        if missing:
+            raise KeyError('No bitmap for the filters: {}. Available filters: {}'.format(', '.join(missing), ', '.join(self.bitmaps)))
+        if not names:
+            return np.ones(self.length, dtype = bool)
+        packed = np.bitwise_and.reduce([self.bitmaps[name] for name in names])
+        return np.unpackbits(packed, count = self.length).astype(bool)
+
+    def count(self, names):
+        '''Returns the number of rows passing all the given filters'''
+        return int(np.count_nonzero(self.mask(names)))
+
+    def covers(self, data):
+        '''Returns True if the rows of the data can be looked up in the bitmaps, which holds for data read from the snapshot the index was made for and any subset of it.
+        Such data has its index named after the snapshot, see markSnapshotRows. Any other frame, also one with an integer index within the snapshot,
+        may hold other rows under those numbers, such as after reset_index'''
+        index = data.index
+        if self.snapshot is None or index.name != self.snapshot or not pd.api.types.is_integer_dtype(index):
+            return False
+        return len(index) == 0 or (index.min() >= 0 and index.max() < self.length)
+
+def snapshotName(path_snapshot):
+    '''Returns the name the index of frames read from a snapshot is given, the name of the snapshot file'''
+    return os.path.splitext(os.path.basename(path_snapshot))[0]
+
+def markSnapshotRows(data, path_snapshot):
+    '''Name the index of data, which holds the row numbers of the rows of a snapshot, after the snapshot, so that its bitmaps are used for the data.
+    The name stays with row selections and column selections of the data, and is lost when the data is given another index, for example by reset_index'''
+    data.index = data.index.rename(snapshotName(path_snapshot))
+    return data
+
+# The filter index of the most recently loaded snapshot
+loadedIndex = None
+
+def register(filterIndex):
+    '''Make a filter index the one used by filterRows'''
+    global loadedIndex
+    loadedIndex = filterIndex
+
+def rowMask(data, names):
+    '''Returns a boolean numpy array that is True for the rows of the data passing all the given filters. The bitmaps of the loaded snapshot
+    are used when the data was read from that snapshot, see FilterIndex.covers, otherwise the filters are evaluated on the data'''
+    if loadedIndex is not None and loadedIndex.covers(data) and all(name in loadedIndex.bitmaps for name in names):
+        return loadedIndex.mask(names)[data.index.to_numpy()]
+    return evaluateFilters(data, names)
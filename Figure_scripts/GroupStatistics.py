@@ -0,0 +1,133 @@
+# =============================================================================
+# Box statistics per category
+#
+# The categorical figures (HTL, ETL, architecture, composition, deposition
+# procedure) show the distribution of a value, such as Jsc_over_Jqe, for the
+# most common categories of a column. Here the category column is encoded as
+# integer codes once, the values are sorted by (code, value) in one pass, and
+# the counts, means, quartiles, whiskers and outliers of all categories are
+# read from the sorted array with vectorised operations.
+#
+# The statistics follow matplotlib's boxplot_stats, which seaborn uses: linear
+# interpolation between data points for the quartiles, and whiskers at the
+# most extreme values within whis times the interquartile range of the box.
+# =============================================================================
+
+import numpy as np
+import pandas as pd
+
+def encodeCategories(column):
+    '''Returns integer codes for the values of a column, with -1 for missing values, and the categories the codes refer to.
+    Categorical columns are already encoded and are used as they are'''
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(dtype = np.int64), np.asarray(column.cat.categories, dtype = object)
+    codes, categories = pd.factorize(column)
+    return codes.astype(np.int64), np.asarray(categories, dtype = object)
+
+def countOrder(counts):
+    '''Returns the positions of the non-zero counts, with one count per category in the order of the categories, from the largest count to the smallest.
+    Ties are ordered as by value_counts'''
+    counts = np.asarray(counts)
+    order = pd.Series(counts).sort_values(ascending = False).index.to_numpy()
+    return order[counts[order] > 0]
+
+def topCodes(codes, numberOfCategories, antal = None):
+    '''Returns the codes of the antal most common categories, or of all categories that occur, in order of how common they are.
+    Ties are ordered as by value_counts, so the categories are the same as the ones mostCommonCategories in UtilityFunctions picks'''
+    order = countOrder(np.bincount(codes[codes >= 0], minlength = numberOfCategories))
+    return order if antal is None else order[:antal]
+
+def sortedQuantile(values, starts, lengths, q):
+    '''Returns the q quantile of groups of sorted values, where group i is values[starts[i]:starts[i]+lengths[i]], using linear interpolation'''
+    position = (lengths - 1)*q
+    below = np.floor(position).astype(np.int64)
+    fraction = position - below
+    above = np.minimum(below + 1, lengths - 1)
+    return values[starts + below] + fraction*(values[starts + above] - values[starts + below])
+
+def sortedGroups(data, column, value, antal = None, sortByCount = True):
+    '''Returns the values of the antal most common categories of column, or of all categories, sorted by category and then by value.
+    The result is a dictionary with the categories, in order of how common they are, or in the order of the categories if sortByCount = False,
+    the number of rows of each category, the sorted values without missing values, and the start and length of each category in the sorted values'''
+    codes, categories = encodeCategories(data[column])
+    values = data[value].to_numpy(dtype = np.float64, na_value = np.nan)
+    top = topCodes(codes, len(categories), antal) if sortByCount else np.arange(len(categories))
+
+    # Give the top categories new codes 0, 1, 2 ... in order of how common they are, and drop everything else.
+    # The extra last entry maps missing values, with code -1, to -1
+    rank = np.full(len(categories) + 1, -1, dtype = np.int64)
+    rank[top] = np.arange(len(top))
+    ranks = rank[codes]
+    counts = np.bincount(ranks[ranks >= 0], minlength = len(top))
+
+    keep = (ranks >= 0) & ~np.isnan(values)
+    ranks, values = ranks[keep], values[keep]
+
+    # One sort, by category and then by value, puts every group in order after each other
+    order = np.lexsort((values, ranks))
+    ranks, values = ranks[order], values[order]
+    lengths = np.bincount(ranks, minlength = len(top))
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+
+    return {
+            'categories': pd.Index(categories[top], name = column),
+            'counts': counts,
+            'ranks': ranks,
+            'values': values,
+            'starts': starts,
+            'lengths': lengths,
+        }
+
+def groupStatistics(data, column, value, antal = None, whis = 1.5, sortByCount = True):
+    '''Returns the box statistics of value for the antal most common categories of column, or for all categories, in order of how common they are.
+    With sortByCount = False all categories are kept in the order of the categories, including the ones without rows, as for the bins made by Binning.binColumn.
+    The categories are counted over all rows, and the statistics are computed over the rows where value is not missing.
+    The result has one row per category, indexed by the category, with the columns
+    count, n, mean, median, q1, q3, whislo, whishi and fliers, where n is the number of values and fliers an array of the values outside the whiskers'''
+    groups = sortedGroups(data, column, value, antal, sortByCount)
+    ranks, values, starts, lengths = groups['ranks'], groups['values'], groups['starts'], groups['lengths']
+
+    statistics = pd.DataFrame({'count': groups['counts'], 'n': lengths}, index = groups['categories'])
+    statistics['mean'] = np.bincount(ranks, weights = values, minlength = len(lengths))/np.where(lengths > 0, lengths, np.nan)
+    for name, q in [('q1', 0.25), ('median', 0.5), ('q3', 0.75)]:
+        statistics[name] = np.nan
+        statistics.loc[lengths > 0, name] = sortedQuantile(values, starts[lengths > 0], lengths[lengths > 0], q)
+
+    # Whiskers at the most extreme values within the fences, or at the box if there are none
+    q1, q3 = statistics['q1'].to_numpy(), statistics['q3'].to_numpy()
+    iqr = q3 - q1
+    low, high = (q1 - whis*iqr)[ranks], (q3 + whis*iqr)[ranks]
+    whislo = np.full(len(lengths), np.inf)
+    whishi = np.full(len(lengths), -np.inf)
+    np.minimum.at(whislo, ranks[values >= low], values[values >= low])
+    np.maximum.at(whishi, ranks[values <= high], values[values <= high])
+    statistics['whislo'] = np.where(np.isfinite(whislo), np.minimum(whislo, q1), q1)
+    statistics['whishi'] = np.where(np.isfinite(whishi), np.maximum(whishi, q3), q3)
+
+    # The outliers of each category, as an array per category
+    isFlier = (values < statistics['whislo'].to_numpy()[ranks]) | (values > statistics['whishi'].to_numpy()[ranks])
+    flierEnds = np.cumsum(np.bincount(ranks[isFlier], minlength = len(lengths)))
+    fliers = np.empty(len(lengths), dtype = object)
+    for i, (start, end) in enumerate(zip(np.concatenate([[0], flierEnds[:-1]]), flierEnds)):
+        fliers[i] = values[isFlier][start:end]
+    statistics['fliers'] = fliers
+
+    return statistics
+
+def bxpStats(statistics, labels = None):
+    '''Returns the statistics as the list of dictionaries matplotlib's Axes.bxp draws. Categories without values are drawn as empty boxes'''
+    if labels is None:
+        labels = statistics.index
+    stats = []
+    for label, (name, row) in zip(labels, statistics.iterrows()):
+        stats.append({
+                'label': label,
+                'mean': row['mean'],
+                'med': row['median'],
+                'q1': row['q1'],
+                'q3': row['q3'],
+                'whislo': row['whislo'],
+                'whishi': row['whishi'],
+                'fliers': row['fliers'],
+            })
+    return stats
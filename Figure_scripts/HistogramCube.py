@@ -0,0 +1,198 @@
+# =============================================================================
+# Pre-aggregated histograms of the Jsc/Jqe ratios
+#
+# The histogram figures (fig_1b, S_14, S_15b and Unused_1) count the values of
+# a ratio in bins of 0.004 for the rows at standard light intensity with EQE
+# measured, sometimes only for certified cells or cells with a stabilised
+# efficiency. Here the counts are made once per version of the database, with
+# np.bincount, in a cube with the axes
+#     metric x value bin x certified x stabilised x half year x architecture
+# where the half years are the publication dates in half year bins, as in
+# fig_2, and the architectures the most common values of Cell_architecture,
+# with the rest in Other. A histogram, or any other slice, is then a sum over
+# the axes of the cube instead of a scan of the rows.
+#
+# The value bins are fixed, (0.5, 0.504], (0.504, 0.508] ... up to 1.5, while
+# seaborn's histplot(binwidth = 0.004), which the figures used before, starts
+# its bins at the smallest value. The bars are therefore shifted by less than
+# a bin compared with the original figures, and values outside (0.5, 1.5],
+# which are outside the x-axis of the figures, are not counted.
+#
+# The cube is stored next to the parquet snapshot and registered when the
+# snapshot is loaded, see UtilityFunctions.ensureSnapshot.
+# =============================================================================
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import Binning
+import FilterIndex
+
+def cubeDefinition():
+    '''Returns the definition of the cube. Stored cubes made with another definition are rebuilt'''
+    return {
+            'metrics': ['Jsc_over_Jqe', 'Jsc_forward_over_Jqe', 'Jsc_over_Jqe_vs_PCEsc_over_PCEstab'],
+            'edges': (0.5, 1.5, 0.004), # Values outside the edges are counted in a bin of their own
+            'filters': ['light_intensity', 'EQE_measured'], # The rows in the cube
+            'flags': ['certified', 'stabilised'], # Filters that are axes of the cube
+            'architecture': ('Cell_architecture', 10), # Column and number of categories kept
+        }
+
+def definitionHash():
+    return hashlib.sha256(repr(sorted(cubeDefinition().items())).encode()).hexdigest()[:16]
+
+def cubeColumns():
+    '''Returns the database columns the cube is made from, apart from the derived metrics'''
+    definition = cubeDefinition()
+    return FilterIndex.filterColumns(definition['filters'] + definition['flags']) + ['Ref_publication_date', definition['architecture'][0]]
+
+def valueEdges():
+    return Binning.linearEdges(*cubeDefinition()['edges'])
+
+def halfYearEdges(dates):
+    '''Returns half year bin edges, at the ends of June and December, covering the dates'''
+    dates = dates[pd.notna(dates)]
+    if len(dates) == 0:
+        return Binning.dateEdges('2000-06-01', freq = '6ME', periods = 2)
+    start = '{}-12-01'.format(pd.Timestamp(dates.min()).year - 1)
+    periods = 2*(pd.Timestamp(dates.max()).year - pd.Timestamp(dates.min()).year + 1) + 1
+    return Binning.dateEdges(start, freq = '6ME', periods = periods)
+
+def cubeAxes(data):
+    '''Returns the half year edges and the most common architectures of rows in the cube'''
+    column, antal = cubeDefinition()['architecture']
+    return halfYearEdges(data['Ref_publication_date'].to_numpy()), data[column].value_counts().index[:antal].tolist()
+
+class HistogramCube:
+    '''Counts of the rows in the cube, by metric, value bin, certified, stabilised, half year and architecture, for a snapshot with length rows.
+    The last value bin holds the values outside the edges, and the last half year the rows without a publication date in the edges'''
+
+    def __init__(self, counts, metrics, halfYears, architectures, length, snapshot = None):
+        self.counts = counts
+        self.metrics = list(metrics)
+        self.halfYears = np.asarray(halfYears)
+        self.architectures = list(architectures)
+        self.length = length
+        self.snapshot = snapshot
+
+    @classmethod
+    def fromData(cls, data, axes = None):
+        '''Count the rows of the data. The data must hold the metrics in cubeDefinition, the columns in cubeColumns, and a cleaned publication date.
+        axes, the half years and architectures as returned by cubeAxes, are by default those of the data'''
+        definition = cubeDefinition()
+        length = len(data)
+        data = data[FilterIndex.rowMask(data, definition['filters'])]
+        edges = valueEdges()
+
+        # Codes along every axis but the metric and value axes
+        flags = [FilterIndex.rowMask(data, [flag]).astype(np.int64) for flag in definition['flags']]
+        halfYears, architectures = cubeAxes(data) if axes is None else axes
+        halfYearCodes = Binning.binCodes(data['Ref_publication_date'], halfYears)
+        halfYearCodes[halfYearCodes < 0] = len(halfYears) - 1
+        column = definition['architecture'][0]
+        architectureCodes = pd.Categorical(data[column], categories = architectures).codes.astype(np.int64)
+        architectureCodes[architectureCodes < 0] = len(architectures)
+
+        shape = (len(edges), 2, 2, len(halfYears), len(architectures) + 1)
+        cells = np.ravel_multi_index((flags[0], flags[1], halfYearCodes, architectureCodes), shape[1:])
+        counts = np.zeros((len(definition['metrics']),) + shape, dtype = np.int32)
+        for i, metric in enumerate(definition['metrics']):
+            values = data[metric].to_numpy(dtype = np.float64, na_value = np.nan)
+            valueCodes = Binning.binCodes(values, edges)
+            valueCodes[(valueCodes < 0) & ~np.isnan(values)] = len(edges) - 1
+            counted = valueCodes >= 0
+            flat = valueCodes[counted]*np.prod(shape[1:]) + cells[counted]
+            counts[i] = np.bincount(flat, minlength = np.prod(shape)).reshape(shape)
+
+        return cls(counts, definition['metrics'], halfYears, [str(architecture) for architecture in architectures] + ['Other'], length)
+
+    def updated(self, removed, added, data):
+        '''Returns the cube of a new version of the database, data, which differs from the version of this cube by the rows removed and the rows added.
+        The counts of the removed rows are subtracted and those of the added rows added, unless the new version has other half years or architectures,
+        in which case its cube is counted from data. All three hold the columns of fromData'''
+        halfYears, architectures = cubeAxes(data[FilterIndex.rowMask(data, cubeDefinition()['filters'])])
+        if not np.array_equal(halfYears, self.halfYears) or [str(architecture) for architecture in architectures] + ['Other'] != self.architectures:
+            return HistogramCube.fromData(data)
+        counts = self.counts - HistogramCube.fromData(removed, (halfYears, architectures)).counts + HistogramCube.fromData(added, (halfYears, architectures)).counts
+        return HistogramCube(counts, self.metrics, self.halfYears, self.architectures, len(data))
+
+    @classmethod
+    def load(cls, path):
+        '''Load a cube saved by save. Returns None if there is none, or if it was made with another definition'''
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as stored:
+            if str(stored['definition']) != definitionHash():
+                return None
+            return cls(stored['counts'], stored['metrics'].tolist(), stored['halfYears'], stored['architectures'].tolist(), int(stored['length']))
+
+    def save(self, path):
+        '''Save the cube. Written to a temporary file first so that an interupted write never leaves a broken cube'''
+        path_tmp = path + '.tmp.npz'
+        np.savez(path_tmp, definition = definitionHash(), counts = self.counts, metrics = np.array(self.metrics),
+                 halfYears = self.halfYears, architectures = np.array(self.architectures), length = self.length)
+        os.replace(path_tmp, path)
+
+    #%% Slices
+    def holds(self, data, filters):
+        '''Returns True if the data holds exactly the rows of the snapshot the cube was made for that pass the given standard filters,
+        which is checked with the bitmaps of the snapshot. Data read from the snapshot and filtered further, for example on the PCE, does not'''
+        filterIndex = FilterIndex.loadedIndex
+        if (self.snapshot is None or filterIndex is None or filterIndex.snapshot != self.snapshot or not filterIndex.covers(data)
+                or not all(name in filterIndex.bitmaps for name in filters)):
+            return False
+        mask = filterIndex.mask(filters)
+        rows = data.index.to_numpy()
+        return len(rows) == np.count_nonzero(mask) and data.index.is_unique and bool(mask[rows].all())
+
+    def answers(self, filters):
+        '''Returns True if the rows passing the given standard filters are a slice of the cube'''
+        definition = cubeDefinition()
+        return set(definition['filters']) <= set(filters) and set(filters) <= set(definition['filters'] + definition['flags'])
+
+    def halfYearLabels(self):
+        '''Returns the half years as (start, end] labels, and Missing for the rows without a date'''
+        return Binning.intervalLabels(self.halfYears) + ['Missing']
+
+    def slice(self, metric, certified = None, stabilised = None, halfYears = None, architectures = None):
+        '''Returns the counts of a metric for the selected part of every axis, as an array with the axes
+        value bin x certified x stabilised x half year x architecture. None keeps the whole axis, True or False one value of a flag,
+        and halfYears and architectures are lists of labels, see halfYearLabels and architectures'''
+        counts = self.counts[self.metrics.index(metric)]
+        selection = [slice(None)]
+        for flag in (certified, stabilised):
+            selection.append(slice(None) if flag is None else [int(flag)])
+        selection.append(slice(None) if halfYears is None else [self.halfYearLabels().index(label) for label in halfYears])
+        selection.append(slice(None) if architectures is None else [self.architectures.index(label) for label in architectures])
+        return counts[np.ix_(*[np.arange(size)[index] for size, index in zip(counts.shape, selection)])]
+
+    def histogram(self, metric, filters = (), halfYears = None, architectures = None):
+        '''Returns the counts in every value bin of a metric for the rows passing the given standard filters'''
+        flags = {flag: True if flag in filters else None for flag in cubeDefinition()['flags']}
+        counts = self.slice(metric, halfYears = halfYears, architectures = architectures, **flags)
+        return counts.sum(axis = (1, 2, 3, 4))[:-1]
+
+# The histogram cube of the most recently loaded snapshot
+loadedCube = None
+
+def register(cube):
+    '''Make a cube the one used by histogramCounts'''
+    global loadedCube
+    loadedCube = cube
+
+def histogramCounts(data, metric, filters, column = None):
+    '''Returns the value bin edges of the cube and the counts of a metric in each bin, for the rows of the data, which pass the given standard filters.
+    The counts are taken from the loaded cube when the data holds exactly the rows of the snapshot passing the filters, see HistogramCube.holds,
+    and otherwise counted from column, by default the metric, of the data.
+    The bins are those of the cube, 0.004 wide from 0.5 to 1.5, with a value v in bin i if edges[i] < v <= edges[i+1]. Values outside (0.5, 1.5]
+    are not counted. The bins are thus anchored at 0.5, where seaborn's histplot(binwidth = 0.004), which the figures used before, starts them at
+    the smallest value'''
+    edges = valueEdges()
+    if loadedCube is not None and loadedCube.answers(filters) and loadedCube.holds(data, filters):
+        return edges, loadedCube.histogram(metric, filters)
+
+    codes = Binning.binCodes(data[metric if column is None else column], edges)
+    return edges, np.bincount(codes[codes >= 0], minlength = len(edges) - 1)
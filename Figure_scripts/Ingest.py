@@ -0,0 +1,234 @@
+# =============================================================================
+# Incremental ingest of new releases of the database
+#
+# A new release of the database file is mostly the rows of the previous
+# release, with some rows corrected and some added. Normally a new file means
+# a new snapshot, with its filter bitmaps, derived metrics, histogram cube,
+# parameter cube and local store all made again from every row.
+#
+# Here the new file is instead compared with the snapshot of the previous
+# release. Rows are matched by a stable key, the reference and the ID of the
+# device, see ROW_KEY, and a row is unchanged when its key is found in the
+# previous release with the same values in every column, compared by a hash of
+# the row. Numbers are hashed as the float64 values they are read as, so that a
+# release which writes the same numbers with other digits, such as 15.1,
+# 15.10 and 151e-1, does not change every row, while any change of a value
+# that is read as another float64 changes its row. The hashes of the keys and rows are
+# stored next to the snapshot, so that the previous release is not hashed
+# again. Then only the new and changed rows are processed:
+#     filter bitmaps    bits of unchanged rows are copied, the filters are only
+#                       evaluated on the other rows
+#     derived metrics   copied for unchanged rows, computed for the other rows
+#     histogram cube    the counts of the removed and old versions of changed
+#                       rows are subtracted and those of the new and changed
+#                       rows added, unless the half years or most common
+#                       architectures of the cube change
+#     parameter cube    the same, cell by cell
+#     local store       unchanged rows are copied within SQLite
+# The new snapshot holds the rows in the order of the new file, so everything
+# is the same as when the new release is read from scratch, apart from
+# rounding in the sums of the parameter cube.
+#
+# Usage, from the Figure_scripts folder, after replacing the database file:
+#     python FigureRunner.py --ingest
+# =============================================================================
+
+import hashlib
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import DatabaseSchema
+import DerivedMetrics
+import FilterIndex
+import HistogramCube
+import LocalStore
+import ParameterCube
+import UtilityFunctions
+
+# The columns identifying a device across releases: the reference it was reported in and its ID in the database
+ROW_KEY = ['Ref_DOI_number', 'Ref_ID']
+
+# The precision numbers are compared with across releases
+HASHED_FLOAT = DatabaseSchema.FLOAT64
+
+def keyDefinitionHash():
+    return hashlib.sha256(repr((ROW_KEY, HASHED_FLOAT)).encode()).hexdigest()[:16]
+
+def hashedValues(data):
+    '''Returns the data with its floating point columns as HASHED_FLOAT, as they are hashed'''
+    floats = [column for column in data.columns if pd.api.types.is_float_dtype(data[column])]
+    return data.astype({column: HASHED_FLOAT for column in floats}) if floats else data
+
+class RowIdentity:
+    '''The identity of the rows of a version of the database: a hash of the key of every row, whether the key is complete,
+    and a hash of the values of every row, with numbers as float64, independent of the order of the columns. columns are the sorted columns of the version'''
+
+    def __init__(self, columns, keys, complete, rows):
+        self.columns = list(columns)
+        self.keys = keys
+        self.complete = complete
+        self.rows = rows
+
+    @classmethod
+    def fromData(cls, data):
+        '''Hash the keys and the rows of the data'''
+        columns = sorted(data.columns)
+        if all(column in data.columns for column in ROW_KEY):
+            keys = pd.util.hash_pandas_object(data[ROW_KEY], index = False).to_numpy()
+            complete = data[ROW_KEY].notna().all(axis = 1).to_numpy()
+        else:
+            keys, complete = np.zeros(len(data), dtype = np.uint64), np.zeros(len(data), dtype = bool)
+        return cls(columns, keys, complete, pd.util.hash_pandas_object(hashedValues(data[columns]), index = False).to_numpy())
+
+    @classmethod
+    def load(cls, path):
+        '''Load the identity saved by save. Returns None if there is none, or if it was made with another key'''
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as stored:
+            if str(stored['definition']) != keyDefinitionHash():
+                return None
+            return cls(stored['columns'].tolist(), stored['keys'], stored['complete'], stored['rows'])
+
+    def save(self, path):
+        '''Save the identity. Written to a temporary file first so that an interupted write never leaves a broken file'''
+        path_tmp = path + '.tmp.npz'
+        np.savez(path_tmp, definition = keyDefinitionHash(), columns = np.array(self.columns), keys = self.keys, complete = self.complete, rows = self.rows)
+        os.replace(path_tmp, path)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def matchRows(self, old):
+        '''Returns for every row of this version the row of the old version, another RowIdentity, with the same key and the same values,
+        or -1 for rows that are new or changed. Rows with a missing or repeated key are never matched, and no rows are when the versions have other columns'''
+        previous = np.full(len(self), -1, dtype = np.int64)
+        if self.columns != old.columns:
+            return previous
+
+        oldUnique = old.complete & ~pd.Index(old.keys).duplicated(keep = False)
+        unique = self.complete & ~pd.Index(self.keys).duplicated(keep = False)
+        candidates = pd.Index(old.keys[oldUnique]).get_indexer(self.keys)
+        matched = unique & (candidates >= 0)
+        previous[matched] = np.flatnonzero(oldUnique)[candidates[matched]]
+
+        same = old.rows[previous[matched]] == self.rows[matched]
+        previous[np.flatnonzero(matched)[~same]] = -1
+        return previous
+
+def loadRowIdentity(path_snapshot):
+    '''Returns the row identity of a snapshot, computing and storing it if needed'''
+    path_rows = UtilityFunctions.rowIdentityPath(path_snapshot)
+    identity = RowIdentity.load(path_rows)
+    if identity is None:
+        identity = RowIdentity.fromData(pd.read_parquet(path_snapshot))
+        identity.save(path_rows)
+    return identity
+
+def previousSnapshot(path_snapshot):
+    '''Returns the most recent snapshot of another version of the same database file, or None if there is none'''
+    folder = os.path.dirname(path_snapshot)
+    if not os.path.isdir(folder):
+        return None
+    prefix = os.path.basename(path_snapshot).rsplit('_', 1)[0]
+    pattern = re.compile(re.escape(prefix) + r'_[0-9a-f]{16}\.parquet$')
+    snapshots = [os.path.join(folder, fileName) for fileName in os.listdir(folder)
+                 if pattern.match(fileName) and fileName != os.path.basename(path_snapshot)]
+    return max(snapshots, key = os.path.getmtime) if snapshots else None
+
+def cubeMetrics():
+    '''Returns the derived metrics the histogram and parameter cubes are made from'''
+    return list(dict.fromkeys(HistogramCube.cubeDefinition()['metrics'] + [ParameterCube.VALUE]))
+
+def cubeInputs():
+    '''Returns the database columns the histogram and parameter cubes are made from, including those of their derived metrics'''
+    return list(dict.fromkeys(HistogramCube.cubeColumns() + ParameterCube.cubeColumns() + DerivedMetrics.baseColumns(cubeMetrics())))
+
+def cubeRows(data, metrics = None):
+    '''Returns the cleaned columns of the data the histogram and parameter cubes are made from, with the derived metrics they use,
+    taken from metrics if given and otherwise computed'''
+    names = cubeMetrics()
+    columns = [column for column in dict.fromkeys(HistogramCube.cubeColumns() + ParameterCube.cubeColumns()) if column in data.columns]
+    rows = data[list(dict.fromkeys(columns + DerivedMetrics.baseColumns(names)))].copy()
+    if metrics is None:
+        rows = DerivedMetrics.addMetrics(rows, names)
+    else:
+        for name in names:
+            rows[name] = metrics[name].to_numpy()
+    return UtilityFunctions.initialDataManipulation(rows)[columns + names]
+
+#%% Ingest
+def ingestRelease(path_data, path_previous = None):
+    '''Make the snapshot of a new release of the database file, and the files stored with it, from the snapshot of the previous release, path_previous,
+    by default the most recent snapshot of the same file. Only the new and changed rows are processed, see the top of this file.
+    Without a previous snapshot, or when the release already has one, this is the same as UtilityFunctions.ensureSnapshot.
+    The new files are registered as by ensureSnapshot. Returns the path to the new snapshot'''
+    path_snapshot = UtilityFunctions.snapshotPath(path_data, UtilityFunctions.fileHash(path_data))
+    if path_previous is None:
+        path_previous = previousSnapshot(path_snapshot)
+    if os.path.isfile(path_snapshot) or path_previous is None or not os.path.isfile(path_previous):
+        return UtilityFunctions.ensureSnapshot(path_data)
+
+    # The filters are evaluated on the rows themselves while the two releases are compared
+    FilterIndex.register(None)
+    HistogramCube.register(None)
+    LocalStore.register(None)
+
+    data = UtilityFunctions.makeArrowCompatible(DatabaseSchema.readCsv(path_data))
+    identity = RowIdentity.fromData(data)
+    oldIdentity = loadRowIdentity(path_previous)
+    previous = identity.matchRows(oldIdentity)
+    changed = previous < 0
+    removed = np.setdiff1d(np.arange(len(oldIdentity)), previous[~changed])
+    print('Ingest: {} rows unchanged, {} new or changed, {} removed or changed'.format(np.count_nonzero(~changed), np.count_nonzero(changed), len(removed)))
+
+    filterIndex = FilterIndex.FilterIndex.load(UtilityFunctions.filterIndexPath(path_previous))
+    if filterIndex is None or len(filterIndex) != len(oldIdentity):
+        filterIndex = FilterIndex.FilterIndex.fromData(data)
+    else:
+        filterIndex = filterIndex.updated(data, previous)
+    filterIndex.save(UtilityFunctions.filterIndexPath(path_snapshot))
+    filterIndex.snapshot = FilterIndex.snapshotName(path_snapshot)
+
+    stored, hashes = DerivedMetrics.load(UtilityFunctions.derivedMetricsPath(path_previous))
+    if len(stored) != len(oldIdentity):
+        stored, hashes = pd.DataFrame(), {}
+    metrics, hashes = DerivedMetrics.updateRows(stored, hashes, data, previous)
+    DerivedMetrics.save(UtilityFunctions.derivedMetricsPath(path_snapshot), metrics, hashes)
+
+    # The cubes, from the removed rows of the previous release and the new rows of this one
+    import pyarrow.parquet as pq
+    rows = cubeRows(data, metrics)
+    available = pq.read_schema(path_previous).names
+    removedRows = cubeRows(pd.read_parquet(path_previous, columns = [column for column in cubeInputs() if column in available]).iloc[removed])
+    histogramCube = HistogramCube.HistogramCube.load(UtilityFunctions.histogramCubePath(path_previous))
+    if histogramCube is None or histogramCube.length != len(oldIdentity):
+        histogramCube = HistogramCube.HistogramCube.fromData(rows)
+    else:
+        histogramCube = histogramCube.updated(removedRows, rows[changed], rows)
+    histogramCube.save(UtilityFunctions.histogramCubePath(path_snapshot))
+    histogramCube.snapshot = FilterIndex.snapshotName(path_snapshot)
+
+    parameterCube = ParameterCube.ParameterCube.load(UtilityFunctions.parameterCubePath(path_previous))
+    if parameterCube is None or parameterCube.length != len(oldIdentity):
+        parameterCube = ParameterCube.ParameterCube.fromData(rows)
+    else:
+        parameterCube = parameterCube.updated(removedRows, rows[changed], len(data))
+    parameterCube.save(UtilityFunctions.parameterCubePath(path_snapshot))
+
+    store = LocalStore.LocalStore.load(UtilityFunctions.localStorePath(path_previous))
+    if store is None or store.length != len(oldIdentity):
+        store = LocalStore.LocalStore.fromData(data, UtilityFunctions.localStorePath(path_snapshot))
+    else:
+        store = store.updated(data, previous, UtilityFunctions.localStorePath(path_snapshot))
+
+    # The snapshot last, which also removes the files of the previous release
+    identity.save(UtilityFunctions.rowIdentityPath(path_snapshot))
+    UtilityFunctions.writeSnapshot(data, path_snapshot)
+    FilterIndex.register(filterIndex)
+    HistogramCube.register(histogramCube)
+    LocalStore.register(store)
+    return path_snapshot
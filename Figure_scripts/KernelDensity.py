@@ -0,0 +1,91 @@
+# =============================================================================
+# Binned kernel density estimates
+#
+# A Gaussian kernel density estimate evaluated directly costs the number of
+# values times the number of grid points. Here the values are first binned
+# on a fine, equally spaced grid, with linear binning that splits every value
+# between its two nearest grid points, and the binned counts are convolved with
+# the kernel sampled on the same grid using the FFT. The cost then depends on
+# the size of the grid and not on the number of values, and the counts only
+# have to be binned once for any number of bandwidths.
+#
+# The grid starts at the smallest value and subdivides the histogram bins,
+# binwidth = 0.004 in the Jsc/Jqe histograms, into oversample grid steps, so
+# the curve lines up with the bars. The bandwidth defaults to Scott's rule, as
+# in scipy's gaussian_kde which seaborn uses.
+#
+# Without values, or with fewer than two distinct values and no bandwidth
+# given, there is no bandwidth to smooth with, and the estimate is empty, as
+# seaborn skips the curve of data without variance. Small groups under the
+# figure filters can be like this.
+# =============================================================================
+
+import numpy as np
+
+# The kernel is cut off this many bandwidths from its centre
+KERNEL_CUTOFF = 5
+
+def scottBandwidth(values):
+    '''Returns the bandwidth of Scott's rule, the standard deviation times n^(-1/5), as in scipy's gaussian_kde'''
+    return np.std(values, ddof = 1)*len(values)**(-1/5)
+
+def finiteValues(values):
+    '''Returns the finite values as a float64 numpy array'''
+    values = np.asarray(values, dtype = np.float64)
+    return values[np.isfinite(values)]
+
+def kdeGrid(values, binwidth = 0.004, oversample = 4, cut = 0, bandwidth = 0):
+    '''Returns an equally spaced grid from the smallest value, minus cut bandwidths, to the largest value, plus cut bandwidths,
+    with oversample steps per histogram bin, and at least two points. The grid points fall on the edges of histogram bins starting at the smallest value'''
+    delta = binwidth/oversample
+    before = int(np.ceil(cut*bandwidth/delta))
+    after = max(int(np.ceil((values.max() - values.min() + cut*bandwidth)/delta)), 1)
+    return values.min() + delta*np.arange(-before, after + 1)
+
+def linearBinning(values, grid):
+    '''Returns the weight of the values at each point of an equally spaced grid, where each value is split between the two nearest grid points.
+    All values must be within the grid'''
+    delta = grid[1] - grid[0]
+    position = (values - grid[0])/delta
+    below = np.minimum(np.floor(position).astype(np.int64), len(grid) - 2)
+    fraction = position - below
+    return (np.bincount(below, weights = 1 - fraction, minlength = len(grid))
+            + np.bincount(below + 1, weights = fraction, minlength = len(grid)))
+
+def smoothCounts(counts, delta, bandwidth):
+    '''Returns the density from binned counts on a grid with spacing delta, convolved with a Gaussian kernel of the given bandwidth using the FFT.
+    The density integrates to one over the grid, apart from the tails outside it'''
+    reach = int(np.ceil(KERNEL_CUTOFF*bandwidth/delta))
+    offsets = delta*np.arange(-reach, reach + 1)
+    kernel = np.exp(-0.5*(offsets/bandwidth)**2)/(bandwidth*np.sqrt(2*np.pi))
+
+    # Zero padding to a power of two makes the circular convolution of the FFT a linear one
+    size = 2**int(np.ceil(np.log2(len(counts) + len(kernel) - 1)))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size)*np.fft.rfft(kernel, size), size)
+    return np.maximum(smoothed[reach:reach + len(counts)], 0)/counts.sum()
+
+def binnedKde(values, bandwidth = None, binwidth = 0.004, oversample = 4, cut = 0):
+    '''Returns the grid and the kernel density estimate of the values on it. Missing and infinite values are dropped.
+    With cut = 0 the grid spans the values, as the KDE seaborn's histplot draws. Both are empty if there is no bandwidth, see the top of this file'''
+    values = finiteValues(values)
+    if bandwidth is None:
+        bandwidth = scottBandwidth(values) if len(np.unique(values)) > 1 else 0
+    if len(values) == 0 or not bandwidth > 0:
+        return np.array([]), np.array([])
+    grid = kdeGrid(values, binwidth, oversample, cut, bandwidth)
+    return grid, smoothCounts(linearBinning(values, grid), grid[1] - grid[0], bandwidth)
+
+def bandwidthSweep(values, bandwidths, binwidth = 0.004, oversample = 4, cut = 0):
+    '''Returns the grid and the kernel density estimates for several bandwidths, one row per bandwidth. The values are binned once.
+    Without values the grid and the rows are empty'''
+    values = finiteValues(values)
+    if len(values) == 0:
+        return np.array([]), np.zeros((len(bandwidths), 0))
+    grid = kdeGrid(values, binwidth, oversample, cut, max(bandwidths))
+    counts = linearBinning(values, grid)
+    return grid, np.array([smoothCounts(counts, grid[1] - grid[0], bandwidth) for bandwidth in bandwidths])
+
+def kdeCounts(values, binwidth = 0.004, bandwidth = None, oversample = 4):
+    '''Returns the grid and the kernel density estimate scaled to the counts of a histogram with the given binwidth, to draw on top of it'''
+    grid, density = binnedKde(values, bandwidth, binwidth, oversample)
+    return grid, density*len(finiteValues(values))*binwidth
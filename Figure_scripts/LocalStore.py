@@ -0,0 +1,271 @@
+# =============================================================================
+# Indexed local store of the database
+#
+# The figure scripts query the same subsets again and again: certified,
+# EQE-measured or stabilised cells, publication date ranges and given HTL,
+# ETL or other stacks. The standard filters are answered by the bitmaps in
+# FilterIndex, but any other predicate, such as a date range or a list of
+# stacks, means reading and scanning the whole column.
+#
+# Here the columns declared in DatabaseSchema are imported once per version of
+# the database into an embedded SQLite database next to the parquet snapshot,
+# with an index on the boolean flags, the publication date and the stack and
+# other categorical columns. A predicate is then one indexed SQL query that
+# returns the numbers of the matching rows. DatabaseQuery.Query uses the store
+# for its predicates when one is loaded, and still reads the selected columns
+# from the snapshot, so the frames keep their types and are the same as
+# without the store.
+#
+# Values are stored as SQLite values: booleans as 0 and 1, dates as
+# 'yyyy-mm-dd hh:mm:ss' text, which sorts as the dates do, and categories as
+# text. Missing values are NULL, which no predicate passes. Columns that
+# initialDataManipulation cleans are stored cleaned, so the band gap is stored
+# as the number of its first value, as in the frames of the figures.
+#
+# SQLite orders every number before every text instead of comparing them, so
+# a predicate comparing a text column with a number, or a number column with
+# text, is not answered by the store and is left to pandas.
+# =============================================================================
+
+import hashlib
+import os
+import pathlib
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import DatabaseSchema
+import FilterIndex
+import UtilityFunctions
+
+TABLE = 'devices'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# The operators of DatabaseQuery the store answers, and their SQL
+SQL_OPERATORS = {'==': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+# The operators that order values, for which the types of the column and the value must match
+ORDERING_OPERATORS = ('<', '<=', '>', '>=', 'between')
+
+def storeDefinition():
+    '''Returns the definition of the store. Stored databases made with another definition are rebuilt'''
+    declared = DatabaseSchema.columnTypes()
+    return {
+            'columns': list(declared), # The stored columns
+            'indexed': list(dict.fromkeys(FilterIndex.filterColumns() + ['Ref_publication_date']
+                                          + [column for column, dtype in declared.items() if dtype == DatabaseSchema.CATEGORY])),
+            'cleaned': [column for column in UtilityFunctions.cleaningColumns() if column in declared], # Stored as initialDataManipulation cleans them
+        }
+
+def storedTypes():
+    '''Returns the type of the values of every stored column, after cleaning. The number list columns, such as the band gap, hold floats'''
+    types = DatabaseSchema.columnTypes()
+    for column in DatabaseSchema.numberListColumns():
+        if column in types:
+            types[column] = DatabaseSchema.FLOAT64
+    return types
+
+def cleanedColumns(data, columns):
+    '''Returns the given columns of the data, with the columns initialDataManipulation cleans cleaned'''
+    return UtilityFunctions.initialDataManipulation(data[columns].copy())
+
+def definitionHash():
+    return hashlib.sha256((repr(sorted(storeDefinition().items())) + DatabaseSchema.schemaHash()).encode()).hexdigest()[:16]
+
+def sqlValues(values):
+    '''Returns the values of a column as a list of SQLite values, with None for missing values'''
+    if pd.api.types.is_datetime64_any_dtype(values):
+        text = values.dt.strftime(DATE_FORMAT)
+        return text.astype(object).where(values.notna(), None).tolist()
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(object).where(values.notna(), None).map(lambda value: value if value is None else int(value)).tolist()
+    if pd.api.types.is_float_dtype(values):
+        return values.astype(np.float64).astype(object).where(values.notna(), None).tolist()
+    return values.astype(object).where(values.notna(), None).map(lambda value: value if value is None else str(value)).tolist()
+
+def sqlParameter(value, dtype):
+    '''Returns a predicate value as the SQLite value it is compared with in a column of type dtype.
+    Values compared with float32 columns are rounded to float32 first, as pandas does'''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if dtype == DatabaseSchema.DATETIME:
+        return pd.Timestamp(value).strftime(DATE_FORMAT)
+    if dtype == DatabaseSchema.BOOLEAN:
+        return int(bool(value))
+    if dtype == DatabaseSchema.FLOAT32:
+        return float(np.float32(value))
+    return value
+
+def isNumber(value):
+    '''Returns True if a predicate value is a number, and not a boolean'''
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+def comparable(value, dtype):
+    '''Returns True if SQLite orders a predicate value against the values of a column of type dtype as pandas does.
+    Numbers are compared with numbers and text with text, and dates are converted by sqlParameter'''
+    if dtype == DatabaseSchema.DATETIME:
+        return True
+    return isNumber(value) == (dtype in (DatabaseSchema.FLOAT32, DatabaseSchema.FLOAT64))
+
+def connectReadOnly(path):
+    '''Open the SQLite database at path for reading only. The path is given as a file URI, in which characters such as ? and # in the path are escaped'''
+    return sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri = True)
+
+class LocalStore:
+    '''The declared columns of a snapshot with length rows, in an indexed SQLite database at path'''
+
+    def __init__(self, path, columns, length):
+        self.path = path
+        self.columns = list(columns)
+        self.length = length
+
+    @classmethod
+    def fromData(cls, data, path):
+        '''Import the declared columns of the data, read from a snapshot, into a new store at path.
+        Written to a temporary file first so that an interupted import never leaves a broken store'''
+        definition = storeDefinition()
+        columns = [column for column in definition['columns'] if column in data.columns]
+        data = cleanedColumns(data, columns)
+        path_tmp = path + '.tmp'
+        if os.path.isfile(path_tmp):
+            os.remove(path_tmp)
+
+        with sqlite3.connect(path_tmp) as connection:
+            connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', [('definition', definitionHash()), ('length', str(len(data)))])
+            connection.execute('CREATE TABLE {} (row INTEGER PRIMARY KEY, {})'.format(TABLE, ', '.join('"{}"'.format(column) for column in columns)))
+            rows = zip(range(len(data)), *[sqlValues(data[column]) for column in columns])
+            connection.executemany('INSERT INTO {} VALUES ({})'.format(TABLE, ', '.join(['?']*(len(columns) + 1))), rows)
+            for column in definition['indexed']:
+                if column in columns:
+                    connection.execute('CREATE INDEX "index_{0}" ON {1} ("{0}")'.format(column, TABLE))
+            connection.execute('ANALYZE')
+        connection.close()
+
+        os.replace(path_tmp, path)
+        return cls(path, columns, len(data))
+
+    def updated(self, data, previous, path):
+        '''Returns the store of a new version of the database, data, in a new store at path. previous holds for every row of the data the row of this store
+        it is the same as, or -1 for new and changed rows. The unchanged rows are copied within SQLite and only the other rows are imported from the data.
+        When the new version has other declared columns it is imported in full'''
+        definition = storeDefinition()
+        columns = [column for column in definition['columns'] if column in data.columns]
+        if columns != self.columns:
+            return LocalStore.fromData(data, path)
+        changed = np.flatnonzero(previous < 0)
+        path_tmp = path + '.tmp'
+        if os.path.isfile(path_tmp):
+            os.remove(path_tmp)
+
+        quoted = ', '.join('"{}"'.format(column) for column in columns)
+        with sqlite3.connect(path_tmp) as connection:
+            connection.execute('ATTACH DATABASE ? AS previous', (self.path,))
+            connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            connection.executemany('INSERT INTO meta VALUES (?, ?)', [('definition', definitionHash()), ('length', str(len(data)))])
+            connection.execute('CREATE TABLE {} (row INTEGER PRIMARY KEY, {})'.format(TABLE, quoted))
+
+            # The unchanged rows, copied from this store and numbered as in the new version
+            connection.execute('CREATE TEMPORARY TABLE renumber (row INTEGER PRIMARY KEY, previous INTEGER)')
+            unchanged = np.flatnonzero(previous >= 0)
+            connection.executemany('INSERT INTO renumber VALUES (?, ?)', zip(unchanged.tolist(), previous[unchanged].tolist()))
+            connection.execute('INSERT INTO {0} SELECT renumber.row, {1} FROM renumber JOIN previous.{0} AS stored ON stored.row = renumber.previous'.format(
+                TABLE, ', '.join('stored."{}"'.format(column) for column in columns)))
+
+            changedRows = cleanedColumns(data.iloc[changed], columns)
+            rows = zip(changed.tolist(), *[sqlValues(changedRows[column]) for column in columns])
+            connection.executemany('INSERT INTO {} VALUES ({})'.format(TABLE, ', '.join(['?']*(len(columns) + 1))), rows)
+            for column in definition['indexed']:
+                if column in columns:
+                    connection.execute('CREATE INDEX "index_{0}" ON {1} ("{0}")'.format(column, TABLE))
+            connection.execute('ANALYZE')
+        connection.close()
+
+        os.replace(path_tmp, path)
+        return LocalStore(path, columns, len(data))
+
+    @classmethod
+    def load(cls, path):
+        '''Open a store made by fromData. Returns None if there is none, or if it was made with another definition'''
+        if not os.path.isfile(path):
+            return None
+        connection = connectReadOnly(path)
+        try:
+            meta = dict(connection.execute('SELECT key, value FROM meta').fetchall())
+            columns = [name for cid, name, *rest in connection.execute('PRAGMA table_info({})'.format(TABLE)) if name != 'row']
+        except sqlite3.DatabaseError:
+            return None
+        finally:
+            connection.close()
+        if meta.get('definition') != definitionHash():
+            return None
+        return cls(path, columns, int(meta['length']))
+
+    #%% Queries
+    def answers(self, predicate):
+        '''Returns True if the store can evaluate a predicate of DatabaseQuery, (column, operator, value), on its own.
+        Predicates ordering the values of a column by a value of another type, such as a number for a text column, are not answered'''
+        column, operator, value = predicate
+        if column not in self.columns or not (operator in SQL_OPERATORS or operator in ('between', 'in', 'notna')):
+            return False
+        if operator in ORDERING_OPERATORS:
+            dtype = storedTypes().get(column)
+            return all(comparable(item, dtype) for item in (value if operator == 'between' else [value]))
+        return True
+
+    def condition(self, predicate):
+        '''Returns the SQL condition of a predicate and its parameters'''
+        column, operator, value = predicate
+        dtype = storedTypes().get(column)
+        if operator == 'between':
+            return '"{0}" > ? AND "{0}" < ?'.format(column), [sqlParameter(value[0], dtype), sqlParameter(value[1], dtype)]
+        if operator == 'in':
+            values = list(value)
+            return '"{}" IN ({})'.format(column, ', '.join(['?']*len(values))), [sqlParameter(item, dtype) for item in values]
+        if operator == 'notna':
+            return '"{}" IS NOT NULL'.format(column), []
+        return '"{}" {} ?'.format(column, SQL_OPERATORS[operator]), [sqlParameter(value, dtype)]
+
+    def positions(self, predicates):
+        '''Returns the numbers, in increasing order, of the rows passing all the predicates'''
+        conditions, parameters = [], []
+        for predicate in predicates:
+            condition, values = self.condition(predicate)
+            conditions.append('(' + condition + ')')
+            parameters += values
+        sql = 'SELECT row FROM {} WHERE {} ORDER BY row'.format(TABLE, ' AND '.join(conditions) or '1')
+
+        connection = connectReadOnly(self.path)
+        try:
+            rows = connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+        return np.array([row for row, in rows], dtype = np.int64)
+
+    def mask(self, predicates):
+        '''Returns a boolean numpy array that is True for the rows passing all the predicates'''
+        mask = np.zeros(self.length, dtype = bool)
+        mask[self.positions(predicates)] = True
+        return mask
+
+    def count(self, predicates):
+        '''Returns the number of rows passing all the predicates'''
+        return len(self.positions(predicates))
+
+    def sql(self, query, parameters = ()):
+        '''Run an SQL query on the store and return the result as a dataframe. The rows are in the table devices, with the row number in row, for example
+        SELECT "HTL_stack_sequence", COUNT(*) FROM devices WHERE "JV_certified_values" = 1 GROUP BY "HTL_stack_sequence"'''
+        connection = connectReadOnly(self.path)
+        try:
+            return pd.read_sql_query(query, connection, params = parameters)
+        finally:
+            connection.close()
+
+# The store of the most recently loaded snapshot
+loadedStore = None
+
+def register(store):
+    '''Make a store the one DatabaseQuery evaluates predicates with'''
+    global loadedStore
+    loadedStore = store
@@ -0,0 +1,300 @@
+# =============================================================================
+# Cube of Jsc/Jqe statistics over the device parameters
+#
+# The supplementary figures S_01 to S_07 show Jsc/Jqe against one parameter
+# at a time: PCE, Voc, FF, Jsc, hysteresis index, publication date and band
+# gap. Here all these parameters are binned once, at a resolution four times
+# finer than the bins of the figures (months for the date), and the rows are
+# aggregated into the cells of the cube. For every cell the number of values,
+# their sum and their sum of squares are stored, together with a histogram of
+# the values in bins of 0.004, which serves as a mergeable sketch of their
+# distribution. Only the cells with rows are stored.
+#
+# All the stored measures can be added, so any 1-D or 2-D marginal, at the
+# resolution of the figures, coarser (roll-up) or finer (drill-down), is a sum
+# over cells with np.bincount, without reading the rows again. Medians and
+# quartiles are read from the merged histograms, and are within one histogram
+# bin, 0.004, of the value at rank q n, np.quantile with method inverted_cdf,
+# for values between 0.5 and 1.5. In bins with few rows the interpolated
+# quantiles of np.quantile, which average the values around that rank, can be
+# further away.
+#
+# Example, the mean and median Jsc/Jqe per PCE bin and band gap bin:
+#     cube = UtilityFunctions.loadParameterCube(UtilityFunctions.ensureSnapshot(path_data))
+#     cube.view('PCE', 'Eg').collect()
+# =============================================================================
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import Binning
+import FilterIndex
+import HistogramCube
+
+VALUE = 'Jsc_over_Jqe'
+
+# Largest number of numbers in the merged histograms of a marginal
+MAX_SKETCH_SIZE = 5*10**7
+
+def dimensionDefinitions():
+    '''Returns a dictionary from dimension name to (column, finest bin edges, number of finest bins in a bin of the figures)'''
+    return {
+            'PCE': ('JV_default_PCE', Binning.linearEdges(0.25, 23.25, 0.25), 4),
+            'Voc': ('JV_default_Voc', Binning.linearEdges(0, 1.6, 0.025), 4),
+            'FF': ('JV_default_FF', Binning.linearEdges(0, 1, 0.0125), 4),
+            'Jsc': ('JV_default_Jsc', Binning.linearEdges(0, 27, 0.25), 4),
+            'hysteresis': ('JV_hysteresis_index', Binning.linearEdges(0, 1, 0.0125), 4),
+            'date': ('Ref_publication_date', Binning.dateEdges('2013-06-01', freq = 'ME', periods = 91), 6),
+            'Eg': ('Perovskite_band_gap', Binning.linearEdges(1.1, 2.6, 0.025), 4),
+        }
+
+def cubeFilters():
+    '''Returns the standard filters the rows in the cube pass, the same as in the figures S_01 to S_07'''
+    return ['light_intensity', 'EQE_measured']
+
+def definitionHash():
+    key = [(name, column, edges.astype(str).tolist(), size) for name, (column, edges, size) in dimensionDefinitions().items()]
+    key += [cubeFilters(), VALUE, HistogramCube.valueEdges().tolist()]
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+
+def cubeColumns():
+    '''Returns the database columns the cube is made from, apart from the value'''
+    return FilterIndex.filterColumns(cubeFilters()) + [column for column, edges, size in dimensionDefinitions().values()]
+
+def sketchCodes(values):
+    '''Returns the sketch bin of every value: 0 below the histogram edges, 1, 2 ... within them, and the last bin above them'''
+    edges = HistogramCube.valueEdges()
+    codes = Binning.binCodes(values, edges) + 1
+    codes[(codes == 0) & (values > edges[0])] = len(edges)
+    return codes
+
+def histogramQuantile(histograms, q):
+    '''Returns the q quantile of each row of histograms over the sketch bins, interpolating linearly within a bin.
+    Values below or above the histogram edges count as the first or last edge'''
+    edges = HistogramCube.valueEdges()
+    lower = np.concatenate([[edges[0]], edges[:-1], [edges[-1]]])
+    upper = np.concatenate([[edges[0]], edges[1:], [edges[-1]]])
+
+    totals = histograms.sum(axis = 1)
+    cumulative = np.cumsum(histograms, axis = 1)
+    target = q*totals
+    index = np.minimum((cumulative < target[:, np.newaxis]).sum(axis = 1), histograms.shape[1] - 1)
+    rows = np.arange(len(histograms))
+    before = cumulative[rows, index] - histograms[rows, index]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        fraction = np.clip((target - before)/histograms[rows, index], 0, 1)
+    quantile = lower[index] + fraction*(upper[index] - lower[index])
+    return np.where(totals > 0, quantile, np.nan)
+
+class ParameterCube:
+    '''The cells of the cube that hold rows. codes holds the finest bin of every cell along each dimension, where the code after the last bin
+    means that the parameter is missing or outside the edges. sketchCells, sketchBins and sketchCounts are the histograms of the cells'''
+
+    def __init__(self, codes, count, total, squares, sketchCells, sketchBins, sketchCounts, length):
+        self.codes = codes
+        self.count = count
+        self.total = total
+        self.squares = squares
+        self.sketchCells = sketchCells
+        self.sketchBins = sketchBins
+        self.sketchCounts = sketchCounts
+        self.length = length
+
+    @classmethod
+    def fromData(cls, data):
+        '''Aggregate the rows of the cleaned data, which must hold the columns in cubeColumns and the value'''
+        length = len(data)
+        data = data[FilterIndex.rowMask(data, cubeFilters())]
+        values = data[VALUE].to_numpy(dtype = np.float64, na_value = np.nan)
+        data, values = data[~np.isnan(values)], values[~np.isnan(values)]
+
+        # The finest bin of every row along every dimension, with missing values in a bin of their own
+        dimensions = dimensionDefinitions()
+        rowCodes = np.empty((len(data), len(dimensions)), dtype = np.int64)
+        for i, (column, edges, size) in enumerate(dimensions.values()):
+            codes = Binning.binCodes(data[column], edges)
+            codes[codes < 0] = len(edges) - 1
+            rowCodes[:, i] = codes
+
+        # The cells with rows, and the cell of every row
+        shape = [len(edges) for column, edges, size in dimensions.values()]
+        cells, cellOfRow = np.unique(np.ravel_multi_index(rowCodes.T, shape), return_inverse = True)
+        codes = np.stack(np.unravel_index(cells, shape), axis = 1).astype(np.int16)
+
+        # The histogram of every cell, as the bins with values
+        numberOfBins = len(HistogramCube.valueEdges()) + 1
+        sketch, sketchCounts = np.unique(cellOfRow*numberOfBins + sketchCodes(values), return_counts = True)
+
+        return cls(codes,
+                   np.bincount(cellOfRow, minlength = len(cells)),
+                   np.bincount(cellOfRow, weights = values, minlength = len(cells)),
+                   np.bincount(cellOfRow, weights = values**2, minlength = len(cells)),
+                   (sketch//numberOfBins).astype(np.int32), (sketch % numberOfBins).astype(np.int16), sketchCounts.astype(np.int32), length)
+
+    def updated(self, removed, added, length):
+        '''Returns the cube of a new version of the database with length rows, which differs from the version of this cube by the rows removed and the rows added,
+        both cleaned data as for fromData. The cells of the removed rows are subtracted and those of the added rows added'''
+        return addCubes([self, ParameterCube.fromData(removed), ParameterCube.fromData(added)], [1, -1, 1], length)
+
+    @classmethod
+    def load(cls, path):
+        '''Load a cube saved by save. Returns None if there is none, or if it was made with other definitions'''
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as stored:
+            if str(stored['definition']) != definitionHash():
+                return None
+            return cls(*[stored[name] for name in ('codes', 'count', 'total', 'squares', 'sketchCells', 'sketchBins', 'sketchCounts')], int(stored['length']))
+
+    def save(self, path):
+        '''Save the cube. Written to a temporary file first so that an interupted write never leaves a broken cube'''
+        path_tmp = path + '.tmp.npz'
+        np.savez(path_tmp, definition = definitionHash(), codes = self.codes, count = self.count, total = self.total, squares = self.squares,
+                 sketchCells = self.sketchCells, sketchBins = self.sketchBins, sketchCounts = self.sketchCounts, length = self.length)
+        os.replace(path_tmp, path)
+
+    def __len__(self):
+        return len(self.count)
+
+    def view(self, *dimensions):
+        '''Returns a view of the marginal over the given dimensions, at the resolution of the figures'''
+        return CubeView(self).drillDown(*dimensions)
+
+    #%% Marginals
+    def marginal(self, dimensions, sizes = None, where = None):
+        '''Returns the statistics of the value per bin of the given dimensions, summed over all other dimensions. sizes gives the number of finest bins
+        in a bin for each dimension, by default the bins of the figures, and where a range (low, high) of the parameter for some dimensions.
+        The result has one row per bin with values, indexed by the bins of the dimensions, with the columns count, mean, std, q1, median and q3'''
+        definitions = dimensionDefinitions()
+        names = list(definitions)
+        sizes = {**{name: definitions[name][2] for name in dimensions}, **(sizes or {})}
+
+        # Cells within the ranges. A finest bin is kept when it is within the range, and the missing bin is never kept
+        keep = np.ones(len(self), dtype = bool)
+        for name, (low, high) in (where or {}).items():
+            edges = definitions[name][1]
+            inside = np.append((edges[:-1] >= np.asarray(low, dtype = edges.dtype)) & (edges[1:] <= np.asarray(high, dtype = edges.dtype)), False)
+            keep &= inside[self.codes[:, names.index(name)]]
+
+        # The bin of every cell in the marginal, with the missing bin last
+        shape, binCodes = [], []
+        for name in dimensions:
+            missing = len(definitions[name][1]) - 1
+            numberOfBins = -(-missing//sizes[name])
+            codes = self.codes[:, names.index(name)].astype(np.int64)
+            binCodes.append(np.where(codes == missing, numberOfBins, codes//sizes[name]))
+            shape.append(numberOfBins + 1)
+        flat = np.ravel_multi_index(binCodes, shape) if dimensions else np.zeros(len(self), dtype = np.int64)
+        size = int(np.prod(shape))
+
+        count = np.bincount(flat[keep], weights = self.count[keep], minlength = size)
+        total = np.bincount(flat[keep], weights = self.total[keep], minlength = size)
+        squares = np.bincount(flat[keep], weights = self.squares[keep], minlength = size)
+
+        numberOfBins = len(HistogramCube.valueEdges()) + 1
+        if size*numberOfBins > MAX_SKETCH_SIZE:
+            raise ValueError('The marginal has {} bins, too many to merge the histograms of. Use fewer dimensions or coarser bins'.format(size))
+        inSketch = keep[self.sketchCells]
+        histograms = np.bincount(flat[self.sketchCells[inSketch]]*numberOfBins + self.sketchBins[inSketch],
+                                 weights = self.sketchCounts[inSketch], minlength = size*numberOfBins).reshape(size, numberOfBins)
+
+        present = count > 0
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            mean = total/count
+            std = np.sqrt(np.maximum(squares - count*mean**2, 0)/(count - 1))
+        result = pd.DataFrame({
+                'count': count.astype(np.int64),
+                'mean': mean,
+                'std': std,
+                'q1': histogramQuantile(histograms, 0.25),
+                'median': histogramQuantile(histograms, 0.5),
+                'q3': histogramQuantile(histograms, 0.75),
+            }, index = binIndex(dimensions, sizes, shape))
+        return result[present]
+
+def addCubes(cubes, signs, length):
+    '''Returns the sum of the cubes, each multiplied by its sign, 1 or -1, as a cube with length rows. Cells and histogram bins left without values are dropped'''
+    shape = [len(edges) for column, edges, size in dimensionDefinitions().values()]
+    numberOfBins = len(HistogramCube.valueEdges()) + 1
+
+    # The cells of all cubes, and the cell of every cell of each cube among them
+    flat = [np.ravel_multi_index(cube.codes.T.astype(np.int64), shape) for cube in cubes]
+    cells, cellOfCell = np.unique(np.concatenate(flat), return_inverse = True)
+    cellOfCell = np.split(cellOfCell, np.cumsum([len(cellsOfCube) for cellsOfCube in flat])[:-1])
+
+    def addMeasure(name):
+        weights = np.concatenate([sign*getattr(cube, name).astype(np.float64) for cube, sign in zip(cubes, signs)])
+        return np.bincount(np.concatenate(cellOfCell), weights = weights, minlength = len(cells))
+    count = np.rint(addMeasure('count')).astype(np.int64)
+
+    sketch, sketchOfBin = np.unique(np.concatenate([cellOf[cube.sketchCells]*numberOfBins + cube.sketchBins for cube, cellOf in zip(cubes, cellOfCell)]),
+                                    return_inverse = True)
+    sketchWeights = np.concatenate([sign*cube.sketchCounts.astype(np.int64) for cube, sign in zip(cubes, signs)])
+    sketchCounts = np.rint(np.bincount(sketchOfBin, weights = sketchWeights, minlength = len(sketch))).astype(np.int64)
+
+    # Drop what is left empty, and number the kept cells again
+    keep = count > 0
+    keepSketch = sketchCounts > 0
+    newCell = np.cumsum(keep) - 1
+    return ParameterCube(np.stack(np.unravel_index(cells[keep], shape), axis = 1).astype(np.int16), count[keep], addMeasure('total')[keep], addMeasure('squares')[keep],
+                         newCell[sketch[keepSketch]//numberOfBins].astype(np.int32), (sketch[keepSketch] % numberOfBins).astype(np.int16),
+                         sketchCounts[keepSketch].astype(np.int32), length)
+
+def binLabels(name, size):
+    '''Returns the labels of the bins of a dimension with size finest bins per bin, and Missing for the rows without a value'''
+    edges = dimensionDefinitions()[name][1]
+    return Binning.intervalLabels(np.append(edges[:-1:size], edges[-1])) + ['Missing']
+
+def binIndex(dimensions, sizes, shape):
+    '''Returns the index of a marginal, with one level per dimension'''
+    if not dimensions:
+        return pd.Index(['All'])
+    levels = [binLabels(name, sizes[name]) for name in dimensions]
+    return pd.MultiIndex.from_product(levels, names = dimensions) if len(dimensions) > 1 else pd.Index(levels[0], name = dimensions[0])
+
+class CubeView:
+    '''A marginal of the cube that can be rolled up and drilled down. Every step returns a new view'''
+
+    def __init__(self, cube, dimensions = (), sizes = None, where = None):
+        self.cube = cube
+        self.dimensions = tuple(dimensions)
+        self.sizes = dict(sizes or {})
+        self.where = dict(where or {})
+
+    def _replace(self, **changes):
+        arguments = dict(dimensions = self.dimensions, sizes = self.sizes, where = self.where)
+        arguments.update(changes)
+        return CubeView(self.cube, **arguments)
+
+    def rollUp(self, dimension, factor = None):
+        '''Make the bins of a dimension factor times wider, or without a factor sum over the dimension, removing it from the view'''
+        if factor is None:
+            return self._replace(dimensions = [name for name in self.dimensions if name != dimension],
+                                 sizes = {name: size for name, size in self.sizes.items() if name != dimension})
+        return self._replace(sizes = {**self.sizes, dimension: self.sizes[dimension]*factor})
+
+    def drillDown(self, *dimensions, factor = None):
+        '''Add dimensions to the view, at the resolution of the figures. For dimensions already in the view, make the bins factor times narrower,
+        by default down to the finest bins'''
+        definitions = dimensionDefinitions()
+        view = self
+        for dimension in dimensions:
+            if dimension not in definitions:
+                raise ValueError('Unknown dimension: {}. Available dimensions: {}'.format(dimension, ', '.join(definitions)))
+            if dimension not in view.dimensions:
+                view = view._replace(dimensions = view.dimensions + (dimension,), sizes = {**view.sizes, dimension: definitions[dimension][2]})
+            else:
+                size = 1 if factor is None else max(1, view.sizes[dimension]//factor)
+                view = view._replace(sizes = {**view.sizes, dimension: size})
+        return view
+
+    def slice(self, dimension, low, high):
+        '''Keep the rows with the parameter of a dimension between low and high'''
+        return self._replace(where = {**self.where, dimension: (low, high)})
+
+    def collect(self):
+        '''Returns the statistics per bin of the view, see ParameterCube.marginal'''
+        return self.cube.marginal(list(self.dimensions), self.sizes, self.where)
@@ -0,0 +1,110 @@
+# =============================================================================
+# Ragged representation of columns holding ' | ' separated lists
+#
+# Columns such as HTL_stack_sequence store one value per layer, joined by
+# ' | '. A RaggedColumn keeps the values of all rows in one flat array of
+# integer codes into a list of unique values, with an offsets array marking
+# where each row starts. Per layer grouping, filtering and counting are then
+# array operations on the codes instead of string splitting.
+# =============================================================================
+
+import numpy as np
+import pandas as pd
+
+SEPARATOR = ' | '
+
+class RaggedColumn:
+    '''A column where every row holds a list of values. The values of row i are categories[codes[offsets[i]:offsets[i+1]]]'''
+
+    def __init__(self, offsets, codes, categories, index, name = None):
+        self.offsets = offsets
+        self.codes = codes
+        self.categories = categories
+        self.index = index
+        self.name = name
+
+    @classmethod
+    def fromSeries(cls, series, separator = SEPARATOR):
+        '''Parse a series of separated strings. Missing values become empty lists. Each distinct string is only split once'''
+        # Encode the rows, so that only the distinct strings need to be split
+        rowCodes, distinct = pd.factorize(series.astype(object), use_na_sentinel = True)
+        distinct = pd.Series(np.asarray(distinct, dtype = object))
+
+        # Split the distinct strings and encode the parts
+        parts = distinct.astype(str).str.split(separator, regex = False)
+        partLengths = parts.str.len().to_numpy(dtype = np.int64)
+        partCodes, categories = pd.factorize(parts.explode().str.strip().to_numpy())
+        partStarts = np.concatenate([[0], np.cumsum(partLengths)[:-1]]).astype(np.int64)
+
+        # Missing rows point to an extra distinct string with no parts
+        rowCodes = np.where(rowCodes < 0, len(distinct), rowCodes)
+        partLengths = np.append(partLengths, 0)
+        partStarts = np.append(partStarts, 0)
+
+        # Each row gets the parts of its distinct string
+        lengths = partLengths[rowCodes]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        positions = np.repeat(partStarts[rowCodes] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        codes = partCodes[positions].astype(np.int32)
+
+        return cls(offsets, codes, np.asarray(categories, dtype = object), series.index, name = series.name)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self):
+        '''Returns the number of values in each row'''
+        return np.diff(self.offsets)
+
+    def rowNumbers(self):
+        '''Returns the row number of every value in the flat codes array'''
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def positions(self):
+        '''Returns the position within its row (the layer number, starting from 0) of every value in the flat codes array'''
+        return np.arange(len(self.codes)) - np.repeat(self.offsets[:-1], self.lengths())
+
+    def code(self, value):
+        '''Returns the code of a value, or -1 if the value does not occur'''
+        matches = np.flatnonzero(self.categories == value)
+        return matches[0] if len(matches) else -1
+
+    def layer(self, position):
+        '''Returns the value in a given layer of each row as a categorical series. Negative positions count from the end. Rows without that layer get NaN'''
+        lengths = self.lengths()
+        if position < 0:
+            position = lengths + position
+        exists = (position >= 0) & (position < lengths)
+        codes = np.full(len(self), -1, dtype = np.int32)
+        codes[exists] = self.codes[(self.offsets[:-1] + position)[exists]]
+        return pd.Series(pd.Categorical.from_codes(codes, self.categories), index = self.index, name = self.name)
+
+    def contains(self, value):
+        '''Returns a boolean series that is True for the rows with the value in any layer'''
+        matches = np.zeros(len(self), dtype = bool)
+        matches[self.rowNumbers()[self.codes == self.code(value)]] = True
+        return pd.Series(matches, index = self.index, name = self.name)
+
+    def valueCounts(self, perRow = True):
+        '''Returns how often each value occurs, sorted in descending order. With perRow = True a value occurring in several layers of the same row is counted once'''
+        codes = self.codes
+        if perRow:
+            codes = np.unique(self.rowNumbers().astype(np.int64)*len(self.categories) + codes) % max(len(self.categories), 1)
+        counts = pd.Series(np.bincount(codes, minlength = len(self.categories)), index = self.categories, name = self.name)
+        return counts.sort_values(ascending = False, kind = 'stable')
+
+    def explode(self):
+        '''Returns a long table with one row per value, holding the index of the original row, the layer number and the value'''
+        return pd.DataFrame({
+                'row': self.index.to_numpy()[self.rowNumbers()],
+                'layer': self.positions(),
+                'value': pd.Categorical.from_codes(self.codes, self.categories),
+            })
+
+    def toFloats(self):
+        '''Returns the values of the flat codes array as floats, for columns holding numbers. Values that are not numbers become NaN'''
+        return pd.to_numeric(pd.Series(self.categories), errors = 'coerce').to_numpy()[self.codes]
+
+def raggedColumns(data, columns, separator = SEPARATOR):
+    '''Returns a dictionary with a RaggedColumn for each of the given columns in the data'''
+    return {column: RaggedColumn.fromSeries(data[column], separator = separator) for column in columns if column in data.columns}
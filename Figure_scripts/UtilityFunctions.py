@@ -6,11 +6,24 @@
 # =============================================================================
 
 import os
-import datetime
+import colorsys
+import hashlib
+import json
 
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+import seaborn as sns
+
+import DatabaseSchema
+import DerivedMetrics
+import FilterIndex
+import GroupStatistics
+import HistogramCube
+import LocalStore
+import ParameterCube
+import RaggedColumns
 
 def axessetting(ax, fontsize = 16): 
     for item in ([ax.title, ax.xaxis.label, ax.yaxis.label] +
@@ -20,63 +33,427 @@ def axessetting(ax, fontsize = 16):
     return True
 
 def convertToDatetime(data):
-    '''Go trough data, which is assumed to be a pandas series, and convert all non datetime fields to 'NaT'''
-    newData = []
-    for i, time in enumerate(data):
-        if isinstance(time, datetime.datetime) == False:
-            try:
-                newData.append(datetime.datetime.fromisoformat(time))
-            except:
-                newData.append(pd.to_datetime(''))
-        else:
-            newData.append(time)
-    return newData
+    '''Convert data, which is assumed to be a pandas series, to a datetime64[ns] series. ISO formatted strings are parsed, datetimes are kept and everything else becomes NaT'''
+    data = pd.Series(data)
 
-def convertNumerListToFloats(numberList):
-    '''Convert a numerlist to floats. If more than one value, keep the first one'''
+    # Columns that already hold datetimes only need the resolution fixed, and numbers are not dates
+    if pd.api.types.is_datetime64_any_dtype(data):
+        return data.astype('datetime64[ns]')
+    if pd.api.types.is_numeric_dtype(data) or pd.api.types.is_bool_dtype(data):
+        return pd.Series(pd.NaT, index = data.index, dtype = 'datetime64[ns]')
 
-    # Convert data to strings
-    numberList = numberList.astype(str)
+    # Parse everything in one go when the column only holds strings and datetimes. Strings that are not ISO formatted become NaT
+    if pd.api.types.infer_dtype(data, skipna = True) in ('string', 'datetime', 'empty'):
+        return pd.to_datetime(data, format = 'ISO8601', errors = 'coerce').astype('datetime64[ns]')
 
-    # identify all strings with more than one element, by utilizing that they contain the pattern ' | '
-    x = numberList.str.contains(' | ') == True
+    # Mixed columns. Parse the strings, keep datetime objects as they are, and let numbers become NaT
+    isString = data.map(type) == str
+    converted = pd.to_datetime(data.where(isString), format = 'ISO8601', errors = 'coerce')
+    isOther = ~isString & data.notna()
+    if isOther.any():
+        isOther[isOther.to_numpy()] = pd.to_numeric(data[isOther], errors = 'coerce').isna().to_numpy()
+        converted[isOther] = pd.to_datetime(data[isOther], errors = 'coerce')
 
-    # Get a list of the indexes where the above condition holds
-    indexlist = list(numberList[x].index)
+    return converted.astype('datetime64[ns]')
 
-    # Loop over all instances with more than one number
-    for index in indexlist:
-        # Ensure that entry is a string
-        y = str(numberList[index]).strip()
+def convertNumerListToFloats(numberList):
+    '''Convert a numerlist to floats. If more than one value, keep the first one'''
+    # Columns that are already numeric need no parsing
+    if pd.api.types.is_numeric_dtype(numberList):
+        return numberList.astype(float)
 
-        # Keep the first entry
-        y = y.split(' | ')[0].strip()
+    # Convert everything to floats. Entries with more than one value become NaN here
+    numbers = pd.to_numeric(numberList.astype(object), errors = 'coerce')
 
-        # Convert number into a float
-        try:
-            number = float(y)
-        except:
-            number = np.nan
+    # For the entries with more than one value, keep what comes before the first ' | '. The separator is matched literally, not as a regex
+    multiple = numbers.isna() & numberList.notna()
+    if multiple.any():
+        firstValues = numberList[multiple].astype(str).str.split(' | ', n = 1, regex = False).str[0].str.strip()
+        numbers[multiple] = pd.to_numeric(firstValues, errors = 'coerce')
+
+    return numbers
 
-        # Update data
-        numberList.loc[index] = number
+def convertNumberListColumns(data, columns = None):
+    '''Convert all columns in the data that hold ' | ' separated numbers to floats, keeping the first value. By default all number list columns in the schema'''
+    if columns is None:
+        columns = DatabaseSchema.numberListColumns()
 
-    # Convert everything to floats
-    numberList = pd.to_numeric(numberList, errors = 'coerce')
+    for column in columns:
+        if column in data.columns:
+            data[column] = convertNumerListToFloats(data[column])
 
-    return numberList
+    return data
 
 def initialDataManipulation(data):
     '''Do initial data manipulation required by the app'''
     # Ensure that all publication dates are in the right format
-    data['Ref_publication_date'] = convertToDatetime(data['Ref_publication_date'])
+    if 'Ref_publication_date' in data.columns:
+        data['Ref_publication_date'] = convertToDatetime(data['Ref_publication_date'])
 
-    # Convert the band gap column to numeric values (and keeping the first value if multiple values)
-    data['Perovskite_band_gap'] = convertNumerListToFloats(data['Perovskite_band_gap'])
+    # Convert the number list columns, such as the band gap, to numeric values (and keeping the first value if multiple values)
+    data = convertNumberListColumns(data)
 
     return data
 
+def desaturate(color, saturation):
+    '''Returns a color with its saturation reduced by the given factor, as seaborn does for the boxes in a boxplot'''
+    hue, lightness, oldSaturation = colorsys.rgb_to_hls(*matplotlib.colors.to_rgb(color))
+    return colorsys.hls_to_rgb(hue, lightness, oldSaturation*saturation)
+
+def boxplotFromStats(statistics, ax = None, color = None, saturation = 0.75, linecolor = '0.25', width = 0.8):
+    '''Draw boxplots from precomputed box statistics, a table with one row per box as returned by GroupStatistics.groupStatistics, without the raw data.
+    The boxes are drawn at x = 0, 1, 2 ... labelled with the index of the table, and styled as seaborn's boxplot. Rows without values leave an empty slot'''
+    if ax is None:
+        ax = plt.gca()
+    if color is None:
+        color = plt.rcParams['axes.prop_cycle'].by_key()['color'][0]
+    linewidth = plt.rcParams['patch.linewidth']
+
+    positions = np.arange(len(statistics))
+    drawn = (statistics['n'] > 0).to_numpy()
+    lineprops = {'color': linecolor, 'linewidth': linewidth, 'solid_capstyle': 'butt'}
+    if drawn.any():
+        ax.bxp(GroupStatistics.bxpStats(statistics[drawn]), positions = positions[drawn], widths = width, capwidths = width/2,
+               patch_artist = True, manage_ticks = False,
+               boxprops = {'facecolor': desaturate(color, saturation), 'edgecolor': linecolor, 'linewidth': linewidth},
+               whiskerprops = lineprops, capprops = lineprops, medianprops = {**lineprops, 'zorder': 2.1},
+               flierprops = {'marker': 'o', 'markerfacecolor': 'none', 'markeredgecolor': linecolor, 'linestyle': 'none'})
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([str(label) for label in statistics.index])
+    ax.set_xlim(-0.5, len(statistics) - 0.5, auto = None)
+    ax.xaxis.grid(False)
+
+    return ax
+
+def histogramFromCounts(edges, counts, ax = None, color = None, alpha = 1):
+    '''Draw a histogram from the counts in the bins between edges, as sns.histplot draws it from the values'''
+    centres = (np.asarray(edges[:-1]) + np.asarray(edges[1:]))/2
+    return sns.histplot(x = centres, weights = counts, bins = list(edges), ax = ax, color = color, alpha = alpha)
+
+def mostCommonCategories(data, column, antal):
+    '''Returns the antal most common values in a column, in order of how common they are, and the rows of the data that have one of them'''
+    common = data[column].value_counts().index.tolist()[0:antal]
+
+    data2 = data[data[column].isin(common)]
+    if isinstance(data2[column].dtype, pd.CategoricalDtype):
+        data2 = data2.assign(**{column: data2[column].cat.remove_unused_categories()})
+
+    return common, data2
+
+def fileHash(path, blockSize = 2**20):
+    '''Return the sha256 hash of a file. The hash is stored next to the snapshots and only recomputed if the file size or modification time changes'''
+    stat = os.stat(path)
+    path_hash = os.path.join(cacheFolder(path), os.path.splitext(os.path.basename(path))[0] + '_hash.json')
+
+    # Reuse the stored hash if the file has not been touched since it was computed
+    if os.path.isfile(path_hash):
+        with open(path_hash) as f:
+            stored = json.load(f)
+        if stored['size'] == stat.st_size and stored['mtime_ns'] == stat.st_mtime_ns:
+            return stored['sha256']
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            sha.update(block)
+
+    os.makedirs(cacheFolder(path), exist_ok = True)
+    with open(path_hash, 'w') as f:
+        json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha.hexdigest()}, f)
+
+    return sha.hexdigest()
+
+def cacheFolder(path_data):
+    '''Returns the folder where cached versions of the database are stored'''
+    return os.path.join(os.path.dirname(os.path.abspath(path_data)), 'Cache')
+
+def snapshotPath(path_data, sourceHash):
+    '''Returns the path to the columnar snapshot of the database file with a given hash. The schema is part of the key, so changing it invalidates old snapshots'''
+    name = os.path.splitext(os.path.basename(path_data))[0]
+    key = hashlib.sha256((sourceHash + DatabaseSchema.schemaHash()).encode()).hexdigest()
+    return os.path.join(cacheFolder(path_data), name + '_' + key[:16] + '.parquet')
+
+def makeArrowCompatible(data):
+    '''Convert object columns with mixed types, which parquet cannot store, to strings. Missing values are kept'''
+    import pyarrow as pa
+
+    for column in data.columns[data.dtypes == object]:
+        try:
+            pa.array(data[column], from_pandas = True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            data[column] = data[column].where(data[column].isna(), data[column].astype(str))
+
+    return data
+
+def writeSnapshot(data, path_snapshot):
+    '''Write a dataframe to a parquet snapshot. Written to a temporary file first so that an interupted write never leaves a broken snapshot'''
+    os.makedirs(os.path.dirname(path_snapshot), exist_ok = True)
+    path_tmp = path_snapshot + '.tmp'
+    makeArrowCompatible(data).to_parquet(path_tmp, index = False)
+    os.replace(path_tmp, path_snapshot)
+
+    # Remove snapshots of older versions of the same file, and the files stored with them
+    prefix = os.path.basename(path_snapshot).rsplit('_', 1)[0] + '_'
+    current = os.path.splitext(os.path.basename(path_snapshot))[0]
+    for fileName in os.listdir(os.path.dirname(path_snapshot)):
+        if fileName.startswith(prefix) and fileName.endswith(snapshotFileEndings()) and not fileName.startswith(current):
+            os.remove(os.path.join(os.path.dirname(path_snapshot), fileName))
+
+def snapshotFileEndings():
+    '''Returns the endings of the files stored together with a snapshot, which are removed when the snapshot is replaced'''
+    return ('.parquet', '_filters.npz', '_derived.parquet', '_histograms.npz', '_parameters.npz', '_store.sqlite', '_rows.npz')
+
+def filterIndexPath(path_snapshot):
+    '''Returns the path to the filter bitmaps of a snapshot'''
+    return os.path.splitext(path_snapshot)[0] + '_filters.npz'
+
+def loadFilterIndex(path_snapshot, data = None):
+    '''Returns the filter bitmaps of a snapshot, building and storing them if needed. The filters are evaluated on data if given, otherwise on the snapshot'''
+    path_filters = filterIndexPath(path_snapshot)
+    filterIndex = FilterIndex.FilterIndex.load(path_filters)
+    if filterIndex is None:
+        if data is None:
+            import pyarrow.parquet as pq
+            available = pq.read_schema(path_snapshot).names
+            data = pd.read_parquet(path_snapshot, columns = [column for column in FilterIndex.filterColumns() if column in available])
+        filterIndex = FilterIndex.FilterIndex.fromData(data)
+        filterIndex.save(path_filters)
+    filterIndex.snapshot = FilterIndex.snapshotName(path_snapshot)
+    return filterIndex
+
+def derivedMetricsPath(path_snapshot):
+    '''Returns the path to the derived metrics of a snapshot'''
+    return os.path.splitext(path_snapshot)[0] + '_derived.parquet'
+
+def loadDerivedMetrics(path_snapshot, names, data = None):
+    '''Returns the given derived metrics of a snapshot. They are read from the metrics stored with the snapshot, which are computed and stored if missing
+    or made with other definitions. The metrics are computed from data if given, otherwise from the snapshot'''
+    import pyarrow.parquet as pq
+
+    path_metrics = derivedMetricsPath(path_snapshot)
+    stored, hashes = DerivedMetrics.load(path_metrics)
+    if not DerivedMetrics.isCurrent(stored, hashes, names, pq.read_metadata(path_snapshot).num_rows):
+        if data is None:
+            available = pq.read_schema(path_snapshot).names
+            data = pd.read_parquet(path_snapshot, columns = DerivedMetrics.baseColumns(DerivedMetrics.computableMetrics(available)))
+        stored, hashes, recomputed = DerivedMetrics.updateMetrics(stored, hashes, data)
+        DerivedMetrics.save(path_metrics, stored, hashes)
+    return stored[names]
+
+def histogramCubePath(path_snapshot):
+    '''Returns the path to the histogram cube of a snapshot'''
+    return os.path.splitext(path_snapshot)[0] + '_histograms.npz'
+
+def loadHistogramCube(path_snapshot, data = None):
+    '''Returns the histogram cube of a snapshot, building and storing it if needed. The cube is counted from data if given, otherwise from the snapshot.
+    The derived metrics are taken from the metrics stored with the snapshot'''
+    path_cube = histogramCubePath(path_snapshot)
+    cube = HistogramCube.HistogramCube.load(path_cube)
+    if cube is None:
+        import pyarrow.parquet as pq
+        available = pq.read_schema(path_snapshot).names
+        columns = [column for column in HistogramCube.cubeColumns() if column in available]
+        data = pd.read_parquet(path_snapshot, columns = columns) if data is None else data[columns].copy()
+        data['Ref_publication_date'] = convertToDatetime(data['Ref_publication_date'])
+        for metric, values in loadDerivedMetrics(path_snapshot, HistogramCube.cubeDefinition()['metrics']).items():
+            data[metric] = values.to_numpy()
+        cube = HistogramCube.HistogramCube.fromData(data)
+        cube.save(path_cube)
+    cube.snapshot = FilterIndex.snapshotName(path_snapshot)
+    return cube
+
+def parameterCubePath(path_snapshot):
+    '''Returns the path to the cube of Jsc/Jqe statistics over the device parameters of a snapshot'''
+    return os.path.splitext(path_snapshot)[0] + '_parameters.npz'
+
+def loadParameterCube(path_snapshot):
+    '''Returns the cube of Jsc/Jqe statistics over the device parameters of a snapshot, see ParameterCube, building and storing it if needed'''
+    path_cube = parameterCubePath(path_snapshot)
+    cube = ParameterCube.ParameterCube.load(path_cube)
+    if cube is None:
+        import pyarrow.parquet as pq
+        available = pq.read_schema(path_snapshot).names
+        data = pd.read_parquet(path_snapshot, columns = [column for column in ParameterCube.cubeColumns() if column in available])
+        data = initialDataManipulation(data)
+        data[ParameterCube.VALUE] = loadDerivedMetrics(path_snapshot, [ParameterCube.VALUE])[ParameterCube.VALUE].to_numpy()
+        cube = ParameterCube.ParameterCube.fromData(data)
+        cube.save(path_cube)
+    return cube
+
+def localStorePath(path_snapshot):
+    '''Returns the path to the indexed local store of a snapshot'''
+    return os.path.splitext(path_snapshot)[0] + '_store.sqlite'
+
+def loadLocalStore(path_snapshot, data = None):
+    '''Returns the indexed local store of a snapshot, see LocalStore, importing the snapshot into it if needed. The store is imported from data if given,
+    otherwise from the snapshot'''
+    path_store = localStorePath(path_snapshot)
+    store = LocalStore.LocalStore.load(path_store)
+    if store is None:
+        if data is None:
+            import pyarrow.parquet as pq
+            available = pq.read_schema(path_snapshot).names
+            data = pd.read_parquet(path_snapshot, columns = [column for column in LocalStore.storeDefinition()['columns'] if column in available])
+        store = LocalStore.LocalStore.fromData(data, path_store)
+    return store
+
+def rowIdentityPath(path_snapshot):
+    '''Returns the path to the hashes of the row keys and rows of a snapshot, see Ingest'''
+    return os.path.splitext(path_snapshot)[0] + '_rows.npz'
+
+def cleaningColumns():
+    '''Returns the columns used by initialDataManipulation, which are loaded together with the columns asked for'''
+    return [
+            'Ref_publication_date',
+            'Perovskite_band_gap',
+        ]
+
+def columnsToLoad(columns, availableColumns):
+    '''Returns the requested columns followed by the cleaning columns present in the file, without duplicates'''
+    columns = list(dict.fromkeys(columns))
+    return columns + [column for column in cleaningColumns() if column in availableColumns and column not in columns]
+
+def ensureSnapshot(path_data):
+    '''Returns the path to the snapshot of the database file, making the snapshot, its filter bitmaps, its derived metrics, its histogram cube and its local store
+    if they do not exist. The filter bitmaps of the snapshot are registered for filterRows, the histogram cube for HistogramCube.histogramCounts
+    and the local store for DatabaseQuery'''
+    path_snapshot = snapshotPath(path_data, fileHash(path_data))
+
+    if not os.path.isfile(path_snapshot):
+        data = DatabaseSchema.readCsv(path_data)
+        writeSnapshot(data, path_snapshot)
+        FilterIndex.register(loadFilterIndex(path_snapshot, data))
+        loadDerivedMetrics(path_snapshot, [], data)
+        HistogramCube.register(loadHistogramCube(path_snapshot, data))
+        LocalStore.register(loadLocalStore(path_snapshot, data))
+    else:
+        FilterIndex.register(loadFilterIndex(path_snapshot))
+        HistogramCube.register(loadHistogramCube(path_snapshot))
+        LocalStore.register(loadLocalStore(path_snapshot))
+
+    return path_snapshot
+
+def readCsvFiltered(path_data, columns = None, filters = (), chunkSize = 100000):
+    '''Read the rows of the database CSV passing the given standard filters, such as ['light_intensity', 'EQE_measured'], see FilterIndex.filterDefinitions.
+    The file is parsed in chunks of chunkSize rows, only the given columns (and the ones needed by initialDataManipulation) and the filter columns are parsed,
+    and only the rows passing the filters are kept from each chunk, so the memory used is bounded by the chunk size plus the result.
+    The columns can include derived metrics, which are computed from the kept rows. The index holds the row numbers in the file, as for the snapshot'''
+    header = pd.read_csv(path_data, nrows = 0).columns
+    if columns is None:
+        columns = list(header)
+    metrics = [column for column in columns if DerivedMetrics.isMetric(column)]
+    stored = [column for column in columns if not DerivedMetrics.isMetric(column)]
+
+    kept = columnsToLoad(stored + DerivedMetrics.baseColumns(metrics), header)
+    parsed = kept + [column for column in FilterIndex.filterColumns(filters) if column not in kept]
+    chunks = []
+    for chunk in DatabaseSchema.readCsvChunks(path_data, usecols = parsed, chunkSize = chunkSize):
+        chunks.append(chunk.loc[FilterIndex.evaluateFilters(chunk, filters), kept])
+
+    data = DatabaseSchema.concatChunks(chunks) if chunks else DatabaseSchema.readCsv(path_data, usecols = kept)
+    return DerivedMetrics.addMetrics(data, metrics)[columnsToLoad(columns, header)]
+
+def readDatabase(path_data, columns = None, useSnapshot = True, filters = None):
+    '''Read the database. The first time a given version of the CSV file is read it is converted to a parquet snapshot, which all later calls read instead of parsing the CSV.
+    Column types are taken from DatabaseSchema.
+    If columns is given, only those columns (and the ones needed by initialDataManipulation) are read from disk. The columns can include derived metrics,
+    such as Jsc_over_Jqe, which are read from the metrics stored with the snapshot, see DerivedMetrics. With useSnapshot = False the CSV is parsed directly.
+    If filters is given only the rows passing those standard filters are returned. Without the snapshot they are applied while the CSV is parsed, see readCsvFiltered'''
+    if filters:
+        if not useSnapshot:
+            return readCsvFiltered(path_data, columns, filters)
+        return filterRows(readDatabase(path_data, columns), filters)
+
+    metrics = [] if columns is None else [column for column in columns if DerivedMetrics.isMetric(column)]
+    if columns is not None:
+        stored = [column for column in columns if not DerivedMetrics.isMetric(column)]
+
+    if not useSnapshot:
+        if columns is None:
+            return DatabaseSchema.readCsv(path_data)
+        header = pd.read_csv(path_data, nrows = 0).columns
+        data = DatabaseSchema.readCsv(path_data, usecols = columnsToLoad(stored + DerivedMetrics.baseColumns(metrics), header))
+        return DerivedMetrics.addMetrics(data, metrics)[columnsToLoad(columns, header)]
+
+    path_snapshot = ensureSnapshot(path_data)
+
+    if columns is None:
+        return FilterIndex.markSnapshotRows(pd.read_parquet(path_snapshot), path_snapshot)
+
+    import pyarrow.parquet as pq
+    data = FilterIndex.markSnapshotRows(pd.read_parquet(path_snapshot, columns = columnsToLoad(stored, pq.read_schema(path_snapshot).names)), path_snapshot)
+    if metrics:
+        for metric, values in loadDerivedMetrics(path_snapshot, metrics).items():
+            data[metric] = values.to_numpy()
+    return data[columnsToLoad(columns, data.columns)]
+
+def loadDatabase(path_data, columns = None, useSnapshot = True, raggedColumns = None, filters = None):
+    '''Load the database, see readDatabase. If raggedColumns is given, a list of columns holding ' | ' separated lists such as the stack sequences,
+    those columns are also parsed into RaggedColumns and a tuple (data, dictionary of ragged columns) is returned'''
+    if raggedColumns is None:
+        return readDatabase(path_data, columns = columns, useSnapshot = useSnapshot, filters = filters)
+
+    if columns is not None:
+        columns = list(columns) + [column for column in raggedColumns if column not in columns]
+    data = readDatabase(path_data, columns = columns, useSnapshot = useSnapshot, filters = filters)
+
+    return data, RaggedColumns.raggedColumns(data, raggedColumns)
+
+def databaseChunks(path_data, columns, chunkSize = 100000):
+    '''Yields the given columns of the database in chunks of chunkSize rows, cleaned by initialDataManipulation, so that only one chunk is in memory at a time.
+    The columns can include derived metrics, which are computed per chunk. The chunks are read from the snapshot if there is one, otherwise from the CSV,
+    and no snapshot is made. The index of a chunk holds the row numbers in the database'''
+    metrics = [column for column in columns if DerivedMetrics.isMetric(column)]
+    stored = [column for column in columns if not DerivedMetrics.isMetric(column)] + DerivedMetrics.baseColumns(metrics)
+
+    path_snapshot = snapshotPath(path_data, fileHash(path_data))
+    if os.path.isfile(path_snapshot):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path_snapshot)
+        read = columnsToLoad(stored, parquet.schema_arrow.names)
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size = chunkSize, columns = read))
+    else:
+        read = columnsToLoad(stored, pd.read_csv(path_data, nrows = 0).columns)
+        chunks = DatabaseSchema.readCsvChunks(path_data, usecols = read, chunkSize = chunkSize)
+
+    start = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        chunk = DerivedMetrics.addMetrics(initialDataManipulation(chunk), metrics)
+        yield chunk[columnsToLoad(columns, chunk.columns)]
+
+# The formats and resolution figures are saved in
+FIGURE_FORMATS = ['tif', 'png', 'pdf']
+FIGURE_DPI = 300
+
+# The paths of the files written by saveFigure, used to record which files a figure script produces
+savedFigures = []
+
+def figureParameters():
+    '''Returns the parameters saveFigure uses. Figures saved with other parameters are out of date'''
+    return {'formats': FIGURE_FORMATS, 'dpi': FIGURE_DPI}
+
+def filterRows(data, filters, columns = None):
+    '''Returns the rows of the data passing all the given filters, such as ['light_intensity', 'EQE_measured'], see FilterIndex.filterDefinitions.
+    If columns is given only those columns are kept. The rows and columns are taken in one step, using the bitmaps stored with the snapshot
+    when the data was read from it, see FilterIndex.rowMask'''
+    mask = FilterIndex.rowMask(data, filters)
+    if columns is None:
+        return data[mask]
+    return data.loc[mask, columns]
+
 def saveFigure(path_figure_folder, fileName):
-    plt.savefig(os.path.join(path_figure_folder, (fileName + '.tif')), dpi = 300, format = 'tif')
-    plt.savefig(os.path.join(path_figure_folder, (fileName + '.png')), dpi = 300, format = 'png')
-    plt.savefig(os.path.join(path_figure_folder, (fileName + '.pdf')), dpi = 300, format = 'pdf') 
\ No newline at end of file
+    for fileFormat in FIGURE_FORMATS:
+        path_figure = os.path.join(path_figure_folder, (fileName + '.' + fileFormat))
+        plt.savefig(path_figure, dpi = FIGURE_DPI, format = fileFormat)
+        savedFigures.append(path_figure)
+
+def finishFigure(path_figure_folder, fileName, save = False):
+    '''Show the current figure, or save and close it if save = True. save can also be a list of the file names to save, with the other figures shown'''
+    if save is True or (save and fileName in save):
+        saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+        plt.close()
+    else:
+        plt.show()
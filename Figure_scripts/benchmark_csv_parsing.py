@@ -0,0 +1,50 @@
+# =============================================================================
+# Benchmark of the CSV parsers
+#
+# Compares reading the full database with the pandas C parser, as
+# pd.read_csv(low_memory=False) with the declared types, and with the
+# multi-threaded pyarrow parser, through DatabaseSchema.readCsv. Both give the
+# frame the snapshot is written from, and the frames are checked to be equal.
+# The pyarrow parser is also timed with 1, 2, 4 ... threads up to the number
+# of cores.
+# =============================================================================
+
+import os
+import timeit
+
+import pandas as pd
+import pyarrow as pa
+
+import DatabaseSchema
+
+#%% File paths
+fileName_data = 'Perovskite_database_content_all_data.csv'
+cwd = os.path.abspath(os.getcwd())
+top_directory = os.path.dirname(cwd)
+path_raw_data = os.path.join(top_directory, "Data",)
+path_data = os.path.join(path_raw_data, fileName_data)
+
+#%% Run the benchmarks
+def benchmark(engine, repeat = 3):
+    '''Returns the shortest time of reading the database with a parser, and the frame read'''
+    seconds = min(timeit.repeat(lambda: DatabaseSchema.readCsv(path_data, engine = engine), number = 1, repeat = repeat))
+    return seconds, DatabaseSchema.readCsv(path_data, engine = engine)
+
+t_pandas, expected = benchmark('pandas')
+t_arrow, result = benchmark('pyarrow')
+try:
+    pd.testing.assert_frame_equal(expected, result)
+    identical = True
+except AssertionError:
+    identical = False
+
+print('Rows: {}   columns: {}   cores: {}'.format(len(expected), len(expected.columns), os.cpu_count()))
+print('{:<28} pandas: {:8.4f} s   pyarrow: {:8.4f} s   speedup: {:6.1f}   identical: {}'.format(
+    'readCsv', t_pandas, t_arrow, t_pandas/t_arrow, identical))
+
+threads = 1
+while threads <= os.cpu_count():
+    pa.set_cpu_count(threads)
+    seconds = min(timeit.repeat(lambda: DatabaseSchema.readCsv(path_data, engine = 'pyarrow'), number = 1, repeat = 3))
+    print('{:<28} {:8.4f} s   speedup over pandas: {:6.1f}'.format('pyarrow, {} threads'.format(threads), seconds, t_pandas/seconds))
+    threads *= 2
@@ -0,0 +1,90 @@
+# =============================================================================
+# Benchmark of the initial data manipulation
+#
+# Compares the vectorised functions in UtilityFunctions with the loop based
+# versions they replaced, on the full database.
+# =============================================================================
+
+import datetime
+import os
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import UtilityFunctions
+
+#%% File paths
+fileName_data = 'Perovskite_database_content_all_data.csv'
+cwd = os.path.abspath(os.getcwd())
+top_directory = os.path.dirname(cwd)
+path_raw_data = os.path.join(top_directory, "Data",)
+path_data = os.path.join(path_raw_data, fileName_data)
+
+#%% Load the raw columns, as strings, the way pd.read_csv returns them
+data = pd.read_csv(path_data, usecols = UtilityFunctions.cleaningColumns(), low_memory=False)
+
+#%% The loop based versions
+def convertToDatetimeLoop(data):
+    '''Go trough data, which is assumed to be a pandas series, and convert all non datetime fields to 'NaT'''
+    newData = []
+    for i, time in enumerate(data):
+        if isinstance(time, datetime.datetime) == False:
+            try:
+                newData.append(datetime.datetime.fromisoformat(time))
+            except:
+                newData.append(pd.to_datetime(''))
+        else:
+            newData.append(time)
+    return newData
+
+def convertNumerListToFloatsLoop(numberList):
+    '''Convert a numerlist to floats. If more than one value, keep the first one'''
+
+    # Convert data to strings
+    numberList = numberList.astype(str)
+
+    # identify all strings with more than one element, by utilizing that they contain the pattern ' | '
+    x = numberList.str.contains(' | ') == True
+
+    # Get a list of the indexes where the above condition holds
+    indexlist = list(numberList[x].index)
+
+    # Loop over all instances with more than one number
+    for index in indexlist:
+        # Ensure that entry is a string
+        y = str(numberList[index]).strip()
+
+        # Keep the first entry
+        y = y.split(' | ')[0].strip()
+
+        # Convert number into a float
+        try:
+            number = float(y)
+        except:
+            number = np.nan
+
+        # Update data
+        numberList.loc[index] = number
+
+    # Convert everything to floats
+    numberList = pd.to_numeric(numberList, errors = 'coerce')
+
+    return numberList
+
+#%% Run the benchmarks
+def benchmark(name, function, reference, column, repeat = 3):
+    '''Time a function against its reference implementation and check that the results agree'''
+    t_reference = min(timeit.repeat(lambda: reference(data[column]), number = 1, repeat = repeat))
+    t_function = min(timeit.repeat(lambda: function(data[column]), number = 1, repeat = repeat))
+
+    expected = pd.Series(reference(data[column]), index = data.index)
+    result = pd.Series(function(data[column]), index = data.index)
+    identical = expected.equals(result) or ((expected == result) | (expected.isna() & result.isna())).all()
+
+    print('{:<28} loop: {:8.4f} s   vectorised: {:8.4f} s   speedup: {:6.1f}   identical: {}'.format(
+        name, t_reference, t_function, t_reference/t_function, identical))
+
+print('Rows: {}'.format(len(data)))
+benchmark('convertToDatetime', UtilityFunctions.convertToDatetime, convertToDatetimeLoop, 'Ref_publication_date')
+benchmark('convertNumerListToFloats', UtilityFunctions.convertNumerListToFloats, convertNumerListToFloatsLoop, 'Perovskite_band_gap')
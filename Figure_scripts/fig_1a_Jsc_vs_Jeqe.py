@@ -5,29 +5,16 @@
 # 2021 12
 # =============================================================================
 
-from dateutil.relativedelta import relativedelta
-import datetime
 import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
 
+import DatabaseQuery
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -53,53 +40,69 @@ def dataColumnsToUse():
             'JV_reverse_scan_Vmp',
             'JV_reverse_scan_Jmp',
             'Perovskite_band_gap',
-        ] 
+        ]
 
-# Ensure that all publication dates are in the right format
-data['Ref_publication_date'] = UtilityFunctions.convertToDatetime(data['Ref_publication_date'])
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured
+    return ['light_intensity', 'EQE_measured']
 
-# Convert the band gap column to numeric values (and keeping the first value if multiple values)
-data['Perovskite_band_gap'] = UtilityFunctions.convertNumerListToFloats(data['Perovskite_band_gap'])
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
+    return data
 
-# Sort out measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    # Setting up figure PCE #############################################################
+    fileName = 'Jsc_vs_Jqe_version_3'
 
-# drop all points where we do not have EQE data measured
-data  =data[data['EQE_measured'] == True]
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
+    # Scatterplot
+    ax = sns.scatterplot(data=data, 
+                         x="JV_default_Jsc", 
+                         y="EQE_integrated_Jsc",
+                         color = "blueviolet",
+                         alpha = 0.3,
+                         s = 25)
 
-#%% Setting up figure PCE #############################################################
-fileName = 'Jsc_vs_Jqe_version_3'
+    # line
+    ax.plot([0, 40], [0, 40] , linewidth=2, color = 'black', alpha = 0.7)
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
-# Scatterplot
-ax = sns.scatterplot(data=data, 
-                     x="JV_default_Jsc", 
-                     y="EQE_integrated_Jsc",
-                     color = "blueviolet",
-                     alpha = 0.3,
-                     s = 25)
+    ax.set_ylim(0, 30)
+    ax.set_yticks(np.arange(0, 30, step = 3))
+    ax.set_ylabel(r"$J_{sc,EQE}\, [mA/cm^2]$")
 
-# line
-ax.plot([0, 40], [0, 40] , linewidth=2, color = 'black', alpha = 0.7)
+    ax.set_xlabel(r"$J_{sc,JV}\, [mA/cm^2]$")
+    ax.set_xticks(np.arange(0, 30, step = 3))
+    ax.set_xlim(0, 30)
 
+    ax.set_title('$J_{sc,EQE}\ vs\ J_{sc,JV}$', fontsize = 25, loc = 'center')
 
-ax.set_ylim(0, 30)
-ax.set_yticks(np.arange(0, 30, step = 3))
-ax.set_ylabel(r"$J_{sc,EQE}\, [mA/cm^2]$")
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-ax.set_xlabel(r"$J_{sc,JV}\, [mA/cm^2]$")
-ax.set_xticks(np.arange(0, 30, step = 3))
-ax.set_xlim(0, 30)
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
-ax.set_title('$J_{sc,EQE}\ vs\ J_{sc,JV}$', fontsize = 25, loc = 'center')
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
\ No newline at end of file
+    makeFigures(data, path_figure_folder)
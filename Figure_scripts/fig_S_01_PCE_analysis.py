@@ -5,30 +5,20 @@
 # 2021 12
 # =============================================================================
 #%%
-from dateutil.relativedelta import relativedelta
-import datetime
 import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
 
+import Binning
+import Bootstrap
+import DatabaseQuery
+import GroupStatistics
+import QuantileSketch
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -54,95 +44,115 @@ def dataColumnsToUse():
             'JV_reverse_scan_Vmp',
             'JV_reverse_scan_Jmp',
             'Perovskite_band_gap',
-        ] 
 
-# Ensure that all publication dates are in the right format
-data['Ref_publication_date'] = UtilityFunctions.convertToDatetime(data['Ref_publication_date'])
+            # Derived metrics, see DerivedMetrics
+            'Jsc_over_Jqe',
+        ]
 
-# Convert the band gap column to numeric values (and keeping the first value if multiple values)
-data['Perovskite_band_gap'] = UtilityFunctions.convertNumerListToFloats(data['Perovskite_band_gap'])
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured
+    return ['light_intensity', 'EQE_measured']
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
-# Drop measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
+    return data
 
-# Drop all points where we do not have EQE data measured
-data = data[data['EQE_measured'] == True]
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    # Setting up figure scatterplot #############################################################
+    fileName = 'Jsc_over_Jqe_PCE_version_2'
 
-# Create a column for Jsc/Jqe
-data['Jsc_over_Jqe'] = data['JV_default_Jsc']/data['EQE_integrated_Jsc']
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
+    # Scatterplot
+    ax = sns.scatterplot(data=data, 
+                         x="JV_default_PCE", 
+                         y="Jsc_over_Jqe",
+                         color = "blueviolet",
+                         alpha = 0.5,
+                         s = 20)
 
-#%% Setting up figure scatterplot #############################################################
-fileName = 'Jsc_over_Jqe_PCE_version_2'
+    # line
+    ax.plot([0, 35], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+    ax.set_ylim(0, 2)
+    ax.set_yticks(np.arange(0, 2, step = 0.2))
+    ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
 
-# Scatterplot
-ax = sns.scatterplot(data=data, 
-                     x="JV_default_PCE", 
-                     y="Jsc_over_Jqe",
-                     color = "blueviolet",
-                     alpha = 0.5,
-                     s = 20)
+    ax.set_xlim(0, 27)
+    ax.set_xlabel(r"$PCE\, [\%]$")
+    ax.set_xticks(np.arange(0, 27, step = 3))
 
-# line
-ax.plot([0, 35], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
+    ax.set_title('Impact of PCE', fontsize = 25, loc = 'center')
 
-ax.set_ylim(0, 2)
-ax.set_yticks(np.arange(0, 2, step = 0.2))
-ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-ax.set_xlim(0, 27)
-ax.set_xlabel(r"$PCE\, [\%]$")
-ax.set_xticks(np.arange(0, 27, step = 3))
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
-ax.set_title('Impact of PCE', fontsize = 25, loc = 'center')
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    # Seting up figure boxplot #############################################################
+    fileName = 'Jsc_over_Jqe_PCE_boxplot_version_3'
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+    # Bin the data with respect to PCE
+    edges = Binning.linearEdges(0.25, 23.25, 1)
+    data['bin'] = Binning.binColumn(data, 'JV_default_PCE', edges, labels = Binning.centres(edges))
 
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
-#%% Seting up figure boxplot #############################################################
-fileName = 'Jsc_over_Jqe_PCE_boxplot_version_3'
+    # Boxplot, drawn from the statistics of each bin
+    statistics = GroupStatistics.groupStatistics(data, 'bin', 'Jsc_over_Jqe', sortByCount = False)
+    ax = UtilityFunctions.boxplotFromStats(statistics)
 
-# Bin the data with respect to PCE
-start = 0.25
-end = 23.25
-delta = 1
-antal = int(round((end-start)/delta)) + 1
+    # line
+    ax.plot([-0.5, 22.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
 
-cut_bins = np.linspace(start, end, antal)
-cut_labels = np.linspace(start+delta/2, end + delta/2, antal)[:-1]
+    ax.set_yticks(np.arange(0, 30, step = 0.1))
+    ax.set_ylim(0.6, 1.4)
+    ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
 
-data['bin'] = pd.cut(data['JV_default_PCE'], bins=cut_bins, labels=cut_labels)
+    #ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
+    a = Binning.tickLabels(Binning.centres(edges), step = 2, fmt = '{:.0f}')
+    ax.set_xlabel(r"$PCE\, [\%]$")
+    ax.set(xticklabels=a)
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+    ax.set_title('Impact of PCE', fontsize = 25, loc = 'center')
 
-# Boxplot
-ax = sns.boxplot(x="bin", y="Jsc_over_Jqe", data=data)
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-# line
-ax.plot([-0.5, 22.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
-ax.set_yticks(np.arange(0, 30, step = 0.1))
-ax.set_ylim(0.6, 1.4)
-ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
-#ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
-a = ['1', '', '3', '', '5', '', '7', '', '9', '', '11', '', '13', '', '15', '', '17', '', '19', '', '21', '', '23']
-ax.set_xlabel(r"$PCE\, [\%]$")
-ax.set(xticklabels=a)
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
-ax.set_title('Impact of PCE', fontsize = 25, loc = 'center')
+    # The boxplot is saved and the scatterplot shown, as before the figures were also made by FigureRunner
+    makeFigures(data, path_figure_folder, save = ['Jsc_over_Jqe_PCE_boxplot_version_3'])
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    #%% Median and mean Jsc/Jqe per PCE bin, with bootstrap 95 % confidence intervals
+    edges = Binning.linearEdges(0.25, 23.25, 1)
+    data['bin'] = Binning.binColumn(data, 'JV_default_PCE', edges, labels = Binning.centres(edges))
+    confidence = Bootstrap.bootstrapStatistics(data, 'bin', 'Jsc_over_Jqe', sortByCount = False)
+    print(confidence)
 
-#plt.show()
-UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+    #%% Box statistics per PCE bin in bounded memory, reading the database in chunks. The quartiles are within the rank error of the sketches, see QuantileSketch
+    streamed = QuantileSketch.streamGroupStatistics(path_data, 'JV_default_PCE', 'Jsc_over_Jqe', rowFilters(), edges = edges, labels = Binning.centres(edges))
+    print(streamed[['count', 'q1', 'median', 'q3']])
@@ -5,29 +5,18 @@
 # 2021 12
 # =============================================================================
 
-from dateutil.relativedelta import relativedelta
-import datetime
 import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
 
+import Binning
+import DatabaseQuery
+import GroupStatistics
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -53,99 +42,106 @@ def dataColumnsToUse():
             'JV_reverse_scan_Vmp',
             'JV_reverse_scan_Jmp',
             'Perovskite_band_gap',
-        ] 
-
-# Ensure that all publication dates are in the right format
-data['Ref_publication_date'] = UtilityFunctions.convertToDatetime(data['Ref_publication_date'])
 
-# Convert the band gap column to numeric values (and keeping the first value if multiple values)
-data['Perovskite_band_gap'] = UtilityFunctions.convertNumerListToFloats(data['Perovskite_band_gap'])
+            # Derived metrics, see DerivedMetrics
+            'Jsc_over_Jqe',
+        ]
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured
+    return ['light_intensity', 'EQE_measured']
 
-# Drop measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
-
-# Drop all points where we do not have EQE data measured
-data = data[data['EQE_measured'] == True]
-
-# Create a column for Jsc/Jqe
-data['Jsc_over_Jqe'] = data['JV_default_Jsc']/data['EQE_integrated_Jsc']
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
+    return data
 
-#%% Setting up figure scatterplot #############################################################
-fileName = 'Jsc_over_Jqe_FF_version_2'
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    # Setting up figure scatterplot #############################################################
+    fileName = 'Jsc_over_Jqe_FF_version_2'
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
-# Scatterplot
-ax = sns.scatterplot(data=data, 
-                     x="JV_default_FF", 
-                     y="Jsc_over_Jqe",
-                     color = "blueviolet",
-                     alpha = 0.5,
-                     s = 20)
+    # Scatterplot
+    ax = sns.scatterplot(data=data, 
+                         x="JV_default_FF", 
+                         y="Jsc_over_Jqe",
+                         color = "blueviolet",
+                         alpha = 0.5,
+                         s = 20)
 
-# line
-ax.plot([0, 35], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
+    # line
+    ax.plot([0, 35], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
 
 
-ax.set_yticks(np.arange(0, 2, step = 0.2))
-ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
-ax.set_ylim(0, 2)
+    ax.set_yticks(np.arange(0, 2, step = 0.2))
+    ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
+    ax.set_ylim(0, 2)
 
-ax.set_xlabel(r"$FF$")
-ax.set_xticks(np.arange(0, 2, step = 0.2))
-ax.set_xlim(0, 1)
+    ax.set_xlabel(r"$FF$")
+    ax.set_xticks(np.arange(0, 2, step = 0.2))
+    ax.set_xlim(0, 1)
 
-ax.set_title('Impact of FF', fontsize = 25, loc = 'center')
+    ax.set_title('Impact of FF', fontsize = 25, loc = 'center')
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
 
-#%% Seting up figure boxplot #############################################################
-fileName = 'Jsc_over_Jqe_FF_boxplot_version_2'
+    # Seting up figure boxplot #############################################################
+    fileName = 'Jsc_over_Jqe_FF_boxplot_version_2'
 
-# Bin the data with respect to FF
-start = 0
-end = 1
-delta = 0.05
-antal = int(round((end-start)/delta)) + 1
+    # Bin the data with respect to FF
+    edges = Binning.linearEdges(0, 1, 0.05)
+    data['bin'] = Binning.binColumn(data, 'JV_default_FF', edges, labels = Binning.centres(edges))
 
-cut_bins = np.linspace(start, end, antal)
-cut_labels = np.linspace(start+delta/2, end + delta/2, antal)[:-1]
-#cut_labels = np.linspace(0.05, 1.65, antal)[:-1]
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
-data['bin'] = pd.cut(data['JV_default_FF'], bins=cut_bins, labels=cut_labels)
+    # Boxplot, drawn from the statistics of each bin
+    statistics = GroupStatistics.groupStatistics(data, 'bin', 'Jsc_over_Jqe', sortByCount = False)
+    ax = UtilityFunctions.boxplotFromStats(statistics)
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+    # line
+    ax.plot([0.25, 19.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
 
-# Boxplot
-ax = sns.boxplot(x="bin", y="Jsc_over_Jqe", data=data)
+    ax.set_yticks(np.arange(0, 30, step = 0.1))
+    ax.set_ylim(0.6, 1.4)
+    ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
 
-# line
-ax.plot([0.25, 19.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
+    #ax.set_xlim(0, end)
+    #ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
+    a = Binning.tickLabels(Binning.upperEdges(edges), step = 2, offset = 1, fmt = '{:.1f}')
+    ax.set_xlabel(r"$FF$")
+    ax.set(xticklabels=a)
 
-ax.set_yticks(np.arange(0, 30, step = 0.1))
-ax.set_ylim(0.6, 1.4)
-ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
+    ax.set_title('Impact of FF', fontsize = 25, loc = 'center')
 
-#ax.set_xlim(0, end)
-#ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
-a = ['', '0.1', '', '0.2', '', '0.3', '', '0.4', '', '0.5', '', '0.6', '', '0.7', '', '0.8', '', '0.9', '', '']
-ax.set_xlabel(r"$FF$")
-ax.set(xticklabels=a)
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-ax.set_title('Impact of FF', fontsize = 25, loc = 'center')
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
+    makeFigures(data, path_figure_folder)
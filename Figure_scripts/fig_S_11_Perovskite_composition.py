@@ -5,29 +5,17 @@
 # 2021 12
 # =============================================================================
 
-from dateutil.relativedelta import relativedelta
-import datetime
 import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sns
 
+import DatabaseQuery
+import GroupStatistics
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -42,60 +30,78 @@ def dataColumnsToUse():
             'EQE_measured',
             'EQE_integrated_Jsc',
              'Perovskite_deposition_procedure',
-        ] 
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
+            # Derived metrics, see DerivedMetrics
+            'Jsc_over_Jqe',
+        ]
 
-# Drop measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured
+    return ['light_intensity', 'EQE_measured']
 
-# Drop all points where we do not have EQE data measured
-data = data[data['EQE_measured'] == True]
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
-# Create a column for Jsc/Jqe
-data['Jsc_over_Jqe'] = data['JV_default_Jsc']/data['EQE_integrated_Jsc']
+    return data
 
-# Filter out the most common HTL
+#%% Number of categories to include
 antal = 16
-common_procedures = data['Perovskite_composition_short_form'].value_counts().index.tolist()[0:antal] 
-
-data2 = data[data['Perovskite_composition_short_form'].isin(common_procedures)]
-
-#%% Setting up figure boxplot #############################################################
-fileName = 'Jsc_over_Jqe_compostion_boxplot_version_2'
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(10, 8), tight_layout=True) # Set up a figure
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    # Statistics of Jsc/Jqe for the most common ones, in order of how common they are
+    statistics = GroupStatistics.groupStatistics(data, 'Perovskite_composition_short_form', 'Jsc_over_Jqe', antal)
 
-# Boxplot
-ax = sns.boxplot(x="Perovskite_composition_short_form", y="Jsc_over_Jqe", data=data2, order = common_procedures)
+    # Setting up figure boxplot #############################################################
+    fileName = 'Jsc_over_Jqe_compostion_boxplot_version_2'
 
-# line
-ax.plot([-0.5, 15.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(10, 8), tight_layout=True) # Set up a figure
 
-ax.set_yticks(np.arange(0, 30, step = 0.1))
-ax.set_ylim(0.6, 1.4)
-ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
+    # Boxplot, drawn from the statistics
+    ax = UtilityFunctions.boxplotFromStats(statistics)
 
-#ax.set_xlim(0, end)
-#ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
-ax.set_xlabel("")
-ax.set(xticklabels=np.arange(1, 17, step = 1).tolist())
+    # line
+    ax.plot([-0.5, 15.5], [1, 1] , linewidth=2, color = 'black', alpha = 0.7)
 
-ax.set_title('Impact of perovsktie composition', fontsize = 25, loc = 'center')
+    ax.set_yticks(np.arange(0, 30, step = 0.1))
+    ax.set_ylim(0.6, 1.4)
+    ax.set_ylabel(r"$J_{sc,JV}/J_{sc,EQE}\,$")
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    #ax.set_xlim(0, end)
+    #ax.set_xticklabels(ax.get_xticklabels(),rotation=90)
+    ax.set_xlabel("")
+    ax.set(xticklabels=np.arange(1, len(statistics) + 1, step = 1).tolist())
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
+    ax.set_title('Impact of perovsktie composition', fontsize = 25, loc = 'center')
 
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-#%% Get mean values for the most common hole conductors
-common_procedures
-Number_of_counts = data2['Perovskite_composition_short_form'].value_counts()
-median_values = data2.groupby('Perovskite_composition_short_form').median() 
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
+    makeFigures(data, path_figure_folder)
 
+    #%% Get Jsc/Jqe statistics for the most common perovskite compositions
+    statistics = GroupStatistics.groupStatistics(data, 'Perovskite_composition_short_form', 'Jsc_over_Jqe', antal)
+    Number_of_counts = statistics['count']
+    median_values = statistics['median']
@@ -5,29 +5,16 @@
 # 2021 12
 # =============================================================================
 
-from dateutil.relativedelta import relativedelta
-import datetime
 import os
 
 import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 import seaborn as sns
 
+import DatabaseQuery
+import HistogramCube
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -53,53 +40,66 @@ def dataColumnsToUse():
             'JV_reverse_scan_Vmp',
             'JV_reverse_scan_Jmp',
             'Perovskite_band_gap',
-        ] 
 
-# Ensure that all publication dates are in the right format
-data['Ref_publication_date'] = UtilityFunctions.convertToDatetime(data['Ref_publication_date'])
+            # Derived metrics, see DerivedMetrics
+            'Jsc_over_Jqe',
+        ]
 
-# Convert the band gap column to numeric values (and keeping the first value if multiple values)
-data['Perovskite_band_gap'] = UtilityFunctions.convertNumerListToFloats(data['Perovskite_band_gap'])
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured and with certified values
+    return ['light_intensity', 'EQE_measured', 'certified']
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
-
-# Drop measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
-# Drop all points where we do not have EQE data measured
-data = data[data['EQE_measured'] == True]
+    return data
 
-# Create a column for Jsc/Jqe
-data['Jsc_over_Jqe'] = data['JV_default_Jsc']/data['EQE_integrated_Jsc']
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    # Setting up figure PCE #############################################################
+    fileName = 'Jsc_over_Jqe_barplot_certified_version_2'
 
-# Keep only certified data
-data = data[data['JV_certified_values'] == True]
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
+    # barplot
+    edges, counts = HistogramCube.histogramCounts(data, 'Jsc_over_Jqe', rowFilters())
+    ax = UtilityFunctions.histogramFromCounts(edges, counts, color = 'darkorange', alpha = 1)
 
-#%% Setting up figure PCE #############################################################
-fileName = 'Jsc_over_Jqe_barplot_version_2'
+    # line
+    ax.plot([1, 1], [0, 1000] , linewidth=2, color = 'black', alpha = 1)
 
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
 
-# barplot
-binwidth = 0.004
-ax = sns.histplot(data=data, x="Jsc_over_Jqe", kde=False, binwidth=binwidth, color = 'darkorange', alpha = 1)
+    ax.set_xlabel(r"$J_{sc,JV}/J_{sc,EQE}$")
+    ax.set_ylabel(r"$Counts$")
+    ax.set_xlim(0.8, 1.3)
+    ax.set_ylim(0, 3)
 
-# line
-ax.plot([1, 1], [0, 1000] , linewidth=2, color = 'black', alpha = 1)
+    #ax.set_title('$J_{sc,JV}/J_{sc,EQE}\ distribution$', fontsize = 25, loc = 'center')
 
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
-ax.set_xlabel(r"$J_{sc,JV}/J_{sc,EQE}$")
-ax.set_ylabel(r"$Counts$")
-ax.set_xlim(0.8, 1.3)
-ax.set_ylim(0, 3)
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
+    # %%
 
-#ax.set_title('$J_{sc,JV}/J_{sc,EQE}\ distribution$', fontsize = 25, loc = 'center')
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
-# %%
+    makeFigures(data, path_figure_folder)
@@ -8,25 +8,15 @@
 import os
 
 import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 import scipy.stats as st
 import seaborn as sns
 
+import Bootstrap
+import DatabaseQuery
+import KernelDensity
 import UtilityFunctions
 
-#%% File paths
-fileName_data = 'Perovskite_database_content_all_data.csv'
-cwd = os.path.abspath(os.getcwd())
-top_directory = os.path.dirname(cwd)
-path_raw_data = os.path.join(top_directory, "Data",)
-path_figure_folder = os.path.join(top_directory, "Figures")
-path_data = os.path.join(path_raw_data, fileName_data)
-
-#%% Load data downloaded from the perovskite database
-data = pd.read_csv(path_data, low_memory=False)
-
-#%% Initial data manipulation
+#%% Data columns to use
 def dataColumnsToUse():
     ''' Returns a list of the data columns the app will use'''
     return [
@@ -40,6 +30,7 @@ def dataColumnsToUse():
             'JV_certified_values',
             'Perovskite_composition_short_form',
             'Ref_publication_date',
+            'Ref_DOI_number',
             'Stabilised_performance_PCE',
             'Stabilised_performance_Vmp',
             'Stabilised_performance_Jmp',
@@ -52,64 +43,99 @@ def dataColumnsToUse():
             'JV_reverse_scan_Vmp',
             'JV_reverse_scan_Jmp',
             'Perovskite_band_gap',
-        ] 
 
-# Ensure that all publication dates are in the right format
-data['Ref_publication_date'] = UtilityFunctions.convertToDatetime(data['Ref_publication_date'])
+            # Derived metrics, see DerivedMetrics
+            'Jsc_over_Jqe',
+        ]
 
-# Convert the band gap column to numeric values (and keeping the first value if multiple values)
-data['Perovskite_band_gap'] = UtilityFunctions.convertNumerListToFloats(data['Perovskite_band_gap'])
+#%% Rows to use
+def rowFilters():
+    ''' Returns the standard filters, see FilterIndex, that the rows the app uses pass'''
+    # Measurements at standard light intensity, with EQE data measured
+    return ['light_intensity', 'EQE_measured']
 
-# pick out the columns to use
-data = data[dataColumnsToUse()]
+#%% Initial data manipulation
+def prepareData(data):
+    '''Select the columns and rows used in the figures from the cleaned data'''
+    # Keep the columns and rows to use
+    data = UtilityFunctions.filterRows(data, rowFilters(), columns = dataColumnsToUse())
 
-# Drop measurements at high and low light intensities
-data = data[(data['JV_light_intensity'] > 90) & (data['JV_light_intensity'] < 110)]
+    return data
 
-# Drop all points where we do not have EQE data measured
-data = data[data['EQE_measured'] == True]
+#%% Removing outliers (somwhat arbitrarily defined as datapoints more than 25 % of a value of 1)
+def removeOutliers(data):
+    '''Returns the data with Jsc/Jqe within 25 % of 1'''
+    data2 = data[data['Jsc_over_Jqe'] > 0.75]
+    data2 = data2[data2['Jsc_over_Jqe'] < 1.25]
+    return data2
 
-# Create a column for Jsc/Jqe
-data['Jsc_over_Jqe'] = data['JV_default_Jsc']/data['EQE_integrated_Jsc']
+#%% Figures
+def makeFigures(data, path_figure_folder, save = False):
+    '''Plot the figures. The figures are shown, or saved if save = True'''
+    data2 = removeOutliers(data)
 
+    # Setting up figure PCE #############################################################
+    fileName = 'Jsc_over_Jqe_barplot_trimed_KDE_version_1'
 
-#%% For the entire dataaset
-mean = data['Jsc_over_Jqe'].mean()
-std = data['Jsc_over_Jqe'].std()
+    # Plot
+    sns.set_style("darkgrid") # Set the graphical theme
+    fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+
+    # barplot
+    binwidth = 0.004
+    ax = sns.histplot(data=data2, x="Jsc_over_Jqe", kde=False, binwidth=binwidth, color = 'darkorange', alpha = 1)
+
+    # KDE, binned on the histogram bins and smoothed with the FFT, scaled to the counts
+    grid, kde = KernelDensity.kdeCounts(data2['Jsc_over_Jqe'], binwidth)
+    ax.plot(grid, kde, color = 'darkorange')
+
+    # line
+    ax.plot([1, 1], [0, 1000] , linewidth=2, color = 'black', alpha = 1)
 
-#%% Removing outliers (somwhat arbitrarily defined as datapoints more than 25 % of a value of 1)
-data2 = data[data['Jsc_over_Jqe'] > 0.75]
-data2 = data2[data2['Jsc_over_Jqe'] < 1.25]
 
-mean2 = data2['Jsc_over_Jqe'].mean()
-std2 = data2['Jsc_over_Jqe'].std()
+    ax.set_xlabel(r"$J_{sc}/J_{eqe}$")
+    ax.set_ylabel(r"$Counts$")
+    ax.set_xlim(0.75, 1.25)
+    ax.set_ylim(0, 250)
 
-#%% Probabliity of measuring a value of Jqe belove Jsc
-prob = st.norm.cdf( -((mean2-1)/std2) ) 
+    UtilityFunctions.axessetting(ax, fontsize = 30)
 
+    UtilityFunctions.finishFigure(path_figure_folder, fileName, save)
 
+#%% Run as a script
+if __name__ == '__main__':
+    # File paths
+    fileName_data = 'Perovskite_database_content_all_data.csv'
+    cwd = os.path.abspath(os.getcwd())
+    top_directory = os.path.dirname(cwd)
+    path_raw_data = os.path.join(top_directory, "Data",)
+    path_figure_folder = os.path.join(top_directory, "Figures")
+    path_data = os.path.join(path_raw_data, fileName_data)
 
-#%% Setting up figure PCE #############################################################
-fileName = 'Jsc_over_Jqe_barplot_trimed_KDE_version_1'
+    # Load the rows and columns used in the figures from the database. Only those are read from disk
+    data = DatabaseQuery.Query(path_data).select(dataColumnsToUse()).where(*rowFilters()).collect()
+    data = prepareData(data)
 
-#%% Plot
-sns.set_style("darkgrid") # Set the graphical theme
-fig = plt.figure(figsize=(8, 8), tight_layout=True) # Set up a figure
+    #%% For the entire dataaset
+    mean = data['Jsc_over_Jqe'].mean()
+    std = data['Jsc_over_Jqe'].std()
 
-# barplot
-binwidth = 0.004
-ax = sns.histplot(data=data2, x="Jsc_over_Jqe", kde=True, binwidth=binwidth, color = 'darkorange', alpha = 1)
+    #%% Removing outliers
+    data2 = removeOutliers(data)
 
-# line
-ax.plot([1, 1], [0, 1000] , linewidth=2, color = 'black', alpha = 1)
+    mean2 = data2['Jsc_over_Jqe'].mean()
+    std2 = data2['Jsc_over_Jqe'].std()
 
+    #%% Probabliity of measuring a value of Jqe belove Jsc
+    prob = st.norm.cdf( -((mean2-1)/std2) ) 
 
-ax.set_xlabel(r"$J_{sc}/J_{eqe}$")
-ax.set_ylabel(r"$Counts$")
-ax.set_xlim(0.75, 1.25)
-ax.set_ylim(0, 250)
+    #%% Paper level bootstrap
+    # Many devices come from the same paper and are not independent, so the papers are resampled, and then the devices within them
+    confidence = Bootstrap.clusterBootstrap(data, 'Jsc_over_Jqe', 'Ref_DOI_number', replicates = 20000)
+    confidence2 = Bootstrap.clusterBootstrap(data2, 'Jsc_over_Jqe', 'Ref_DOI_number', replicates = 20000)
 
-UtilityFunctions.axessetting(ax, fontsize = 30)
+    replicates2 = Bootstrap.clusterReplicates(data2, 'Jsc_over_Jqe', 'Ref_DOI_number', replicates = 20000)
+    prob_low, prob_high = Bootstrap.percentileInterval(st.norm.cdf( -((replicates2['mean']-1)/replicates2['std']) ))
+    print(confidence, confidence2, 'Probability of Jsc/Jqe below 1: {:.3f} ({:.3f} to {:.3f})'.format(prob, prob_low, prob_high), sep = '\n')
 
-plt.show()
-# UtilityFunctions.saveFigure(path_figure_folder = path_figure_folder, fileName = fileName)
\ No newline at end of file
+    makeFigures(data, path_figure_folder)
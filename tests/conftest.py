@@ -0,0 +1,88 @@
+# =============================================================================
+# Shared fixtures of the tests
+#
+# The figure scripts import each other as top level modules from the
+# Figure_scripts folder, which is put on the path here. The tests run on a
+# small synthetic database with the columns the scripts use, written as CSV to
+# a Data folder in a temporary directory, so that the snapshots and the files
+# stored with them are made in a Cache folder next to it.
+# =============================================================================
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Figure_scripts'))
+
+import FilterIndex
+import HistogramCube
+import LocalStore
+
+def makeDatabase(rows = 3000, seed = 0):
+    '''Returns a synthetic database as a dataframe of strings, as in the database CSV'''
+    rng = np.random.default_rng(seed)
+
+    def numbers(mean, std, missing = 0.1):
+        values = np.round(rng.normal(mean, std, rows), 6).astype(str)
+        values[rng.random(rows) < missing] = ''
+        return values
+
+    def flags(probability):
+        return np.where(rng.random(rows) < probability, 'TRUE', 'FALSE')
+
+    dates = pd.Timestamp('2013-01-01') + pd.to_timedelta(rng.integers(0, 9*365, rows), unit = 'D')
+    data = pd.DataFrame({
+            'Ref_ID': np.arange(1, rows + 1).astype(str),
+            'Ref_DOI_number': ['10.1000/paper.{}'.format(i) for i in rng.integers(0, rows//4, rows)],
+            'Ref_publication_date': np.where(rng.random(rows) < 0.05, '', dates.strftime('%Y-%m-%d')),
+            'Cell_architecture': rng.choice(['nip', 'pin', 'Unknown', 'Back contacted', 'Front contacted'] + ['Other {}'.format(i) for i in range(10)],
+                                            rows, p = [0.5, 0.3, 0.05, 0.05, 0.05] + [0.005]*10),
+            'HTL_stack_sequence': rng.choice(['Spiro-MeOTAD', 'PEDOT:PSS', 'PTAA', 'none', 'NiO-c', 'CuSCN', 'P3HT'], rows),
+            'ETL_stack_sequence': rng.choice(['TiO2-c | TiO2-mp', 'SnO2-np', 'PCBM-60 | BCP', 'C60 | BCP', 'ZnO'], rows),
+            'Perovskite_composition_short_form': rng.choice(['MAPbI', 'FAMAPbI', 'CsFAMAPbBrI', 'FAPbI'], rows),
+            'Perovskite_deposition_procedure': rng.choice(['Spin-coating', 'Spin-coating | Spin-coating', 'Evaporation'], rows),
+            'Perovskite_band_gap': np.where(rng.random(rows) < 0.1, '1.55 | 1.6', numbers(1.6, 0.1)),
+            'JV_light_intensity': rng.choice(['100', '100', '100', '100.0', '50', '1000', ''], rows),
+            'JV_certified_values': flags(0.05),
+            'JV_hysteresis_index': numbers(0.1, 0.1),
+            'JV_default_Voc': numbers(1.0, 0.1),
+            'JV_default_Jsc': numbers(21, 2),
+            'JV_default_FF': numbers(0.7, 0.08),
+            'JV_default_PCE': numbers(15, 4),
+            'JV_reverse_scan_PCE': numbers(15, 4, missing = 0.5),
+            'JV_forward_scan_Jsc': numbers(20, 2, missing = 0.5),
+            'Stabilised_performance_measured': flags(0.3),
+            'Stabilised_performance_PCE': numbers(14, 4, missing = 0.6),
+            'EQE_measured': flags(0.6),
+            'Free_text_notes': rng.choice(['', 'Glovebox', 'Ambient air', 'Annealed'], rows),
+        })
+    data['EQE_integrated_Jsc'] = np.where(data['JV_default_Jsc'] == '', numbers(20, 2),
+                                          np.round(pd.to_numeric(data['JV_default_Jsc']).to_numpy()*rng.normal(0.95, 0.08, rows), 6).astype(str))
+    data.loc[rng.random(rows) < 0.3, 'EQE_integrated_Jsc'] = ''
+    return data
+
+def writeDatabase(data, path_data):
+    '''Write a database of strings as the database CSV'''
+    os.makedirs(os.path.dirname(path_data), exist_ok = True)
+    data.to_csv(path_data, index = False)
+
+@pytest.fixture(autouse = True)
+def unregister():
+    '''Every test starts without the files of a snapshot registered'''
+    FilterIndex.register(None)
+    HistogramCube.register(None)
+    LocalStore.register(None)
+    yield
+    FilterIndex.register(None)
+    HistogramCube.register(None)
+    LocalStore.register(None)
+
+@pytest.fixture
+def path_data(tmp_path):
+    '''Path to a synthetic database CSV in a Data folder of its own'''
+    path = os.path.join(str(tmp_path), 'Data', 'database.csv')
+    writeDatabase(makeDatabase(), path)
+    return path
@@ -0,0 +1,32 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import Binning
+
+def test_bin_codes_match_pd_cut():
+    rng = np.random.default_rng(0)
+    edges = Binning.linearEdges(0.25, 23.25, 1)
+    values = np.concatenate([rng.normal(15, 6, 5000), edges, [np.nan, -1, 100]])
+    np.testing.assert_array_equal(Binning.binCodes(values, edges), pd.cut(values, bins = edges).codes)
+
+def test_date_bin_codes_match_pd_cut():
+    rng = np.random.default_rng(1)
+    edges = Binning.dateEdges('2013-06-01', freq = '6ME', periods = 16)
+    dates = pd.Series(pd.Timestamp('2012-01-01') + pd.to_timedelta(rng.integers(0, 11*365, 5000), unit = 'D'))
+    dates = pd.concat([dates, pd.Series(edges), pd.Series([pd.NaT])], ignore_index = True)
+    np.testing.assert_array_equal(Binning.binCodes(dates, edges), pd.cut(dates, bins = edges).cat.codes.to_numpy())
+
+def test_bin_column_matches_pd_cut():
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame({'PCE': rng.normal(15, 6, 1000)}, index = rng.permutation(1000))
+    edges = Binning.linearEdges(0.25, 23.25, 1)
+    labels = Binning.centres(edges)
+    pd.testing.assert_series_equal(Binning.binColumn(data, 'PCE', edges, labels = labels), pd.cut(data['PCE'], bins = edges, labels = labels))
+
+def test_half_year_edges_without_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        edges = Binning.dateEdges('2013-06-01', freq = '6ME', periods = 3)
+    assert list(pd.DatetimeIndex(edges).strftime('%Y-%m-%d')) == ['2013-06-30', '2013-12-31', '2014-06-30']
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import Bootstrap
+import GroupStatistics
+from tests.test_group_statistics import makeGroups
+
+def test_replicates_match_resampling_each_group():
+    '''The statistics read from the sorted positions equal np.median and np.mean of the resampled values of every group'''
+    data = makeGroups(rows = 800)
+    groups = GroupStatistics.sortedGroups(data, 'group', 'value')
+    values, starts, lengths = groups['values'], groups['starts'], groups['lengths']
+
+    replicates = Bootstrap.replicateBatch(values, starts, lengths, 50, seed = 3)
+    positions = Bootstrap.resamplePositions(np.random.default_rng(3), starts, lengths, 50)
+    for g, (start, length) in enumerate(zip(starts, lengths)):
+        inGroup = (positions >= start) & (positions < start + length)
+        resampled = values[positions[inGroup]].reshape(50, length)
+        np.testing.assert_allclose(replicates['median'][:, g], np.median(resampled, axis = 1))
+        np.testing.assert_allclose(replicates['mean'][:, g], np.mean(resampled, axis = 1))
+
+def test_estimates_match_pandas():
+    data = makeGroups()
+    result = Bootstrap.bootstrapStatistics(data, 'group', 'value', replicates = 500)
+    grouped = data.dropna(subset = ['value']).groupby('group')['value']
+    np.testing.assert_allclose(result['median'], grouped.median()[result.index])
+    np.testing.assert_allclose(result['mean'], grouped.mean()[result.index])
+    assert (result['median_low'] <= result['median']).all() and (result['median'] <= result['median_high']).all()
+
+def test_result_does_not_depend_on_the_jobs(monkeypatch):
+    monkeypatch.setattr(Bootstrap, 'BATCH_VALUES', 20000)
+    data = makeGroups()
+    pd.testing.assert_frame_equal(Bootstrap.bootstrapStatistics(data, 'group', 'value', replicates = 200, jobs = 1),
+                                  Bootstrap.bootstrapStatistics(data, 'group', 'value', replicates = 200, jobs = 2))
+
+def test_cluster_bootstrap_without_resampling_within_clusters():
+    '''Resampling every cluster once, in order, gives back the mean and standard deviation of the values'''
+    data = makeGroups(rows = 300)
+    values, starts, lengths = Bootstrap.clusterSegments(data, 'value', 'group')
+    whole = Bootstrap.clusterBatch(values, starts, lengths, 1, seed = 0, withinClusters = False)
+    chosen = (np.random.default_rng(0).random((1, len(lengths)))*len(lengths)).astype(np.int64)[0]
+    expected = np.concatenate([values[starts[c]:starts[c] + lengths[c]] for c in chosen])
+    np.testing.assert_allclose(whole['mean'], [expected.mean()])
+    np.testing.assert_allclose(whole['std'], [expected.std(ddof = 1)])
+
+def test_workers_are_not_forked():
+    '''The data is read with pyarrow before the pool starts, whose threads do not survive a fork'''
+    assert Bootstrap.workerContext().get_start_method() in ('forkserver', 'spawn')
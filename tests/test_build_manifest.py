@@ -0,0 +1,64 @@
+import importlib
+import os
+import sys
+
+import BuildManifest
+
+SCRIPT = '''import helper_module
+
+def dataColumnsToUse():
+    return ['JV_default_PCE', 'EQE_measured']
+'''
+
+def loadScript(folder, monkeypatch):
+    '''Import the script in folder again, with the helper module it imports'''
+    monkeypatch.syspath_prepend(folder)
+    for name in ('fig_test_script', 'helper_module'):
+        sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+    return importlib.import_module('fig_test_script')
+
+def test_up_to_date_until_an_input_changes(tmp_path, monkeypatch):
+    folder, figures = str(tmp_path/'scripts'), str(tmp_path/'Figures')
+    os.makedirs(folder)
+    os.makedirs(figures)
+    with open(os.path.join(folder, 'fig_test_script.py'), 'w') as f:
+        f.write(SCRIPT)
+    with open(os.path.join(folder, 'helper_module.py'), 'w') as f:
+        f.write('VALUE = 1\n')
+    path_figure = os.path.join(figures, 'figure.png')
+    with open(path_figure, 'w') as f:
+        f.write('figure')
+
+    module = loadScript(folder, monkeypatch)
+    inputs = BuildManifest.figureInputs(module, 'data hash')
+    assert list(inputs['modules']) == ['helper_module']
+    BuildManifest.writeManifest(figures, BuildManifest.recordBuild({}, 'fig_test_script', inputs, [path_figure]))
+    manifest = BuildManifest.readManifest(figures)
+    assert BuildManifest.isUpToDate(manifest, 'fig_test_script', BuildManifest.figureInputs(module, 'data hash'), figures)
+
+    # Another version of the database
+    assert not BuildManifest.isUpToDate(manifest, 'fig_test_script', BuildManifest.figureInputs(module, 'other data hash'), figures)
+
+    # A change in the script, or in a module it imports
+    with open(os.path.join(folder, 'fig_test_script.py'), 'a') as f:
+        f.write('# changed\n')
+    assert not BuildManifest.isUpToDate(manifest, 'fig_test_script', BuildManifest.figureInputs(loadScript(folder, monkeypatch), 'data hash'), figures)
+    with open(os.path.join(folder, 'fig_test_script.py'), 'w') as f:
+        f.write(SCRIPT)
+    assert BuildManifest.isUpToDate(manifest, 'fig_test_script', BuildManifest.figureInputs(loadScript(folder, monkeypatch), 'data hash'), figures)
+    with open(os.path.join(folder, 'helper_module.py'), 'w') as f:
+        f.write('VALUE = 2\n')
+    assert not BuildManifest.isUpToDate(manifest, 'fig_test_script', BuildManifest.figureInputs(loadScript(folder, monkeypatch), 'data hash'), figures)
+
+def test_missing_output_is_out_of_date(tmp_path):
+    path_figure = str(tmp_path/'figure.png')
+    with open(path_figure, 'w') as f:
+        f.write('figure')
+    inputs = {'data': 'data hash'}
+    manifest = BuildManifest.recordBuild({}, 'fig_test_script', inputs, [path_figure])
+    assert BuildManifest.isUpToDate(manifest, 'fig_test_script', inputs, str(tmp_path))
+    os.remove(path_figure)
+    assert not BuildManifest.isUpToDate(manifest, 'fig_test_script', inputs, str(tmp_path))
+    assert not BuildManifest.isUpToDate(BuildManifest.recordBuild({}, 'fig_test_script', inputs, []), 'fig_test_script', inputs, str(tmp_path))
+    assert not BuildManifest.isUpToDate({}, 'fig_test_script', inputs, str(tmp_path))
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import DatabaseQuery
+import LocalStore
+import UtilityFunctions
+
+COLUMNS = ['JV_default_PCE', 'EQE_measured', 'Jsc_over_Jqe']
+
+def test_collect_returns_the_selected_columns(path_data):
+    data = DatabaseQuery.Query(path_data).select(COLUMNS).where('light_intensity', 'EQE_measured').collect()
+    assert list(data.columns) == COLUMNS
+
+def test_collect_matches_read_database(path_data):
+    data = DatabaseQuery.Query(path_data).select(COLUMNS).where('light_intensity', 'EQE_measured', ('JV_default_PCE', '>', 15)).collect()
+    expected = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data, columns = COLUMNS, filters = ['light_intensity', 'EQE_measured']))
+    expected = expected.loc[expected['JV_default_PCE'] > 15, COLUMNS]
+    pd.testing.assert_frame_equal(data, expected)
+
+def test_first_read_matches_the_snapshot(path_data):
+    '''The read that makes the snapshot returns the same frame as the reads of the snapshot after it'''
+    first = UtilityFunctions.readDatabase(path_data, columns = COLUMNS)
+    pd.testing.assert_frame_equal(first, UtilityFunctions.readDatabase(path_data, columns = COLUMNS))
+    # Missing text is None in the snapshot and NaN in the CSV
+    parsed = UtilityFunctions.readDatabase(path_data, columns = COLUMNS, useSnapshot = False)
+    pd.testing.assert_frame_equal(parsed.fillna(np.nan), first.fillna(np.nan), check_index_type = False, check_names = False)
+
+def test_predicates_on_cleaned_columns(path_data, monkeypatch):
+    '''Predicates on columns initialDataManipulation cleans give the rows of the cleaned frame, with the local store and without it'''
+    predicates = [('Perovskite_band_gap', '>', 1.65), ('Perovskite_band_gap', 'top', 3)]
+    prepared = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data))
+    expected = prepared.loc[prepared['Perovskite_band_gap'] > 1.65, COLUMNS[:2]]
+    query = DatabaseQuery.Query(path_data).select(COLUMNS[:2])
+
+    pd.testing.assert_frame_equal(query.where(predicates[0]).collect(), expected)
+    monkeypatch.setattr(LocalStore.LocalStore, 'answers', lambda store, predicate: False)
+    pd.testing.assert_frame_equal(query.where(predicates[0]).collect(), expected)
+
+    common = prepared['Perovskite_band_gap'].value_counts().index[:3]
+    top = query.where(predicates[1]).collect()
+    pd.testing.assert_frame_equal(top, prepared.loc[prepared['Perovskite_band_gap'].isin(common), COLUMNS[:2]])
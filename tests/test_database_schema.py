@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import DatabaseSchema
+import UtilityFunctions
+from tests.conftest import makeDatabase, writeDatabase
+
+def checkSameValues(data, reference):
+    '''The declared columns of data hold the values of the columns parsed without types, converted as the figure scripts used them'''
+    for column, dtype in DatabaseSchema.columnTypes().items():
+        if column not in reference.columns:
+            continue
+        values, expected = data[column], reference[column]
+        assert values.dtype == dtype, column
+        if dtype in (DatabaseSchema.FLOAT32, DatabaseSchema.FLOAT64):
+            expected = pd.to_numeric(expected, errors = 'coerce').astype(dtype)
+            np.testing.assert_array_equal(values.to_numpy(), expected.to_numpy(), err_msg = column)
+        elif dtype == DatabaseSchema.BOOLEAN:
+            assert values.astype(object).where(values.notna(), None).tolist() == expected.astype(object).where(expected.notna(), None).tolist(), column
+        elif dtype == DatabaseSchema.DATETIME:
+            pd.testing.assert_series_equal(values, pd.to_datetime(expected), check_names = False)
+        else:
+            np.testing.assert_array_equal(values.astype(object).isna(), expected.isna(), err_msg = column)
+            np.testing.assert_array_equal(values.astype(object)[values.notna()], expected[expected.notna()].astype(str), err_msg = column)
+
+def test_declared_types_keep_the_values(path_data):
+    data = UtilityFunctions.readDatabase(path_data)
+    checkSameValues(data, pd.read_csv(path_data, low_memory = False))
+
+def test_values_the_types_cannot_hold(tmp_path):
+    '''A value that is not a number in a float column becomes missing, and the other values are read as with the declared types'''
+    database = makeDatabase(rows = 500)
+    database.loc[3, 'JV_default_PCE'] = 'about 15'
+    database.loc[4, 'EQE_measured'] = 'maybe'
+    path_data = os.path.join(str(tmp_path), 'Data', 'database.csv')
+    writeDatabase(database, path_data)
+
+    data = UtilityFunctions.readDatabase(path_data)
+    assert pd.isna(data.loc[3, 'JV_default_PCE']) and pd.isna(data.loc[4, 'EQE_measured'])
+    reference = pd.read_csv(path_data, low_memory = False)
+    reference.loc[3, 'JV_default_PCE'] = np.nan
+    reference['EQE_measured'] = reference['EQE_measured'].map({'TRUE': True, 'FALSE': False})
+    checkSameValues(data, reference)
+
+def test_arrow_engine_matches_pandas(path_data):
+    pd.testing.assert_frame_equal(DatabaseSchema.readCsv(path_data, engine = 'pyarrow'), DatabaseSchema.readCsv(path_data, engine = 'pandas'))
+    columns = ['Ref_publication_date', 'JV_default_PCE', 'EQE_measured', 'HTL_stack_sequence', 'Free_text_notes']
+    pd.testing.assert_frame_equal(DatabaseSchema.readCsv(path_data, usecols = columns, engine = 'pyarrow'),
+                                  DatabaseSchema.readCsv(path_data, usecols = columns, engine = 'pandas'))
+
+def test_arrow_engine_with_values_the_types_cannot_hold(tmp_path):
+    database = makeDatabase(rows = 500)
+    database.loc[3, 'JV_default_PCE'] = 'about 15'
+    database.loc[4, 'EQE_measured'] = 'maybe'
+    database.loc[5, 'Free_text_notes'] = 'TRUE'
+    path_data = os.path.join(str(tmp_path), 'Data', 'database.csv')
+    writeDatabase(database, path_data)
+    pd.testing.assert_frame_equal(DatabaseSchema.readCsv(path_data, engine = 'pyarrow'), DatabaseSchema.readCsv(path_data, engine = 'pandas'))
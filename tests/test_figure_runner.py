@@ -0,0 +1,18 @@
+import FigureRunner
+import FilterIndex
+import HistogramCube
+import LocalStore
+import UtilityFunctions
+
+def registeredInWorker(name):
+    '''The snapshot files registered in a worker process, and the snapshot of its data'''
+    return (FilterIndex.loadedIndex.snapshot, HistogramCube.loadedCube.snapshot, LocalStore.loadedStore.length,
+            FigureRunner.workerData.index.name)
+
+def test_workers_register_the_snapshot_files(path_data, tmp_path):
+    data = UtilityFunctions.readDatabase(path_data)
+    with FigureRunner.processPool(2, data, str(tmp_path)) as pool:
+        results = list(pool.map(registeredInWorker, ['a', 'b']))
+
+    snapshot = FilterIndex.loadedIndex.snapshot
+    assert results == [(snapshot, snapshot, len(data), snapshot)]*2
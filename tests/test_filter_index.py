@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import FilterIndex
+import UtilityFunctions
+
+FILTERS = ['light_intensity', 'EQE_measured']
+
+def test_bitmaps_match_the_filters(path_data):
+    data = UtilityFunctions.readDatabase(path_data)
+    assert FilterIndex.loadedIndex.covers(data)
+    np.testing.assert_array_equal(FilterIndex.loadedIndex.mask(FILTERS), FilterIndex.evaluateFilters(data, FILTERS))
+
+def test_filter_rows_of_a_selection(path_data):
+    data = UtilityFunctions.readDatabase(path_data, columns = ['JV_default_PCE', 'JV_light_intensity', 'EQE_measured'])
+    selection = data[data['JV_default_PCE'] > 15]
+    expected = selection[FilterIndex.evaluateFilters(selection, FILTERS)]
+    pd.testing.assert_frame_equal(UtilityFunctions.filterRows(selection, FILTERS), expected)
+
+def test_bitmaps_used_without_the_filter_columns(path_data):
+    full = UtilityFunctions.readDatabase(path_data)
+    data = UtilityFunctions.readDatabase(path_data, columns = ['JV_default_PCE'])
+    assert 'EQE_measured' not in data.columns
+    np.testing.assert_array_equal(FilterIndex.rowMask(data, FILTERS), FilterIndex.evaluateFilters(full, FILTERS))
+
+def test_reindexed_frame_is_evaluated(path_data):
+    '''A shuffled frame given new row numbers must not be looked up in the bitmaps of the snapshot'''
+    data = UtilityFunctions.readDatabase(path_data)
+    shuffled = data.sample(frac = 1, random_state = 1).reset_index(drop = True)
+    assert not FilterIndex.loadedIndex.covers(shuffled)
+
+    filtered = UtilityFunctions.filterRows(shuffled, ['EQE_measured'])
+    assert filtered['EQE_measured'].all()
+    assert len(filtered) == int(shuffled['EQE_measured'].fillna(False).sum())
+
+def test_frame_not_from_the_snapshot_is_evaluated(path_data):
+    UtilityFunctions.readDatabase(path_data)
+    data = UtilityFunctions.readDatabase(path_data, useSnapshot = False)
+    assert not FilterIndex.loadedIndex.covers(data)
+    assert UtilityFunctions.filterRows(data, ['EQE_measured'])['EQE_measured'].all()
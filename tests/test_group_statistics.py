@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from matplotlib import cbook
+
+import Binning
+import GroupStatistics
+
+def makeGroups(rows = 5000, seed = 0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+            'group': rng.choice(['a', 'b', 'c', 'd', 'e'], rows, p = [0.4, 0.3, 0.2, 0.09, 0.01]),
+            'PCE': rng.normal(15, 5, rows),
+            'value': np.concatenate([rng.normal(1, 0.05, rows - 20), rng.normal(1, 0.5, 20)]),
+        })
+    data.loc[rng.random(rows) < 0.05, 'value'] = np.nan
+    data.loc[rng.random(rows) < 0.02, 'group'] = None
+    return data
+
+def checkAgainstBoxplotStats(statistics, groups):
+    '''Compare the statistics of every group with matplotlib.cbook.boxplot_stats of its values'''
+    for key, values in groups:
+        expected = cbook.boxplot_stats(values)[0]
+        row = statistics.loc[key]
+        assert row['n'] == len(values)
+        for name, reference in [('mean', 'mean'), ('median', 'med'), ('q1', 'q1'), ('q3', 'q3'), ('whislo', 'whislo'), ('whishi', 'whishi')]:
+            np.testing.assert_allclose(row[name], expected[reference], rtol = 1e-12)
+        np.testing.assert_array_equal(np.sort(row['fliers']), np.sort(expected['fliers']))
+
+def test_categories_match_boxplot_stats():
+    data = makeGroups()
+    statistics = GroupStatistics.groupStatistics(data, 'group', 'value', antal = 4)
+    counts = data['group'].value_counts()
+    assert list(statistics.index) == list(counts.index[:4])
+    np.testing.assert_array_equal(statistics['count'], counts.to_numpy()[:4])
+    checkAgainstBoxplotStats(statistics, [(key, data.loc[data['group'] == key, 'value'].dropna().to_numpy()) for key in statistics.index])
+
+def test_bins_match_boxplot_stats():
+    data = makeGroups(seed = 1)
+    edges = Binning.linearEdges(0.25, 23.25, 1)
+    data['bin'] = Binning.binColumn(data, 'PCE', edges)
+    statistics = GroupStatistics.groupStatistics(data, 'bin', 'value', sortByCount = False)
+    assert list(statistics.index) == Binning.intervalLabels(edges)
+    checkAgainstBoxplotStats(statistics, [(key, group['value'].dropna().to_numpy()) for key, group in data.groupby('bin', observed = True)
+                                          if group['value'].notna().any()])
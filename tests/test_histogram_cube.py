@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+import HistogramCube
+import UtilityFunctions
+
+FILTERS = ['light_intensity', 'EQE_measured']
+
+def countedFromData(data, metric):
+    '''The histogram counted with pd.cut, as the reference'''
+    edges = HistogramCube.valueEdges()
+    return pd.cut(data[metric], bins = edges).value_counts(sort = False).to_numpy()
+
+def test_cube_for_the_filtered_snapshot(path_data):
+    data = UtilityFunctions.filterRows(UtilityFunctions.readDatabase(path_data, columns = ['Jsc_over_Jqe']), FILTERS)
+    assert HistogramCube.loadedCube.holds(data, FILTERS)
+    edges, counts = HistogramCube.histogramCounts(data, 'Jsc_over_Jqe', FILTERS)
+    np.testing.assert_array_equal(counts, countedFromData(data, 'Jsc_over_Jqe'))
+
+def test_cube_with_a_flag(path_data):
+    filters = FILTERS + ['certified']
+    data = UtilityFunctions.filterRows(UtilityFunctions.readDatabase(path_data, columns = ['Jsc_over_Jqe']), filters)
+    assert HistogramCube.loadedCube.holds(data, filters)
+    edges, counts = HistogramCube.histogramCounts(data, 'Jsc_over_Jqe', filters)
+    np.testing.assert_array_equal(counts, countedFromData(data, 'Jsc_over_Jqe'))
+
+def test_subset_is_counted_from_the_data(path_data):
+    '''Rows selected further than the standard filters must not be answered with the counts of the whole cube'''
+    data = UtilityFunctions.filterRows(UtilityFunctions.readDatabase(path_data, columns = ['Jsc_over_Jqe', 'JV_default_PCE']), FILTERS)
+    subset = data[data['JV_default_PCE'] > 20]
+    assert not HistogramCube.loadedCube.holds(subset, FILTERS)
+    edges, counts = HistogramCube.histogramCounts(subset, 'Jsc_over_Jqe', FILTERS)
+    np.testing.assert_array_equal(counts, countedFromData(subset, 'Jsc_over_Jqe'))
+
+def test_reindexed_frame_is_counted_from_the_data(path_data):
+    data = UtilityFunctions.filterRows(UtilityFunctions.readDatabase(path_data, columns = ['Jsc_over_Jqe']), FILTERS)
+    reindexed = data.iloc[::2].reset_index(drop = True)
+    edges, counts = HistogramCube.histogramCounts(reindexed, 'Jsc_over_Jqe', FILTERS)
+    np.testing.assert_array_equal(counts, countedFromData(reindexed, 'Jsc_over_Jqe'))
+
+def test_slices_sum_to_the_histogram(path_data):
+    UtilityFunctions.readDatabase(path_data)
+    cube = HistogramCube.loadedCube
+    total = cube.histogram('Jsc_over_Jqe', FILTERS)
+    parts = sum(cube.slice('Jsc_over_Jqe', architectures = [architecture]).sum(axis = (1, 2, 3, 4))[:-1] for architecture in cube.architectures)
+    np.testing.assert_array_equal(total, parts)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+import DatabaseSchema
+import DerivedMetrics
+import FilterIndex
+import HistogramCube
+import Ingest
+import LocalStore
+import ParameterCube
+import UtilityFunctions
+from tests.conftest import makeDatabase, writeDatabase
+
+NUMBERS = ['JV_default_Voc', 'JV_default_Jsc', 'JV_default_FF', 'JV_default_PCE', 'EQE_integrated_Jsc', 'JV_hysteresis_index']
+
+def reserialised(text):
+    '''The numbers of a column of strings written again with other digits for the same number, as 15.10 or 151e-1 for 15.1'''
+    def written(value, i):
+        if '.' not in value or 'e' in value:
+            return value
+        return value + '0' if i % 2 else value.replace('.', '') + 'e-{}'.format(len(value.split('.')[1]))
+    return np.array([written(value, i) for i, value in enumerate(text)])
+
+def lastDigitChanged(text):
+    '''A number changed by less than float32 resolves, such as 21.4433260001 for 21.443326'''
+    return text + '0001' if '.' in text and 'e' not in text else text
+
+def test_rewritten_numbers_are_unchanged(tmp_path):
+    database = makeDatabase(rows = 500)
+    database.loc[8, 'JV_default_Voc'] = '1.053217'
+    release = database.copy()
+    for column in NUMBERS:
+        release[column] = reserialised(release[column])
+    release.loc[7, 'JV_default_PCE'] = '30.5'
+    release.loc[8, 'JV_default_Voc'] = lastDigitChanged(database.loc[8, 'JV_default_Voc'])
+
+    path_old, path_new = str(tmp_path/'old.csv'), str(tmp_path/'new.csv')
+    writeDatabase(database, path_old)
+    writeDatabase(release, path_new)
+    old = Ingest.RowIdentity.fromData(DatabaseSchema.readCsv(path_old))
+    new = Ingest.RowIdentity.fromData(DatabaseSchema.readCsv(path_new))
+
+    previous = new.matchRows(old)
+    assert np.flatnonzero(previous < 0).tolist() == [7, 8]
+    np.testing.assert_array_equal(previous[previous >= 0], np.flatnonzero(previous >= 0))
+
+def release(database):
+    '''A new release of a database: some rows removed, some values corrected and some rows added'''
+    release = database.drop(index = range(10, 20)).copy()
+    release.loc[[3, 50, 400], 'JV_default_PCE'] = ['21.5', '9.25', '']
+    release.loc[[60, 61], 'EQE_measured'] = ['TRUE', 'FALSE']
+    measured = release.index[(release['JV_default_Jsc'] != '') & (release['EQE_integrated_Jsc'] != '')][:3]
+    release.loc[measured, 'JV_default_Jsc'] = release.loc[measured, 'JV_default_Jsc'].map(lastDigitChanged)
+    added = makeDatabase(rows = 100, seed = 1)
+    added['Ref_ID'] = (np.arange(100) + len(database) + 1).astype(str)
+    return pd.concat([release, added], ignore_index = True)
+
+def test_ingest_matches_a_fresh_build(tmp_path, path_data):
+    UtilityFunctions.loadParameterCube(UtilityFunctions.ensureSnapshot(path_data))
+    database = pd.read_csv(path_data, dtype = str, keep_default_na = False)
+    new = release(database)
+    writeDatabase(new, path_data)
+    path_ingested = Ingest.ingestRelease(path_data)
+
+    path_fresh_data = str(tmp_path/'fresh'/'Data'/'database.csv')
+    writeDatabase(new, path_fresh_data)
+    path_fresh = UtilityFunctions.ensureSnapshot(path_fresh_data)
+    UtilityFunctions.loadParameterCube(path_fresh)
+
+    pd.testing.assert_frame_equal(pd.read_parquet(path_ingested), pd.read_parquet(path_fresh))
+
+    ingested, fresh = [FilterIndex.FilterIndex.load(UtilityFunctions.filterIndexPath(path)) for path in (path_ingested, path_fresh)]
+    assert sorted(ingested.bitmaps) == sorted(fresh.bitmaps)
+    for name in fresh.bitmaps:
+        np.testing.assert_array_equal(ingested.mask([name]), fresh.mask([name]))
+
+    pd.testing.assert_frame_equal(DerivedMetrics.load(UtilityFunctions.derivedMetricsPath(path_ingested))[0],
+                                  DerivedMetrics.load(UtilityFunctions.derivedMetricsPath(path_fresh))[0], check_exact = True)
+
+    ingested, fresh = [HistogramCube.HistogramCube.load(UtilityFunctions.histogramCubePath(path)) for path in (path_ingested, path_fresh)]
+    np.testing.assert_array_equal(ingested.counts, fresh.counts)
+    assert ingested.architectures == fresh.architectures
+
+    ingested, fresh = [ParameterCube.ParameterCube.load(UtilityFunctions.parameterCubePath(path)) for path in (path_ingested, path_fresh)]
+    for dimensions in [('PCE',), ('date',), ('Voc', 'Eg')]:
+        pd.testing.assert_frame_equal(ingested.view(*dimensions).collect(), fresh.view(*dimensions).collect(), check_exact = False, rtol = 1e-9)
+
+    query = 'SELECT * FROM devices ORDER BY row'
+    ingested, fresh = [LocalStore.LocalStore.load(UtilityFunctions.localStorePath(path)) for path in (path_ingested, path_fresh)]
+    pd.testing.assert_frame_equal(ingested.sql(query), fresh.sql(query))
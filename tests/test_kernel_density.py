@@ -0,0 +1,38 @@
+import numpy as np
+from scipy import stats
+
+import KernelDensity
+
+def test_binned_kde_matches_gaussian_kde():
+    '''The binned estimate on the grid matches scipy's gaussian_kde, which seaborn uses, evaluated directly'''
+    values = np.random.default_rng(0).normal(1, 0.05, 20000)
+    grid, density = KernelDensity.binnedKde(values)
+    expected = stats.gaussian_kde(values)(grid)
+    np.testing.assert_allclose(density, expected, atol = 1e-3*expected.max())
+
+def test_bandwidth_sweep_matches_binned_kde():
+    values = np.random.default_rng(1).normal(1, 0.05, 5000)
+    bandwidths = [0.005, 0.01, 0.02]
+    grid, densities = KernelDensity.bandwidthSweep(values, bandwidths)
+    for bandwidth, density in zip(bandwidths, densities):
+        expected = stats.gaussian_kde(values, bw_method = bandwidth/np.std(values, ddof = 1))(grid)
+        np.testing.assert_allclose(density, expected, atol = 1e-3*expected.max())
+
+def test_kde_counts_scale_to_the_histogram():
+    values = np.random.default_rng(2).normal(1, 0.05, 10000)
+    grid, counts = KernelDensity.kdeCounts(values, binwidth = 0.004)
+    expected = stats.gaussian_kde(values)(grid)*len(values)*0.004
+    np.testing.assert_allclose(counts, expected, atol = 1e-3*expected.max())
+
+def test_without_a_bandwidth():
+    '''No values, one value or constant values have no bandwidth, and give an empty curve'''
+    for values in ([], [np.nan], [1.02], [1.02]*50):
+        grid, counts = KernelDensity.kdeCounts(values)
+        assert len(grid) == len(counts) == 0
+    grid, densities = KernelDensity.bandwidthSweep([], [0.01, 0.02])
+    assert len(grid) == 0 and densities.shape == (2, 0)
+
+def test_constant_values_with_a_bandwidth():
+    grid, density = KernelDensity.binnedKde([1.02]*50, bandwidth = 0.01, cut = 3)
+    expected = stats.norm.pdf(grid, 1.02, 0.01)
+    np.testing.assert_allclose(density, expected, atol = 1e-3*expected.max())
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import LocalStore
+import UtilityFunctions
+from tests.conftest import makeDatabase, writeDatabase
+
+PREDICATES = [
+        [('JV_certified_values', '==', True)],
+        [('Ref_publication_date', 'between', ('2016-01-01', '2018-06-30'))],
+        [('HTL_stack_sequence', 'in', ['PTAA', 'NiO-c']), ('JV_default_PCE', '>', 15)],
+        [('Perovskite_band_gap', '>', 1.65)],
+    ]
+
+def expectedMask(data, predicates):
+    '''The rows passing the predicates, evaluated with pandas, as the reference'''
+    mask = pd.Series(True, index = data.index)
+    for column, operator, value in predicates:
+        if operator == '==':
+            mask &= data[column] == value
+        elif operator == '>':
+            mask &= data[column] > value
+        elif operator == 'between':
+            mask &= (data[column] > pd.Timestamp(value[0])) & (data[column] < pd.Timestamp(value[1]))
+        elif operator == 'in':
+            mask &= data[column].isin(value)
+    return mask.fillna(False).to_numpy(dtype = bool)
+
+def checkStore(path_data):
+    data = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data))
+    store = LocalStore.loadedStore
+    assert store is not None and store.length == len(data)
+    for predicates in PREDICATES:
+        np.testing.assert_array_equal(store.mask(predicates), expectedMask(data, predicates))
+
+def test_store_matches_pandas(path_data):
+    checkStore(path_data)
+
+def test_numbers_and_text_are_not_ordered_together(path_data):
+    '''SQLite puts every number before every text, so these predicates are left to pandas'''
+    UtilityFunctions.ensureSnapshot(path_data)
+    store = LocalStore.loadedStore
+    assert store.answers(('Perovskite_band_gap', '>', 1.7))
+    assert not store.answers(('Perovskite_band_gap', '>', '1.7'))
+    assert not store.answers(('HTL_stack_sequence', 'between', (1, 2)))
+    assert store.answers(('HTL_stack_sequence', '==', 'PTAA'))
+
+def test_store_in_a_folder_with_uri_characters(tmp_path):
+    '''Characters with a meaning in file URIs, such as ? and #, in the path must not end the path'''
+    path_data = os.path.join(str(tmp_path), 'run #1 ?a=b 100%', 'Data', 'database.csv')
+    writeDatabase(makeDatabase(rows = 500), path_data)
+    checkStore(path_data)
+
+    UtilityFunctions.readDatabase(path_data)
+    assert LocalStore.LocalStore.load(LocalStore.loadedStore.path) is not None
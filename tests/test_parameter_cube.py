@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import FilterIndex
+import ParameterCube
+import UtilityFunctions
+
+def cubeData(path_data):
+    '''The cleaned rows of the cube, with the value, as the reference'''
+    columns = list(dict.fromkeys(ParameterCube.cubeColumns() + [ParameterCube.VALUE]))
+    data = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data, columns = columns))
+    return data[FilterIndex.evaluateFilters(data, ParameterCube.cubeFilters()) & data[ParameterCube.VALUE].notna()]
+
+def test_marginal_matches_pandas(path_data):
+    '''Counts, means and standard deviations are exact. The medians of the histograms are within a histogram bin of the value at rank n/2'''
+    cube = UtilityFunctions.loadParameterCube(UtilityFunctions.ensureSnapshot(path_data))
+    data = cubeData(path_data)
+    column, edges, size = ParameterCube.dimensionDefinitions()['PCE']
+    figureEdges = np.append(edges[:-1:size], edges[-1])
+
+    marginal = cube.view('PCE').collect()
+    grouped = data.groupby(pd.cut(data[column], bins = figureEdges), observed = True)[ParameterCube.VALUE]
+    expected = pd.DataFrame({'count': grouped.size(), 'mean': grouped.mean(), 'std': grouped.std(),
+                             'median': grouped.agg(lambda values: np.quantile(values, 0.5, method = 'inverted_cdf'))})
+    expected.index = expected.index.astype(str).str.replace(r'\.0+(?=[,\]])', '', regex = True)
+    marginal = marginal.drop('Missing', errors = 'ignore')
+    expected = expected.loc[marginal.index]
+
+    np.testing.assert_array_equal(marginal['count'], expected['count'])
+    np.testing.assert_allclose(marginal['mean'], expected['mean'])
+    np.testing.assert_allclose(marginal['std'], expected['std'], rtol = 1e-6)
+    inside = (expected['median'] > 0.5) & (expected['median'] < 1.5)
+    assert (np.abs(marginal['median'] - expected['median'])[inside] <= 0.004).all()
+
+def test_roll_up_to_the_total(path_data):
+    cube = UtilityFunctions.loadParameterCube(UtilityFunctions.ensureSnapshot(path_data))
+    data = cubeData(path_data)
+    total = cube.view('PCE', 'Eg').rollUp('PCE').rollUp('Eg').collect()
+    assert total['count'].iloc[0] == len(data)
+    np.testing.assert_allclose(total['mean'].iloc[0], data[ParameterCube.VALUE].mean())
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import GroupStatistics
+import QuantileSketch
+import UtilityFunctions
+from tests.conftest import makeDatabase, writeDatabase
+
+def test_exact_below_k():
+    values = np.random.default_rng(0).normal(size = QuantileSketch.DEFAULT_K)
+    sketch = QuantileSketch.KllSketch().update(values)
+    np.testing.assert_allclose(sketch.quantile([0.1, 0.25, 0.5, 0.75, 0.9]), np.quantile(values, [0.1, 0.25, 0.5, 0.75, 0.9]))
+    assert sketch.rankErrorBound() == 0
+
+def test_rank_error_within_the_bound():
+    '''The rank of every percentile is within the bound in at least 99 of 100 sketches'''
+    inside = 0
+    for trial in range(100):
+        values = np.random.default_rng(trial).normal(size = 20000)
+        sketch = QuantileSketch.KllSketch(seed = trial)
+        for chunk in np.array_split(values, 7):
+            sketch.update(chunk)
+        q = np.linspace(0.01, 0.99, 99)
+        ranks = np.searchsorted(np.sort(values), sketch.quantile(q))/len(values)
+        inside += np.abs(ranks - q).max() <= sketch.rankErrorBound()
+    assert inside >= 99
+
+def test_groups_draw_their_own_compactions():
+    '''Groups with the same values must not make the same random choices'''
+    rng = np.random.default_rng(1)
+    values = np.tile(rng.normal(size = 5000), 2)
+    keys = pd.Series(['a']*5000 + ['b']*5000)
+    sketches, counts = {}, {}
+    QuantileSketch.updateGroupSketches(sketches, counts, keys, values)
+    assert counts == {'a': 5000, 'b': 5000}
+    assert not np.array_equal(sketches['a'].items()[0], sketches['b'].items()[0])
+
+def test_stream_matches_group_statistics(path_data):
+    '''Counts and means are exact, and the quartiles within the rank error of the sketches'''
+    filters = ['light_intensity', 'EQE_measured']
+    data = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data, columns = ['HTL_stack_sequence', 'Jsc_over_Jqe'], filters = filters))
+    expected = GroupStatistics.groupStatistics(data, 'HTL_stack_sequence', 'Jsc_over_Jqe', 5)
+    streamed = QuantileSketch.streamGroupStatistics(path_data, 'HTL_stack_sequence', 'Jsc_over_Jqe', filters, antal = 5, chunkSize = 500)
+    assert list(streamed.index) == list(expected.index)
+    np.testing.assert_array_equal(streamed['count'], expected['count'])
+    np.testing.assert_allclose(streamed['mean'], expected['mean'])
+    for key in expected.index:
+        values = np.sort(data.loc[data['HTL_stack_sequence'] == key, 'Jsc_over_Jqe'].dropna().to_numpy())
+        rank = np.searchsorted(values, streamed.loc[key, 'median'])/len(values)
+        assert abs(rank - 0.5) <= 0.05
+
+def test_stream_orders_ties_as_group_statistics(tmp_path):
+    '''Categories with the same number of rows come in the same order as in the figures, also with categories only in rows the filters remove'''
+    database = makeDatabase(rows = 600)
+    measured = database['EQE_measured'] == 'TRUE'
+    database.loc[measured, 'HTL_stack_sequence'] = ['HTL {:02d}'.format(i % 30) for i in range(measured.sum())]
+    database.loc[~measured, 'HTL_stack_sequence'] = ['HTL {:02d}b'.format(i % 7) for i in range((~measured).sum())]
+    path_data = os.path.join(str(tmp_path), 'Data', 'database.csv')
+    writeDatabase(database, path_data)
+
+    data = UtilityFunctions.initialDataManipulation(UtilityFunctions.readDatabase(path_data, columns = ['HTL_stack_sequence', 'Jsc_over_Jqe'], filters = ['EQE_measured']))
+    expected = GroupStatistics.groupStatistics(data, 'HTL_stack_sequence', 'Jsc_over_Jqe', 12)
+    streamed = QuantileSketch.streamGroupStatistics(path_data, 'HTL_stack_sequence', 'Jsc_over_Jqe', ['EQE_measured'], antal = 12, chunkSize = 200)
+    assert list(streamed.index) == list(expected.index)
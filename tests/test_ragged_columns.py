@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+import RaggedColumns
+
+def stacks():
+    return pd.Series(['TiO2-c | TiO2-mp', 'SnO2-np', None, 'PCBM-60 | BCP | Ag', 'TiO2-c | TiO2-mp', 'TiO2-c  |  SnO2-np', np.nan, 'BCP | BCP'],
+                     index = np.arange(10, 18), name = 'ETL_stack_sequence')
+
+def splitRows(series):
+    '''The values of every row split with pandas, as the reference'''
+    return [[] if pd.isna(value) else [part.strip() for part in value.split(' | ')] for value in series]
+
+def test_round_trip():
+    series = stacks()
+    ragged = RaggedColumns.RaggedColumn.fromSeries(series)
+    assert len(ragged) == len(series)
+    rows = [list(ragged.categories[ragged.codes[ragged.offsets[i]:ragged.offsets[i + 1]]]) for i in range(len(ragged))]
+    assert rows == splitRows(series)
+    np.testing.assert_array_equal(ragged.lengths(), [len(row) for row in splitRows(series)])
+
+def test_layers_and_contains():
+    series = stacks()
+    ragged = RaggedColumns.RaggedColumn.fromSeries(series)
+    rows = splitRows(series)
+    first, last = ragged.layer(0), ragged.layer(-1)
+    assert list(first.index) == list(series.index)
+    assert first.astype(object).where(first.notna(), None).tolist() == [row[0] if row else None for row in rows]
+    assert last.astype(object).where(last.notna(), None).tolist() == [row[-1] if row else None for row in rows]
+    assert ragged.layer(2).notna().tolist() == [len(row) > 2 for row in rows]
+    assert ragged.contains('BCP').tolist() == ['BCP' in row for row in rows]
+    assert not ragged.contains('Spiro-MeOTAD').any()
+
+def test_value_counts_and_explode():
+    series = stacks()
+    ragged = RaggedColumns.RaggedColumn.fromSeries(series)
+    rows = splitRows(series)
+    perLayer = pd.Series([value for row in rows for value in row]).value_counts()
+    perRow = pd.Series([value for row in rows for value in set(row)]).value_counts()
+    pd.testing.assert_series_equal(ragged.valueCounts(perRow = False).sort_index(), perLayer.sort_index(), check_names = False)
+    pd.testing.assert_series_equal(ragged.valueCounts().sort_index(), perRow.sort_index(), check_names = False)
+
+    exploded = ragged.explode()
+    assert exploded['row'].tolist() == [index for index, row in zip(series.index, rows) for value in row]
+    assert exploded['layer'].tolist() == [layer for row in rows for layer in range(len(row))]
+    assert exploded['value'].astype(str).tolist() == [value for row in rows for value in row]
+
+def test_numbers():
+    ragged = RaggedColumns.RaggedColumn.fromSeries(pd.Series(['1.55 | 1.6', '1.7', 'x | 2', None]))
+    np.testing.assert_array_equal(ragged.toFloats(), [1.55, 1.6, 1.7, np.nan, 2])
@@ -0,0 +1,94 @@
+import datetime
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import DatabaseSchema
+import DerivedMetrics
+import FilterIndex
+import GroupStatistics
+import UtilityFunctions
+from tests.test_group_statistics import makeGroups
+
+def convertToDatetimeLoop(data):
+    '''The row by row conversion convertToDatetime replaced, as the reference'''
+    newData = []
+    for time in data:
+        if isinstance(time, datetime.datetime) == False:
+            try:
+                newData.append(datetime.datetime.fromisoformat(time))
+            except:
+                newData.append(pd.to_datetime(''))
+        else:
+            newData.append(time)
+    return pd.Series(newData, index = data.index, dtype = 'datetime64[ns]')
+
+def convertNumerListToFloatsLoop(numberList):
+    '''The row by row conversion convertNumerListToFloats replaced, as the reference'''
+    numberList = numberList.astype(str)
+    x = numberList.str.contains(' | ') == True
+    for index in list(numberList[x].index):
+        y = str(numberList[index]).strip().split(' | ')[0].strip()
+        try:
+            number = float(y)
+        except:
+            number = np.nan
+        numberList.loc[index] = number
+    return pd.to_numeric(numberList, errors = 'coerce')
+
+def test_convert_to_datetime_matches_the_loop():
+    dates = pd.Series(['2016-05-03', '2016-05-03 12:30:00', '2016-05-03T12:30', '2019-12-31', '2016-02-30', '2016-13-01', 'unknown', '', None, np.nan])
+    pd.testing.assert_series_equal(UtilityFunctions.convertToDatetime(dates), convertToDatetimeLoop(dates))
+
+    mixed = pd.Series(['2016-05-03', datetime.datetime(2017, 1, 2, 3, 4), pd.Timestamp('2018-06-30'), 5, 'not a date', None], dtype = object)
+    pd.testing.assert_series_equal(UtilityFunctions.convertToDatetime(mixed), convertToDatetimeLoop(mixed))
+
+def test_convert_to_datetime_of_typed_columns():
+    dates = pd.Series(pd.to_datetime(['2016-05-03', None, '2019-12-31']))
+    pd.testing.assert_series_equal(UtilityFunctions.convertToDatetime(dates), dates.astype('datetime64[ns]'))
+    assert UtilityFunctions.convertToDatetime(pd.Series([1.5, np.nan])).isna().all()
+
+def test_convert_number_lists_matches_the_loop():
+    numbers = pd.Series(['1.6', '1.55 | 1.6', '1.6 | 1.7 | 1.8', '1.6 | unknown', 'unknown | 1.6', '1.6|1.7', '1.6; 1.7', '1.6 ; 1.7', ' 1.6 ',
+                         '1e-3 | 2', '1,6', 'abc', 'nan', '', None, np.nan], dtype = object)
+    pd.testing.assert_series_equal(UtilityFunctions.convertNumerListToFloats(numbers), convertNumerListToFloatsLoop(numbers))
+
+def test_convert_number_lists_of_numbers():
+    numbers = pd.Series([1.6, np.nan, 2], dtype = 'float32')
+    pd.testing.assert_series_equal(UtilityFunctions.convertNumerListToFloats(numbers), numbers.astype(float))
+
+def test_boxplot_from_stats_matches_plt_boxplot():
+    '''The boxes, medians, whiskers, caps and fliers drawn from the statistics are the ones plt.boxplot draws from the values. The empty group leaves a slot'''
+    data = makeGroups()
+    data.loc[data['group'] == 'e', 'value'] = np.nan
+    statistics = GroupStatistics.groupStatistics(data, 'group', 'value')
+    drawn = statistics.index[statistics['n'] > 0]
+    positions = np.flatnonzero(statistics['n'] > 0)
+
+    figure, (ax, axReference) = plt.subplots(1, 2)
+    UtilityFunctions.boxplotFromStats(statistics, ax = ax)
+    axReference.boxplot([data.loc[data['group'] == key, 'value'].dropna().to_numpy() for key in drawn], positions = positions, widths = 0.8,
+                        capwidths = 0.4, patch_artist = True, manage_ticks = False)
+
+    assert len(ax.lines) == len(axReference.lines) and len(ax.patches) == len(axReference.patches) == len(drawn)
+    for line, reference in zip(ax.lines, axReference.lines):
+        # The fliers are drawn in another order
+        points = line.get_xydata() if line.get_linestyle() != 'None' else np.sort(line.get_xydata(), axis = 0)
+        expected = reference.get_xydata() if line.get_linestyle() != 'None' else np.sort(reference.get_xydata(), axis = 0)
+        np.testing.assert_allclose(points, expected)
+    for box, reference in zip(ax.patches, axReference.patches):
+        np.testing.assert_allclose(box.get_path().vertices, reference.get_path().vertices)
+    assert [label.get_text() for label in ax.get_xticklabels()] == list(statistics.index)
+    plt.close(figure)
+
+def test_read_csv_filtered_matches_filtering_the_full_parse(path_data):
+    '''Filtering while the CSV is parsed in chunks gives the rows and values of filtering the whole file. Categoricals only keep the categories of the kept rows'''
+    columns = ['HTL_stack_sequence', 'Ref_publication_date', 'Perovskite_band_gap', 'JV_default_PCE', 'Jsc_over_Jqe']
+    filters = ['light_intensity', 'EQE_measured']
+    data = UtilityFunctions.readCsvFiltered(path_data, columns, filters, chunkSize = 400)
+
+    full = DerivedMetrics.addMetrics(DatabaseSchema.readCsv(path_data), ['Jsc_over_Jqe'])
+    expected = full.loc[FilterIndex.evaluateFilters(full, filters), list(data.columns)]
+    assert list(data.columns) == UtilityFunctions.columnsToLoad(columns, full.columns)
+    pd.testing.assert_frame_equal(data, expected, check_categorical = False)